@@ -3,6 +3,8 @@ This module handles functionality related to retreiving information related to t
 as a whole. 
 
 '''
+import os
+
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.file
 
@@ -15,3 +17,20 @@ def getAllLibraryAudioFilepaths(libraryRootDir):
     allSongs = mypycommons.file.getFilesByExtension(rootDirPath=libraryRootDir, fileExt=audioFileExtensions)
     return allSongs
 
+def getAudioFileStatSignature(audioFilepath):
+    '''
+    Returns a dict of the file stat values (size, modified time, inode) used to detect whether an
+    audio file has changed since it was last read. The signature is compared as a whole: if any of
+    the values differ, the file is considered changed.
+    '''
+    return getStatSignatureFromFileStat(os.stat(audioFilepath))
+
+def getStatSignatureFromFileStat(fileStat: os.stat_result):
+    '''
+    Returns the stat signature (see getAudioFileStatSignature) from the given stat result.
+    '''
+    return {
+        'size': fileStat.st_size,
+        'mtimeNs': fileStat.st_mtime_ns,
+        'inode': fileStat.st_ino
+    }
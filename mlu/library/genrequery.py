@@ -0,0 +1,179 @@
+'''
+mlu.library.genrequery
+
+Module containing the parser and evaluator for the genre queries of the advanced unrated
+autoplaylists, such as:
+
+    ('Industrial' or 'Industrial Metal') and not 'Ambient'
+
+A query is made of quoted genre names, combined with the operators 'and', 'or' and 'not' (in
+order of increasing precedence) and parentheses. It is parsed once into a tree of query nodes,
+which is evaluated against a LibraryTable as bitset operations on its genre index.
+'''
+
+import re
+from typing import List
+
+from mlu.library.table import LibraryTable
+
+class GenreQuerySyntaxError(Exception):
+    '''
+    Raised when a genre query can't be parsed.
+    '''
+    def __init__(self, message):
+        super().__init__(message)
+
+class GenreQueryNode:
+    '''
+    Base class for the nodes of a parsed genre query.
+    '''
+    def evaluate(self, libraryTable: LibraryTable) -> int:
+        '''
+        Returns the bitset of the library table rows that match this query node.
+        '''
+        raise NotImplementedError()
+
+class GenreQueryGenre(GenreQueryNode):
+    def __init__(self, genre: str):
+        self.genre = genre
+
+    def evaluate(self, libraryTable: LibraryTable) -> int:
+        return libraryTable.getGenreBitset(self.genre)
+
+class GenreQueryNot(GenreQueryNode):
+    def __init__(self, operand: GenreQueryNode):
+        self.operand = operand
+
+    def evaluate(self, libraryTable: LibraryTable) -> int:
+        return libraryTable.allRowsBitset & ~self.operand.evaluate(libraryTable)
+
+class GenreQueryAnd(GenreQueryNode):
+    def __init__(self, operands: List[GenreQueryNode]):
+        self.operands = operands
+
+    def evaluate(self, libraryTable: LibraryTable) -> int:
+        bitset = libraryTable.allRowsBitset
+        for operand in self.operands:
+            bitset &= operand.evaluate(libraryTable)
+        return bitset
+
+class GenreQueryOr(GenreQueryNode):
+    def __init__(self, operands: List[GenreQueryNode]):
+        self.operands = operands
+
+    def evaluate(self, libraryTable: LibraryTable) -> int:
+        bitset = 0
+        for operand in self.operands:
+            bitset |= operand.evaluate(libraryTable)
+        return bitset
+
+# Quoted genre names (single or double quotes), operators and parentheses
+_TOKEN_REGEX = re.compile(r"\s*(?:'([^']*)'|\"([^\"]*)\"|(\()|(\))|([A-Za-z]+))")
+
+def parseGenreQuery(query: str) -> GenreQueryNode:
+    '''
+    Parses the given genre query text into a tree of query nodes. Raises GenreQuerySyntaxError if
+    the query is not valid.
+    '''
+    parser = _GenreQueryParser(query)
+    return parser.parse()
+
+class _GenreQueryParser:
+    '''
+    Recursive descent parser for genre queries:
+
+        orExpression  := andExpression ('or' andExpression)*
+        andExpression := notExpression ('and' notExpression)*
+        notExpression := 'not' notExpression | '(' orExpression ')' | genre
+    '''
+    def __init__(self, query: str):
+        self.query = query
+        self._tokens = self._getTokens(query)
+        self._position = 0
+
+    def parse(self) -> GenreQueryNode:
+        node = self._parseOrExpression()
+        if (self._position < len(self._tokens)):
+            self._raiseSyntaxError("unexpected {}".format(self._tokens[self._position][1]))
+
+        return node
+
+    def _parseOrExpression(self) -> GenreQueryNode:
+        operands = [self._parseAndExpression()]
+        while (self._nextTokenIs('operator', 'or')):
+            self._position += 1
+            operands.append(self._parseAndExpression())
+
+        return operands[0] if (len(operands) == 1) else GenreQueryOr(operands)
+
+    def _parseAndExpression(self) -> GenreQueryNode:
+        operands = [self._parseNotExpression()]
+        while (self._nextTokenIs('operator', 'and')):
+            self._position += 1
+            operands.append(self._parseNotExpression())
+
+        return operands[0] if (len(operands) == 1) else GenreQueryAnd(operands)
+
+    def _parseNotExpression(self) -> GenreQueryNode:
+        if (self._position >= len(self._tokens)):
+            self._raiseSyntaxError("unexpected end of query")
+
+        (tokenType, tokenValue) = self._tokens[self._position]
+        self._position += 1
+
+        if (tokenType == 'operator' and tokenValue == 'not'):
+            return GenreQueryNot(self._parseNotExpression())
+
+        elif (tokenType == 'genre'):
+            return GenreQueryGenre(tokenValue)
+
+        elif (tokenType == '('):
+            node = self._parseOrExpression()
+            if (not self._nextTokenIs(')')):
+                self._raiseSyntaxError("missing ')'")
+            self._position += 1
+            return node
+
+        else:
+            self._raiseSyntaxError("unexpected {}".format(tokenValue))
+
+    def _nextTokenIs(self, tokenType: str, tokenValue: str = None) -> bool:
+        if (self._position >= len(self._tokens)):
+            return False
+
+        nextToken = self._tokens[self._position]
+        return (nextToken[0] == tokenType and (tokenValue is None or nextToken[1] == tokenValue))
+
+    def _getTokens(self, query: str):
+        '''
+        Returns the list of (type, value) tokens of the query text.
+        '''
+        tokens = []
+        position = 0
+        query = query.rstrip()
+
+        while (position < len(query)):
+            match = _TOKEN_REGEX.match(query, position)
+            if (match is None):
+                self._raiseSyntaxError("invalid text at position {}".format(position))
+
+            (singleQuotedGenre, doubleQuotedGenre, openParen, closeParen, word) = match.groups()
+            if (singleQuotedGenre is not None):
+                tokens.append(('genre', singleQuotedGenre))
+            elif (doubleQuotedGenre is not None):
+                tokens.append(('genre', doubleQuotedGenre))
+            elif (openParen):
+                tokens.append(('(', openParen))
+            elif (closeParen):
+                tokens.append((')', closeParen))
+            elif (word.lower() in ('and', 'or', 'not')):
+                tokens.append(('operator', word.lower()))
+            else:
+                self._raiseSyntaxError("unknown operator '{}' (genre names must be quoted)".format(word))
+
+            position = match.end()
+
+        return tokens
+
+    def _raiseSyntaxError(self, message: str):
+        raise GenreQuerySyntaxError("Invalid genre query: {}: {}".format(message, self.query))
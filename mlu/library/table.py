@@ -0,0 +1,174 @@
+'''
+mlu.library.table
+
+Module containing the library table: an in-memory, columnar copy of the values from the library tag
+index that the autoplaylist generators need. It is loaded once, after which every playlist is
+computed from its columns, without deserializing the tags of the library again.
+
+Sets of rows are represented as bitsets: Python ints in which bit N is set if row id N is in the
+set, so that combining sets (and, or, and not) is done with single int operations.
+'''
+
+from array import array
+from typing import Iterable, List, Optional
+
+from mlu.library.tagindex import LibraryTagIndex
+
+class LibraryTable:
+    '''
+    Columnar table of the library audio files. Each audio file is a row, identified by its row id
+    (the path id), which is the position of its values in each column. Rows are ordered by
+    filepath.
+
+    Columns:
+        filepaths: filepath of each row
+        ratings: rating of each row (array of doubles)
+        playCounts: play count of each row (array of ints)
+        genreIds: tuple of the genre ids of each row
+        albumSortRanks: position of each row when all rows are sorted by albumArtist, album,
+            filepath: sorting rows by this rank gives the autoplaylist album order
+
+    Genre names are interned: genreNames holds the name of each genre id.
+
+    Indexes (bitsets of row ids):
+        genreBitsets: rows that have each genre, by genre id
+        unratedBitset: rows that have no rating
+        allRowsBitset: all rows
+    '''
+    def __init__(self):
+        self.filepaths = []
+        self.ratings = array('d')
+        self.playCounts = array('q')
+        self.genreIds = []
+        self.albumSortRanks = array('q')
+        self.genreBitsets = []
+        self.unratedBitset = 0
+        self.allRowsBitset = 0
+        self.genreNames = []
+        self._genreIdsByName = {}
+        self._albumSortKeys = []
+
+    @classmethod
+    def fromTagIndex(cls, tagIndex: LibraryTagIndex):
+        '''
+        Returns a new LibraryTable loaded with all entries of the given tag index.
+        '''
+        table = cls()
+        for entry in tagIndex.getEntries():
+            table.addRow(entry.filepath, entry.tags)
+
+        table.buildIndexes()
+        return table
+
+    def addRow(self, filepath: str, tags) -> int:
+        '''
+        Adds a row for the given audio file and AudioFileTags, returning its row id. Once all rows
+        are added, buildIndexes() must be called.
+        '''
+        genres = tags.genre if (tags.genre) else []
+
+        self.filepaths.append(filepath)
+        self.ratings.append(tags.rating)
+        self.playCounts.append(tags.playCount)
+        self.genreIds.append(tuple(self._internGenre(genre) for genre in genres))
+        self._albumSortKeys.append((tags.albumArtist or '', tags.album or '', filepath))
+
+        return len(self.filepaths) - 1
+
+    def buildIndexes(self) -> None:
+        '''
+        Computes the albumSortRanks column and the genre and unrated bitsets from the added rows.
+        '''
+        rowCount = self.getRowCount()
+
+        sortedRowIds = sorted(range(rowCount), key=self._albumSortKeys.__getitem__)
+        self.albumSortRanks = array('q', bytes(8 * rowCount))
+
+        for (rank, rowId) in enumerate(sortedRowIds):
+            self.albumSortRanks[rowId] = rank
+
+        genreRowIds = [[] for genreId in range(len(self.genreNames))]
+        for (rowId, rowGenreIds) in enumerate(self.genreIds):
+            for genreId in rowGenreIds:
+                genreRowIds[genreId].append(rowId)
+
+        self.genreBitsets = [getBitsetFromRowIds(rowIds, rowCount) for rowIds in genreRowIds]
+        self.unratedBitset = getBitsetFromRowIds([rowId for rowId in range(rowCount) if (self.ratings[rowId] == 0)], rowCount)
+        self.allRowsBitset = (1 << rowCount) - 1
+
+    def getRowCount(self) -> int:
+        return len(self.filepaths)
+
+    def getGenreId(self, genre: str) -> Optional[int]:
+        '''
+        Returns the id of the given genre name, or None if no audio file has that genre.
+        '''
+        return self._genreIdsByName.get(genre)
+
+    def getRowsByRating(self, minValue: float, maxValue: float) -> List[int]:
+        '''
+        Returns the ids of the rows with a rating in the given range (inclusive), ordered by rating
+        descending, then by albumArtist - album.
+        '''
+        ratings = self.ratings
+        rowIds = [rowId for rowId in range(len(ratings)) if (minValue <= ratings[rowId] <= maxValue)]
+        rowIds.sort(key=lambda rowId: (-ratings[rowId], self.albumSortRanks[rowId]))
+        return rowIds
+
+    def getGenreBitset(self, genre: str) -> int:
+        '''
+        Returns the bitset of the rows that have the given genre (empty if no row has it).
+        '''
+        genreId = self.getGenreId(genre)
+        if (genreId is None):
+            return 0
+        return self.genreBitsets[genreId]
+
+    def getUnratedRowsByGenre(self, genre: str) -> List[int]:
+        '''
+        Returns the ids of the unrated rows that have the given genre, ordered by albumArtist - album.
+        '''
+        return self.sortRowsByAlbum(getRowIdsFromBitset(self.getGenreBitset(genre) & self.unratedBitset))
+
+    def sortRowsByAlbum(self, rowIds: Iterable[int]) -> List[int]:
+        '''
+        Returns the given row ids ordered by albumArtist - album.
+        '''
+        return sorted(rowIds, key=self.albumSortRanks.__getitem__)
+
+    def getFilepaths(self, rowIds: Iterable[int]) -> List[str]:
+        return [self.filepaths[rowId] for rowId in rowIds]
+
+    def _internGenre(self, genre: str) -> int:
+        genreId = self._genreIdsByName.get(genre)
+        if (genreId is None):
+            genreId = len(self.genreNames)
+            self.genreNames.append(genre)
+            self._genreIdsByName[genre] = genreId
+
+        return genreId
+
+def getBitsetFromRowIds(rowIds: Iterable[int], rowCount: int) -> int:
+    '''
+    Returns the bitset of the given row ids, which must all be less than rowCount.
+    '''
+    bitsetBytes = bytearray((rowCount + 7) // 8)
+    for rowId in rowIds:
+        bitsetBytes[rowId >> 3] |= (1 << (rowId & 7))
+
+    return int.from_bytes(bitsetBytes, 'little')
+
+def getRowIdsFromBitset(bitset: int) -> List[int]:
+    '''
+    Returns the row ids in the given bitset, in ascending order.
+    '''
+    # Bits as text with the lowest bit first, so the index of each '1' is its row id
+    bitsText = bin(bitset)[:1:-1]
+    rowIds = []
+
+    rowId = bitsText.find('1')
+    while (rowId >= 0):
+        rowIds.append(rowId)
+        rowId = bitsText.find('1', rowId + 1)
+
+    return rowIds
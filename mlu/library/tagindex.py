@@ -0,0 +1,198 @@
+'''
+mlu.library.tagindex
+
+Module containing the library tag index: a local SQLite database holding the tags (and file stat
+signature) of every audio file in the music library. It is kept up to date by the
+LoadLibraryTagsManager and queried by the autoplaylist and summary writers, so they don't need to
+load the whole library into memory.
+'''
+
+import json
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import mlu.tags.common
+from mlu.tags.values import AudioFileTags
+
+class LibraryTagIndexEntry:
+    '''
+    Data structure holding the values stored in the index for a single audio file.
+
+    Params:
+        filepath: absolute filepath of the audio file
+        tags: AudioFileTags object of the audio file's tags
+        stat: stat signature of the audio file when the tags were read (see
+            mlu.library.audiolib.getAudioFileStatSignature), or None
+    '''
+    def __init__(self, filepath: str, tags: AudioFileTags, stat: Optional[dict]):
+        self.filepath = filepath
+        self.tags = tags
+        self.stat = stat
+
+    def getDictForJsonFile(self) -> dict:
+        return {
+            'filepath': self.filepath,
+            'tags': self.tags.__dict__,
+            'stat': self.stat
+        }
+
+class LibraryTagIndex:
+    '''
+    Class for reading from and writing to the library tag index database. Can be used as a context
+    manager, which closes the database connection on exit.
+
+    Params:
+        databaseFilepath: filepath of the SQLite database file, which is created if it does not exist
+    '''
+    _AUDIO_FILE_COLUMNS = 'filepath, title, artist, album, albumArtist, genre, dateLastPlayed, playCount, rating, size, mtimeNs, inode'
+
+    def __init__(self, databaseFilepath: str):
+        self.databaseFilepath = databaseFilepath
+        self._connection = sqlite3.connect(databaseFilepath)
+        self._createSchema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def upsertEntries(self, entries: Iterable[LibraryTagIndexEntry]) -> None:
+        '''
+        Inserts the given entries, replacing the existing entries for the same filepaths.
+        '''
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO audio_files ({}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)".format(self._AUDIO_FILE_COLUMNS),
+                (self._getRowFromEntry(entry) for entry in entries)
+            )
+
+    def deleteEntries(self, filepaths: Iterable[str]) -> None:
+        '''
+        Removes the entries for the given filepaths from the index.
+        '''
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM audio_files WHERE filepath = ?",
+                [(filepath,) for filepath in filepaths]
+            )
+
+    def getEntry(self, filepath: str) -> Optional[LibraryTagIndexEntry]:
+        '''
+        Returns the entry for the given filepath, or None if the audio file is not in the index.
+        '''
+        row = self._connection.execute(
+            "SELECT {} FROM audio_files WHERE filepath = ?".format(self._AUDIO_FILE_COLUMNS),
+            (filepath,)
+        ).fetchone()
+
+        if (row is None):
+            return None
+        return self._getEntryFromRow(row)
+
+    def getEntries(self) -> Iterator[LibraryTagIndexEntry]:
+        '''
+        Yields all entries in the index, ordered by filepath.
+        '''
+        cursor = self._connection.execute(
+            "SELECT {} FROM audio_files ORDER BY filepath".format(self._AUDIO_FILE_COLUMNS)
+        )
+        for row in cursor:
+            yield self._getEntryFromRow(row)
+
+    def getEntriesCount(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM audio_files").fetchone()[0]
+
+    def getStatSignatures(self) -> Dict[str, Optional[dict]]:
+        '''
+        Returns a dict of the stat signature stored for each filepath in the index.
+        '''
+        cursor = self._connection.execute("SELECT filepath, size, mtimeNs, inode FROM audio_files")
+        return {row[0]: self._getStatFromValues(row[1], row[2], row[3]) for row in cursor}
+
+    def exportJsonFile(self, jsonFilepath: str) -> None:
+        '''
+        Writes all entries of the index to a JSON file, in the format of the library tags snapshot
+        file (list of objects with filepath, tags and stat).
+        '''
+        with open(jsonFilepath, mode='w', encoding='utf-8') as jsonFile:
+            jsonFile.write('[')
+            for (index, entry) in enumerate(self.getEntries()):
+                if (index > 0):
+                    jsonFile.write(',')
+                jsonFile.write('\n')
+                json.dump(entry.getDictForJsonFile(), jsonFile, ensure_ascii=False)
+            jsonFile.write('\n]\n')
+
+    def _createSchema(self) -> None:
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS audio_files (
+                    filepath TEXT PRIMARY KEY NOT NULL,
+                    title TEXT,
+                    artist TEXT,
+                    album TEXT,
+                    albumArtist TEXT,
+                    genre TEXT,
+                    dateLastPlayed TEXT,
+                    playCount INTEGER NOT NULL DEFAULT 0,
+                    rating REAL NOT NULL DEFAULT 0,
+                    size INTEGER,
+                    mtimeNs INTEGER,
+                    inode INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS audio_files_album_idx ON audio_files (albumArtist, album);
+
+                -- Left by index files created when the index also had the rating and genre queries
+                DROP INDEX IF EXISTS audio_files_rating_idx;
+                DROP TABLE IF EXISTS audio_file_genres;
+            ''')
+
+    def _getRowFromEntry(self, entry: LibraryTagIndexEntry) -> tuple:
+        stat = entry.stat if (entry.stat) else {}
+
+        return (
+            entry.filepath,
+            entry.tags.title,
+            entry.tags.artist,
+            entry.tags.album,
+            entry.tags.albumArtist,
+            mlu.tags.common.formatValuesListToAudioTag(self._getGenresList(entry.tags.genre)),
+            entry.tags.dateLastPlayed,
+            entry.tags.playCount,
+            entry.tags.rating,
+            stat.get('size'),
+            stat.get('mtimeNs'),
+            stat.get('inode')
+        )
+
+    def _getEntryFromRow(self, row) -> LibraryTagIndexEntry:
+        tags = AudioFileTags(
+            title=row[1],
+            artist=row[2],
+            album=row[3],
+            albumArtist=row[4],
+            genre=row[5],
+            dateLastPlayed=row[6],
+            playCount=row[7],
+            rating=row[8]
+        )
+        return LibraryTagIndexEntry(row[0], tags, self._getStatFromValues(row[9], row[10], row[11]))
+
+    def _getStatFromValues(self, size, mtimeNs, inode) -> Optional[dict]:
+        if (size is None):
+            return None
+
+        return {
+            'size': size,
+            'mtimeNs': mtimeNs,
+            'inode': inode
+        }
+
+    def _getGenresList(self, genre) -> List[str]:
+        if (isinstance(genre, list)):
+            return genre
+        return mlu.tags.common.formatAudioTagToValuesList(genre)
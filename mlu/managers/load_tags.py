@@ -1,17 +1,54 @@
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.logger
 import com.nwrobel.mypycommons.file
 import mlu.tags.io
+import mlu.tags.values
 import mlu.tags.common
 import mlu.library.audiolib
+from mlu.library.tagindex import LibraryTagIndex, LibraryTagIndexEntry
 from mlu.settings import MLUSettings
 
-class AudioFileTagsJson:
-    def __init__(self, filepath, tags):
+class AudioFileTagsScanResult:
+    '''
+    Result of reading the tags of a single audio file during a library scan: either tags is set, or
+    errorMessage is set if the tags could not be read.
+    '''
+    def __init__(self, filepath, tags, stat, errorMessage):
         self.filepath = filepath
-        self.tags = tags.__dict__
+        self.tags = tags
+        self.stat = stat
+        self.errorMessage = errorMessage
+
+def readAudioFileTagsForScan(audioFilepath, useFastRead=False) -> AudioFileTagsScanResult:
+    '''
+    Reads the tags of the given audio file. Any failure is returned in the result instead of being
+    raised, so that one bad file does not abort the whole library scan.
+
+    If useFastRead is True, the header-only readers are used for the formats that have one.
+    '''
+    try:
+        # Get the stat signature before reading, so that a change made while the file is being read
+        # is detected by the next scan
+        stat = mlu.library.audiolib.getAudioFileStatSignature(audioFilepath)
+        tagHandler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath, useFastRead)
+        return AudioFileTagsScanResult(audioFilepath, tagHandler.getTags(), stat, None)
+
+    except Exception:
+        return AudioFileTagsScanResult(audioFilepath, None, None, traceback.format_exc())
+
+def getAudioFileStatSignatureOrNone(audioFilepath):
+    try:
+        return mlu.library.audiolib.getAudioFileStatSignature(audioFilepath)
+    except OSError:
+        return None
 
 class LoadLibraryTagsManager:
+    _INDEX_WRITE_BATCH_SIZE = 1000
+
     def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger):
         if (mluSettings is None):
             raise TypeError("MLUSettings not passed to RatestatTagsUpdater")
@@ -21,25 +58,131 @@ class LoadLibraryTagsManager:
         self.settings = mluSettings
         self.logger = commonLogger.getLogger()
 
-    
-    def saveLibraryTagsSnapshot(self):
+
+    def saveLibraryTagsSnapshot(self, fullScan=False):
+        '''
+        Updates the library tag index with the tags of all library audio files, then exports the
+        index to the tag snapshot JSON file (tagBackupFilepath).
+
+        By default, tags are only read again for audio files that are new or whose stat signature
+        (size, modified time, inode) has changed since they were indexed, and entries for audio
+        files that no longer exist are removed. If fullScan is True, the tags of every audio file
+        are read again.
+        '''
         allAudioFilepaths = mlu.library.audiolib.getAllLibraryAudioFilepaths(self.settings.userConfig.audioLibraryRootDir)
+        allAudioFilepaths.sort()
+        scanWorkers = self.settings.userConfig.libraryTagsConfig.scanWorkers
+
+        with LibraryTagIndex(self.settings.userConfig.tagIndexFilepath) as tagIndex:
+            if (tagIndex.getEntriesCount() == 0):
+                self._importSnapshotFileToIndex(tagIndex)
+
+            indexedStats = tagIndex.getStatSignatures()
+
+            # Find the audio files whose index entry is still up to date
+            unchangedCount = 0
+            audioFilepathsToRead = []
+            currentStats = self._getAudioFilesStatSignatures(allAudioFilepaths, scanWorkers)
+
+            for audioFilepath, currentStat in zip(allAudioFilepaths, currentStats):
+                if (not fullScan and currentStat is not None and indexedStats.get(audioFilepath) == currentStat):
+                    unchangedCount += 1
+                else:
+                    audioFilepathsToRead.append(audioFilepath)
+
+            removedAudioFilepaths = set(indexedStats) - set(allAudioFilepaths)
+            self.logger.info("Library audio files: {} total, {} unchanged, {} new or changed, {} removed since the previous snapshot".format(
+                len(allAudioFilepaths),
+                unchangedCount,
+                len(audioFilepathsToRead),
+                len(removedAudioFilepaths)
+            ))
+            tagIndex.deleteEntries(removedAudioFilepaths)
+
+            self.logger.info("Reading tags for {} library audio files ({} workers)".format(len(audioFilepathsToRead), scanWorkers))
+            failedScanResults = []
+            entriesToWrite = []
+
+            for scanResult in self._scanAudioFilesTags(audioFilepathsToRead, scanWorkers, self.settings.userConfig.libraryTagsConfig.fastRead):
+                if (scanResult.errorMessage):
+                    self.logger.error("Failed to read tags for audio file, skipping: File='{}'\n{}".format(scanResult.filepath, scanResult.errorMessage))
+                    failedScanResults.append(scanResult)
+                else:
+                    entriesToWrite.append(LibraryTagIndexEntry(scanResult.filepath, scanResult.tags, scanResult.stat))
+
+                    if (len(entriesToWrite) >= self._INDEX_WRITE_BATCH_SIZE):
+                        tagIndex.upsertEntries(entriesToWrite)
+                        entriesToWrite = []
+
+            tagIndex.upsertEntries(entriesToWrite)
+
+            if (failedScanResults):
+                # Don't keep outdated entries for files that could not be read again
+                tagIndex.deleteEntries([scanResult.filepath for scanResult in failedScanResults])
+
+                failedFilepathsFmt = "\n".join([scanResult.filepath for scanResult in failedScanResults])
+                self.logger.warning("Tags could not be read for {} audio files, these are not in the snapshot:\n{}".format(len(failedScanResults), failedFilepathsFmt))
+
+            # Keep writing the JSON snapshot file, for backward compatibility
+            self.logger.info("Exporting library tag index to snapshot file: {}".format(self.settings.userConfig.tagBackupFilepath))
+            tagIndex.exportJsonFile(self.settings.userConfig.tagBackupFilepath)
+
+    def _importSnapshotFileToIndex(self, tagIndex: LibraryTagIndex):
+        '''
+        Fills the (empty) tag index from an existing tag snapshot JSON file, if there is one, so
+        that the first scan using the index does not need to read every audio file again.
+        '''
+        tagBackupFilepath = self.settings.userConfig.tagBackupFilepath
+        if (not mypycommons.file.pathExists(tagBackupFilepath)):
+            return
+
+        try:
+            snapshotJson = mypycommons.file.readJsonFile(tagBackupFilepath)
+            entries = [
+                LibraryTagIndexEntry(item['filepath'], mlu.tags.values.AudioFileTags.fromJsonDict(item['tags']), item.get('stat'))
+                for item in snapshotJson
+            ]
+        except Exception:
+            self.logger.exception("Failed to import the tag snapshot file into the tag index, all audio files will be read: File='{}'".format(tagBackupFilepath))
+            return
+
+        self.logger.info("Importing {} entries from tag snapshot file into the empty tag index".format(len(entries)))
+        tagIndex.upsertEntries(entries)
+
+    def _getAudioFilesStatSignatures(self, audioFilepaths, scanWorkers):
+        '''
+        Returns the stat signature of each of the given audio files (None if the file could not be
+        stat'ed), in the same order as the given filepaths.
+        '''
+        if (scanWorkers <= 1):
+            return [getAudioFileStatSignatureOrNone(audioFilepath) for audioFilepath in audioFilepaths]
+
+        with ThreadPoolExecutor(max_workers=scanWorkers) as executor:
+            return list(executor.map(getAudioFileStatSignatureOrNone, audioFilepaths))
+
+    def _scanAudioFilesTags(self, audioFilepaths, scanWorkers, useFastRead):
+        '''
+        Yields an AudioFileTagsScanResult for each of the given audio files, in the same order as
+        the given filepaths.
+
+        With more than 1 worker, the files are read on a thread pool. Only a bounded number of
+        reads are queued ahead of the result currently being yielded, so results are streamed
+        instead of all being held until the scan completes.
+        '''
+        if (scanWorkers <= 1):
+            for audioFilepath in audioFilepaths:
+                yield readAudioFileTagsForScan(audioFilepath, useFastRead)
+            return
 
-        allTags = []
-        for audioFilepath in allAudioFilepaths:
-            tagHandler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath)
-            currentTags = tagHandler.getTags()
+        maxPendingReads = scanWorkers * 4
+        with ThreadPoolExecutor(max_workers=scanWorkers) as executor:
+            pendingReads = deque()
 
-            allTags.append(
-                AudioFileTagsJson(audioFilepath, currentTags)
-            )
-        
-        if (mypycommons.file.pathExists(self.settings.userConfig.tagBackupFilepath)):
-            mypycommons.file.deletePath(self.settings.userConfig.tagBackupFilepath)
+            for audioFilepath in audioFilepaths:
+                pendingReads.append(executor.submit(readAudioFileTagsForScan, audioFilepath, useFastRead))
 
-        allTagsJson = [tags.__dict__ for tags in allTags]
-        
-        if (mypycommons.file.pathExists(self.settings.userConfig.tagBackupFilepath)):
-            mypycommons.file.deletePath(self.settings.userConfig.tagBackupFilepath)
+                if (len(pendingReads) >= maxPendingReads):
+                    yield pendingReads.popleft().result()
 
-        mypycommons.file.writeJsonFile(self.settings.userConfig.tagBackupFilepath, allTagsJson)
\ No newline at end of file
+            while (pendingReads):
+                yield pendingReads.popleft().result()
@@ -5,24 +5,10 @@ import mlu.tags.io
 import mlu.tags.values
 import mlu.tags.common
 import mlu.library.audiolib
+from mlu.library.tagindex import LibraryTagIndex
+from mlu.library.table import LibraryTable, getRowIdsFromBitset
+import mlu.library.genrequery
 from mlu.settings import MLUSettings
-import re
-
-
-class AutoplaylistQueryResult:
-    def __init__(self, filepath, tags, genresQuery, fileHasGenresQuery, originalQuery):
-        self.filepath = filepath
-        self.tags = tags
-        self.genresQuery = genresQuery # ex ['Industrial', 'Industrial Rock', 'Industrial Metal']
-        self.fileHasGenresQuery = fileHasGenresQuery  # ex: [False, True, True]
-
-        logicalQuery = originalQuery.replace("'", "")
-        counter = 0
-        for genre in genresQuery:
-            logicalQuery = logicalQuery.replace(genre, str(self.fileHasGenresQuery[counter]), 1)
-            counter += 1
-
-        self.expression = logicalQuery
 
 class WriteAutoplaylistsManager:
     def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger):
@@ -33,9 +19,22 @@ class WriteAutoplaylistsManager:
 
         self._settings = mluSettings
         self._logger = commonLogger.getLogger()
+
+        # Parse the advanced playlist queries first, so an invalid query fails before anything is loaded
+        self._advancedQueries = [
+            mlu.library.genrequery.parseGenreQuery(advancedCfg.query)
+            for advancedCfg in self._settings.userConfig.autoplaylistsConfig.unratedConfig.advancedConfigs
+        ]
         
-        tagFile = self._settings.userConfig.tagBackupFilepath
-        self._tagsJson = mypycommons.file.readJsonFile(tagFile)
+        tagIndexFilepath = self._settings.userConfig.tagIndexFilepath
+        if (not mypycommons.file.pathExists(tagIndexFilepath)):
+            raise FileNotFoundError("Library tag index not found, load the library tags first: {}".format(tagIndexFilepath))
+
+        # Load the library once: all playlists are computed from the in-memory table
+        with LibraryTagIndex(tagIndexFilepath) as tagIndex:
+            self._libraryTable = LibraryTable.fromTagIndex(tagIndex)
+
+        self._logger.info("Loaded {} library audio files from the tag index".format(self._libraryTable.getRowCount()))
 
         self._clearPreviousAutoplaylists()
 
@@ -62,81 +61,26 @@ class WriteAutoplaylistsManager:
     def writeRatingAutoplaylists(self):
         for ratingPlaylistCfg in self._settings.userConfig.autoplaylistsConfig.ratingConfigs:
             playlistFilepath = mypycommons.file.joinPaths(self._settings.userConfig.autoplaylistsConfig.outputDir, ratingPlaylistCfg.filename)
-            playlistItems = []
-           
-            for audioFileTags in self._tagsJson:
-                filepath = audioFileTags['filepath']
-                tags = mlu.tags.values.AudioFileTags.fromJsonDict(audioFileTags['tags'])
-
-                if (tags.rating >= ratingPlaylistCfg.minValue and tags.rating <= ratingPlaylistCfg.maxValue):
-                    playlistItems.append(
-                        {
-                            'filepath': filepath,
-                            'tags': tags
-                        }
-                    )
-
-            # sort by multiple attributes
-            # Rating descending, then by albumArtist - album 
-            playlistItems.sort(key=lambda x: (x['tags'].albumArtist, x['tags'].album))
-            playlistItems.sort(key=lambda x: (float(x['tags'].rating)), reverse=True)
-
-            playlistItemsSorted = []
-            for playlistItem in playlistItems:
-                playlistItemsSorted.append(playlistItem['filepath'])
+
+            # sorted by rating descending, then by albumArtist - album
+            rowIds = self._libraryTable.getRowsByRating(ratingPlaylistCfg.minValue, ratingPlaylistCfg.maxValue)
+            playlistItemsSorted = self._libraryTable.getFilepaths(rowIds)
 
             mypycommons.file.writeToFile(filepath=playlistFilepath, content=playlistItemsSorted) 
 
     def writeUnratedAutoplaylists(self):
-        for advancedCfg in self._settings.userConfig.autoplaylistsConfig.unratedConfig.advancedConfigs:
-            playlistFilepath = mypycommons.file.joinPaths(self._settings.userConfig.autoplaylistsConfig.outputDir, advancedCfg.filename)
-            playlistItems = []
-
-            query = advancedCfg.query
-            theGenres = re.findall(r"'(.*?)'", query, re.DOTALL)
-            queryResults = []
-
-            for audioFileTags in self._tagsJson:
-                filepath = audioFileTags['filepath']
-                tags = mlu.tags.values.AudioFileTags.fromJsonDict(audioFileTags['tags'])
-                fileHasGenresQuery = []
-
-                for genre in theGenres:
-                    if (genre in tags.genre):
-                        fileHasGenresQuery.append(True)
-                    else:
-                        fileHasGenresQuery.append(False)
-
-                queryResults.append(
-                    AutoplaylistQueryResult(filepath, tags, theGenres, fileHasGenresQuery, query)
-                )
-
-            # Take AutoplaylistQueryResult and feed it to the python eval
-            for result in queryResults:
-                shouldBeInAutoplaylist = (eval(result.expression) and result.tags.rating == 0)
-                if (shouldBeInAutoplaylist):
-                    playlistItems.append(
-                    {
-                            'filepath': result.filepath,
-                            'tags': result.tags
-                        }
-                    )
-
-            playlistItems.sort(key=lambda x: (x['tags'].albumArtist, x['tags'].album))
-            playlistFilepaths = [x['filepath'] for x in playlistItems]
+        advancedCfgs = self._settings.userConfig.autoplaylistsConfig.unratedConfig.advancedConfigs
 
-            mypycommons.file.writeToFile(filepath=playlistFilepath, content=playlistFilepaths) 
-
-
-    def _audioFileHasThisGenre(self, filepath, theGenre):
+        for advancedCfg, advancedQuery in zip(advancedCfgs, self._advancedQueries):
+            playlistFilepath = mypycommons.file.joinPaths(self._settings.userConfig.autoplaylistsConfig.outputDir, advancedCfg.filename)
 
-        item = [audioFileTags for audioFileTags in self._tagsJson if audioFileTags[filepath] == filepath]
-        tags = mlu.tags.values.AudioFileTags.fromJsonDict(item[0]['tags'])
+            # sorted by albumArtist - album
+            playlistBitset = advancedQuery.evaluate(self._libraryTable) & self._libraryTable.unratedBitset
+            playlistRowIds = getRowIdsFromBitset(playlistBitset)
+            playlistFilepaths = self._libraryTable.getFilepaths(self._libraryTable.sortRowsByAlbum(playlistRowIds))
 
-        if (theGenre in tags.genre):
-            return True
+            mypycommons.file.writeToFile(filepath=playlistFilepath, content=playlistFilepaths) 
 
-        return False
 
     def writeUnratedSimpleGenreAutoplaylists(self):
         filenamePattern = self._settings.userConfig.autoplaylistsConfig.unratedConfig.simpleCfg.filenamePattern
@@ -146,106 +90,8 @@ class WriteAutoplaylistsManager:
             filename = filenamePattern.format(givenGenre)
             playlistFilepath = mypycommons.file.joinPaths(self._settings.userConfig.autoplaylistsConfig.outputDir, filename)
 
-            itemsMatching = self._getFilesMatchingGenre(givenGenre)
-            itemsMatching.sort(key=lambda x: (x['tags'].albumArtist, x['tags'].album))
-            playlistFilepaths = [x['filepath'] for x in itemsMatching]
+            # sorted by albumArtist - album
+            rowIds = self._libraryTable.getUnratedRowsByGenre(givenGenre)
+            playlistFilepaths = self._libraryTable.getFilepaths(rowIds)
 
             mypycommons.file.writeToFile(filepath=playlistFilepath, content=playlistFilepaths) 
-
-    
-    def _getFilesMatchingGenre(self, genre):
-        playlistItems = []
-        for audioFileTags in self._tagsJson:
-            filepath = audioFileTags['filepath']
-            tags = mlu.tags.values.AudioFileTags.fromJsonDict(audioFileTags['tags'])
-
-            if (genre in tags.genre and
-                tags.rating == 0):
-                    playlistItems.append(
-                        {
-                            'filepath': filepath,
-                            'tags': tags
-                        }
-                    )           
-
-        return playlistItems
-
-    
-
-  
-    
-    def _removeDupes(self, playlistItems):
-        unique = {}
-        for item in playlistItems:
-            unique[item['filepath']] = item['tags']
-
-        newList = []
-        for filepath, tags in unique.items():
-            newList.append(
-            {
-                'filepath': filepath,
-                'tags': tags
-            }
-        )
-        return newList
-
-    def _getPlaylistItems(self, filepaths):
-        items = [x for x in self._tagsJson if (x['filepath'] in filepaths)]
-        return items
-
-    def _sortPlaylistItems(self, playlistItems):
-        # sort by albumArtist - album 
-        playlistItems.sort(key=lambda x: (x['tags'].albumArtist, x['tags'].album))
-
-    def _removeDupesFromList(self, inputList):
-        return list(dict.fromkeys(inputList))
-
-    def _getPlaylistItemsOR(self, unratedCfg):
-        playlistItems = []
-        for audioFileTags in self._tagsJson:
-            filepath = audioFileTags['filepath']
-            tags = mlu.tags.values.AudioFileTags.fromJsonDict(audioFileTags['tags'])
-
-            # if the configured genre is in the list of genres for this song
-            for genreCfg in unratedCfg.genres:
-                if (genreCfg in tags.genre and 
-                    tags.rating == 0 and 
-                    not self._isFilepathIsInList(playlistItems, filepath)
-                ):
-                    playlistItems.append(
-                        {
-                            'filepath': filepath,
-                            'tags': tags
-                        }
-                    )   
-        return playlistItems
-
-    def _getPlaylistItemsAND(self, unratedCfg):
-        playlistItems = []
-        for audioFileTags in self._tagsJson:
-            filepath = audioFileTags['filepath']
-            tags = mlu.tags.values.AudioFileTags.fromJsonDict(audioFileTags['tags'])
-
-            hasAllGenres = True
-            for genreCfg in unratedCfg.genres:
-                if (not genreCfg in tags.genre):
-                    hasAllGenres = False
-
-            if (hasAllGenres and tags.rating == 0):
-                playlistItems.append(
-                    {
-                        'filepath': filepath,
-                        'tags': tags
-                    }
-                )   
-        return playlistItems
-
-    def _isFilepathIsInList(self, inputList, filepath):
-        found = [x for x in inputList if x['filepath'] == filepath]
-        if (found):
-            return True
-        else:
-            return False
-
-
-
@@ -0,0 +1,76 @@
+'''
+mlu.mpd.checkpoint
+
+Module containing the MPD log checkpoint, which records how far the MPD log file has been ingested,
+so that the next incremental ingestion only reads the lines appended since.
+'''
+
+from typing import Optional
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+class MpdLogCheckpoint:
+    '''
+    Position in the MPD log file up to which the log has been ingested.
+
+    Params:
+        inode: inode of the log file when it was read, used to detect that it was rotated
+        offset: byte offset of the end of the last ingested line (where the next read starts)
+        lastLineOffset: byte offset of the start of the last ingested line
+        lastLineHash: hash of the last ingested line, used to detect that the log file was
+            truncated or replaced (None if no line was ingested)
+        lastLineDateTime: formatted timestamp of the last ingested line, for display
+        pendingPlaybackLine: text of the last playback line read, whose end (and so duration) is
+            only known once the next line is written: it is ingested by the next run (or None)
+        previousOffset: offset of the checkpoint that this one continues from
+        previousLastLineHash: lastLineHash of the checkpoint that this one continues from
+    '''
+    def __init__(
+        self,
+        inode: int,
+        offset: int,
+        lastLineOffset: int,
+        lastLineHash: Optional[str],
+        lastLineDateTime: Optional[str],
+        pendingPlaybackLine: Optional[str],
+        previousOffset: Optional[int],
+        previousLastLineHash: Optional[str]
+    ):
+        self.inode = inode
+        self.offset = offset
+        self.lastLineOffset = lastLineOffset
+        self.lastLineHash = lastLineHash
+        self.lastLineDateTime = lastLineDateTime
+        self.pendingPlaybackLine = pendingPlaybackLine
+        self.previousOffset = previousOffset
+        self.previousLastLineHash = previousLastLineHash
+
+    @classmethod
+    def fromJsonDict(cls, jsonDict):
+        return cls(**jsonDict)
+
+    def getDictForJsonFile(self) -> dict:
+        return self.__dict__.copy()
+
+    def continuesFrom(self, previousCheckpoint: Optional['MpdLogCheckpoint']) -> bool:
+        '''
+        Returns whether or not this checkpoint was made by an ingestion that started from the given
+        checkpoint (None for an ingestion without a previous checkpoint).
+        '''
+        if (previousCheckpoint is None):
+            return (self.previousOffset is None)
+
+        return (self.previousOffset == previousCheckpoint.offset and self.previousLastLineHash == previousCheckpoint.lastLineHash)
+
+def readCheckpointFile(checkpointFilepath: str) -> Optional[MpdLogCheckpoint]:
+    '''
+    Returns the checkpoint saved in the given file, or None if the file does not exist.
+    '''
+    if (not mypycommons.file.pathExists(checkpointFilepath)):
+        return None
+
+    return MpdLogCheckpoint.fromJsonDict(mypycommons.file.readJsonFile(checkpointFilepath))
+
+def writeCheckpointFile(checkpointFilepath: str, checkpoint: MpdLogCheckpoint) -> None:
+    mypycommons.file.writeJsonFile(checkpointFilepath, checkpoint.getDictForJsonFile())
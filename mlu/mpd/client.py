@@ -0,0 +1,265 @@
+'''
+mlu.mpd.client
+
+Module containing a minimal MPD protocol client, and the playback tracker, which follows the
+player state through the client to record playbacks as they happen, with the exact time played.
+'''
+
+import socket
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+from mlu.tags.playstats.common import Playback
+
+class MpdProtocolError(Exception):
+    '''
+    Raised when MPD answers a command with an error (ACK), or with an unexpected response.
+    '''
+    def __init__(self, message):
+        super().__init__(message)
+
+class MpdClient:
+    '''
+    Client for the MPD protocol, connected to MPD over TCP, or over its unix socket if host is the
+    path of the socket.
+
+    Params:
+        host: host name/address of MPD, or filepath of its unix socket
+        port: TCP port of MPD (not used for a unix socket)
+        password: password to send to MPD once connected (None for no password)
+        timeout: timeout in seconds of the connection and of the commands (not of idle)
+    '''
+    def __init__(self, host: str, port: int = 6600, password: Optional[str] = None, timeout: float = 10):
+        if (not host):
+            raise ValueError("host not passed")
+
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self._socket = None
+        self._socketFile = None
+
+        # Close the socket if the connection can't be set up, as the caller gets no client to close
+        try:
+            if (host.startswith('/')):
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(timeout)
+                self._socket.connect(host)
+            else:
+                self._socket = socket.create_connection((host, port), timeout=timeout)
+
+            self._socketFile = self._socket.makefile(mode='rb')
+
+            greeting = self._readLine()
+            if (not greeting.startswith('OK MPD ')):
+                raise MpdProtocolError("Not an MPD server greeting: {}".format(greeting))
+            self.protocolVersion = greeting[len('OK MPD '):]
+
+            if (password):
+                self.sendCommand('password', password)
+        except:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if (self._socketFile is not None):
+            self._socketFile.close()
+        if (self._socket is not None):
+            self._socket.close()
+
+    def sendCommand(self, command: str, *args: str) -> List[Tuple[str, str]]:
+        '''
+        Sends a command with the given arguments, and returns the (key, value) pairs of the response.
+        '''
+        self._writeCommand(command, args)
+        return self._readResponse()
+
+    def getStatusAndCurrentSong(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        '''
+        Returns the player status and the current song (empty if there is none), read together in
+        one command list, so that they describe the same player state.
+        '''
+        self._writeLines(['command_list_ok_begin', 'status', 'currentsong', 'command_list_end'])
+
+        status = dict(self._readResponse(listItem=True))
+        currentSong = dict(self._readResponse(listItem=True))
+        self._readResponse()
+
+        return (status, currentSong)
+
+    def idle(self, *subsystems: str) -> List[str]:
+        '''
+        Waits (without timeout) until MPD reports a change in one of the given subsystems (any
+        subsystem if none given), and returns the names of the subsystems that changed.
+        '''
+        self._writeCommand('idle', subsystems)
+
+        self._socket.settimeout(None)
+        try:
+            response = self._readResponse()
+        finally:
+            self._socket.settimeout(self.timeout)
+
+        return [value for (key, value) in response if (key == 'changed')]
+
+    def _writeCommand(self, command: str, args) -> None:
+        self._writeLines([' '.join([command] + [self._quoteArgument(arg) for arg in args])])
+
+    def _writeLines(self, lines: List[str]) -> None:
+        self._socket.sendall(''.join(line + '\n' for line in lines).encode('utf-8'))
+
+    def _quoteArgument(self, arg: str) -> str:
+        return '"{}"'.format(str(arg).replace('\\', '\\\\').replace('"', '\\"'))
+
+    def _readLine(self) -> str:
+        line = self._socketFile.readline()
+        if (not line):
+            raise ConnectionError("Connection to MPD closed")
+
+        return line.decode('utf-8').rstrip('\n')
+
+    def _readResponse(self, listItem: bool = False) -> List[Tuple[str, str]]:
+        '''
+        Reads the (key, value) pairs of a response, up to its end line: 'OK', or 'list_OK' for the
+        response of a command in a command list (listItem).
+        '''
+        endLine = 'list_OK' if (listItem) else 'OK'
+        pairs = []
+
+        while True:
+            line = self._readLine()
+            if (line == endLine):
+                return pairs
+            if (line.startswith('ACK ')):
+                raise MpdProtocolError("MPD error: {}".format(line))
+
+            (key, separator, value) = line.partition(': ')
+            if (not separator):
+                raise MpdProtocolError("Unexpected line in MPD response: {}".format(line))
+            pairs.append((key, value))
+
+class MpdPlaybackTracker:
+    '''
+    Follows the state of the MPD player, and records a Playback for each song played when it ends
+    (another song starts, the same song starts over, the player is stopped, the connection is lost
+    or tracking ends). The playback duration is the time the song was actually in the playing
+    state: time paused is not counted.
+
+    Params:
+        audioLibraryRootDir: root dir of the audio library, which MPD song paths are relative to
+        onPlayback: called with each recorded Playback (songs that are not library files, such as
+            streams, are not recorded)
+    '''
+    # How far the elapsed time of the song can be behind the position expected from the previous
+    # update before the song is considered started over (repeat single, seek back)
+    _ELAPSED_REWIND_TOLERANCE = timedelta(seconds=1)
+
+    def __init__(self, audioLibraryRootDir: str, onPlayback: Callable[[Playback], None]):
+        if (onPlayback is None):
+            raise ValueError("onPlayback not passed")
+
+        self._audioLibraryRootDir = audioLibraryRootDir
+        self._onPlayback = onPlayback
+        self._songId = None
+        self._songFilepath = None
+        self._songStartDateTime = None
+        self._playedTime = timedelta()
+        self._playingSince = None
+        self._elapsed = None
+        self._elapsedDateTime = None
+
+    def track(self, client: MpdClient) -> None:
+        '''
+        Tracks the player through the given client until the connection fails: reads the player
+        state, then waits for it to change with 'idle player', over and over.
+
+        When the connection fails, the playback of the current song is ended at that time, so that
+        the time until the tracker is reconnected is not counted as played.
+        '''
+        try:
+            while True:
+                (status, currentSong) = client.getStatusAndCurrentSong()
+                self.update(status, currentSong, datetime.now())
+                client.idle('player')
+
+        except (OSError, MpdProtocolError):
+            self.finish(datetime.now())
+            raise
+
+    def update(self, status: Dict[str, str], currentSong: Dict[str, str], now: datetime) -> None:
+        '''
+        Updates the tracked state from the given MPD status and current song, read at the given
+        time.
+        '''
+        state = status.get('state')
+        songId = status.get('songid') if (state in ('play', 'pause')) else None
+        elapsed = timedelta(seconds=float(status.get('elapsed', 0)))
+
+        if (songId != self._songId):
+            self.finish(now)
+            if (songId is not None):
+                self._startPlayback(songId, currentSong, elapsed, now)
+
+        elif (songId is not None and elapsed < self._getExpectedElapsed(now) - self._ELAPSED_REWIND_TOLERANCE):
+            # Same song started over: the previous playback ended when this one started (but not
+            # before the previous update, if the song was sought back)
+            self.finish(max(now - elapsed, self._elapsedDateTime))
+            self._startPlayback(songId, currentSong, elapsed, now)
+
+        else:
+            self._pausePlayedTime(now)
+
+        if (songId is not None):
+            self._elapsed = elapsed
+            self._elapsedDateTime = now
+
+        if (state == 'play'):
+            self._playingSince = now
+
+    def finish(self, now: datetime) -> None:
+        '''
+        Ends the playback of the current song (if any) at the given time, and records it.
+        '''
+        if (self._songId is None):
+            return
+
+        self._pausePlayedTime(now)
+        if (self._songFilepath is not None):
+            self._onPlayback(Playback(self._songFilepath, self._songStartDateTime, self._playedTime))
+
+        self._songId = None
+        self._songFilepath = None
+        self._songStartDateTime = None
+        self._playedTime = timedelta()
+        self._playingSince = None
+        self._elapsed = None
+        self._elapsedDateTime = None
+
+    def _startPlayback(self, songId: str, currentSong: Dict[str, str], elapsed: timedelta, now: datetime) -> None:
+        self._songId = songId
+        self._songFilepath = self._getSongFilepath(currentSong.get('file'))
+        self._songStartDateTime = now - elapsed
+        self._playedTime = elapsed
+
+    def _getExpectedElapsed(self, now: datetime) -> timedelta:
+        '''
+        Returns the elapsed time the current song should be at, from the previous update.
+        '''
+        if (self._playingSince is not None):
+            return self._elapsed + (now - self._elapsedDateTime)
+        return self._elapsed
+
+    def _pausePlayedTime(self, now: datetime) -> None:
+        if (self._playingSince is not None):
+            self._playedTime += (now - self._playingSince)
+            self._playingSince = None
+
+    def _getSongFilepath(self, songFile: Optional[str]) -> Optional[str]:
+        if (not songFile or '://' in songFile):
+            return None
+
+        return mypycommons.file.joinPaths(self._audioLibraryRootDir, songFile)
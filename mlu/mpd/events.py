@@ -0,0 +1,90 @@
+'''
+mlu.mpd.events
+
+Module containing the MPD log line classifier, which tags each log line with the type of event it
+records (a song played, a client connection opened or closed, etc) in a single regex match.
+'''
+
+import re
+from typing import Optional, Tuple
+
+class MpdLogEventType:
+    '''
+    Types of the events recorded by MPD log lines. Lines that record none of the event types known
+    to the classifier are OTHER (junk lines, for the playbacks).
+    '''
+    OTHER = 'other'
+    PLAYED = 'played'
+    CLIENT_OPENED = 'client-opened'
+    CLIENT_CLOSED = 'client-closed'
+
+class MpdLogLineClassifier:
+    '''
+    Classifies MPD log lines by event type, and captures the path of the audio file for the events
+    that have one, with a single precompiled regex: the patterns of all event types are combined
+    into one alternation, and the alternative that matched gives the event type.
+
+    The played, client opened and client closed event types are added by default. More event types
+    (pause, seek, stop, etc) can be added with addEventType.
+    '''
+    def __init__(self):
+        self._eventTypePatterns = []
+        self._keywords = []
+        self._eventTypesByGroupName = {}
+        self._regex = None
+
+        self.addEventType(MpdLogEventType.PLAYED, 'player: played "', r'player: played "(?P<path>[^"]*)"(?:.*")?$')
+        self.addEventType(MpdLogEventType.CLIENT_OPENED, 'client: ', r'client: .* opened from')
+        self.addEventType(MpdLogEventType.CLIENT_CLOSED, 'client: ', r'client: .* closed$')
+
+    def addEventType(self, eventType: str, keyword: str, pattern: str) -> None:
+        '''
+        Adds an event type, whose lines are those in which the given regex pattern is found. The
+        pattern can capture the path of the audio file in a group named 'path'. When a line
+        matches the patterns of several event types, it gets the one that was added first.
+
+        keyword is a literal text that is in all lines of the event type: it is used for the cheap
+        check done on the raw lines before they are parsed (see rawLineMayHaveEvent).
+        '''
+        if (not eventType):
+            raise ValueError("eventType not passed")
+        if (not keyword):
+            raise ValueError("keyword not passed")
+
+        eventIndex = len(self._eventTypePatterns)
+        eventGroupName = 'event{}'.format(eventIndex)
+        pathGroupName = 'path{}'.format(eventIndex)
+
+        # Group names must be unique in the combined regex
+        eventPattern = '(?P<{}>{})'.format(eventGroupName, pattern.replace('(?P<path>', '(?P<{}>'.format(pathGroupName)))
+
+        self._eventTypePatterns.append(eventPattern)
+        self._eventTypesByGroupName[eventGroupName] = (eventType, pathGroupName if (pathGroupName in eventPattern) else None)
+        if (keyword not in self._keywords):
+            self._keywords.append(keyword)
+
+        self._regex = re.compile('|'.join(self._eventTypePatterns), re.DOTALL)
+
+    def rawLineMayHaveEvent(self, rawLogLine: str) -> bool:
+        '''
+        Cheap check done on the raw text of a log line before it is parsed: returns False for lines
+        that can't be of any of the event types (OTHER lines).
+        '''
+        for keyword in self._keywords:
+            if (keyword in rawLogLine):
+                return True
+
+        return False
+
+    def classify(self, lineText: str) -> Tuple[str, Optional[str]]:
+        '''
+        Returns the event type of the log line with the given text (MpdLogLine.text), and the path
+        captured for it (None if the event type has no path).
+        '''
+        match = self._regex.search(lineText)
+        if (match is None):
+            return (MpdLogEventType.OTHER, None)
+
+        # The group of the event type closes after its path group, so it is the last group matched
+        (eventType, pathGroupName) = self._eventTypesByGroupName[match.lastgroup]
+        return (eventType, match.group(pathGroupName) if (pathGroupName) else None)
@@ -0,0 +1,114 @@
+'''
+mlu.mpd.journal
+
+Module containing the playback journal: the file that the playbacks recorded live from MPD (see
+mlu.mpd.client.MpdPlaybackTracker) are appended to, one JSON object per line, until they are loaded
+to update the playstat tags.
+'''
+
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+from typing import Iterator, List
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+import com.nwrobel.mypycommons.time
+
+from mlu.tags.playstats.common import Playback
+
+class PlaybackJournal:
+    '''
+    Playback journal file. Playbacks are appended with append(); loading them moves them out of
+    the journal (to the loading file: journalFilepath + '.loading'), so that playbacks recorded
+    while they are processed go to a new journal file, and are loaded the next time.
+
+    Appending and moving the journal are done while holding an exclusive lock (flock) on the lock
+    file (journalFilepath + '.lock'), so a playback is never appended to a journal that was
+    already moved and read.
+    '''
+    def __init__(self, journalFilepath: str):
+        if (not journalFilepath):
+            raise ValueError("journalFilepath not passed")
+
+        self.journalFilepath = journalFilepath
+        self.loadingFilepath = journalFilepath + '.loading'
+        self.lockFilepath = journalFilepath + '.lock'
+
+    def append(self, playback: Playback) -> None:
+        entry = {
+            'audioFilepath': playback.audioFilepath,
+            'dateTime': mypycommons.time.formatDatetimeForDisplay(playback.dateTime),
+            'playbackDuration': str(playback.duration) if (playback.duration is not None) else None
+        }
+
+        # The file is opened for each playback (under the lock), so a journal moved away for
+        # loading is never written to again
+        with self._lockJournal():
+            with open(self.journalFilepath, mode='a', encoding='utf-8') as journalFile:
+                journalFile.write(json.dumps(entry) + '\n')
+
+    def startLoading(self) -> List[Playback]:
+        '''
+        Moves the playbacks written to the journal so far to the loading file, and returns all the
+        playbacks in the loading file. If the previous load was not finished (finishLoading), its
+        playbacks are still in the loading file, and are returned again.
+        '''
+        movedFilepath = self.journalFilepath + '.moving'
+
+        # A moved journal left by an interrupted load is added first, so it is not replaced
+        self._appendToLoadingFile(movedFilepath)
+
+        with self._lockJournal():
+            if (mypycommons.file.pathExists(self.journalFilepath)):
+                os.replace(self.journalFilepath, movedFilepath)
+
+        self._appendToLoadingFile(movedFilepath)
+
+        if (not mypycommons.file.pathExists(self.loadingFilepath)):
+            return []
+
+        playbacks = []
+        with open(self.loadingFilepath, mode='r', encoding='utf-8') as loadingFile:
+            for line in loadingFile:
+                if (line.strip()):
+                    playbacks.append(self._getPlaybackFromEntry(json.loads(line)))
+
+        return playbacks
+
+    def finishLoading(self, destFilepath: str) -> None:
+        '''
+        Moves the loading file (the loaded playbacks) to the given filepath, once they are saved.
+        '''
+        if (mypycommons.file.pathExists(self.loadingFilepath)):
+            shutil.move(self.loadingFilepath, destFilepath)
+
+    def _appendToLoadingFile(self, movedFilepath: str) -> None:
+        '''
+        Appends the given moved journal file to the loading file, and removes it (if it exists).
+        '''
+        if (mypycommons.file.pathExists(movedFilepath)):
+            with open(movedFilepath, mode='rb') as movedFile, open(self.loadingFilepath, mode='ab') as loadingFile:
+                loadingFile.write(movedFile.read())
+            os.remove(movedFilepath)
+
+    @contextlib.contextmanager
+    def _lockJournal(self) -> Iterator[None]:
+        '''
+        Holds an exclusive lock on the journal lock file (waiting for it) until the block exits.
+        '''
+        with open(self.lockFilepath, mode='a') as lockFile:
+            fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+
+    def _getPlaybackFromEntry(self, entry: dict) -> Playback:
+        duration = None
+        if (entry['playbackDuration']):
+            duration = mypycommons.time.getTimedeltaFromFormattedDuration(entry['playbackDuration'])
+
+        return Playback(entry['audioFilepath'], mypycommons.time.getDateTimeFromFormattedTime(entry['dateTime']), duration)
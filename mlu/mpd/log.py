@@ -1,13 +1,24 @@
 '''
 '''
-from datetime import datetime
-from typing import List
+import bz2
+import contextlib
+import gzip
+import heapq
+import hashlib
+import lzma
+import os
+import shutil
+import subprocess
+from datetime import datetime, date
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
 
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.file
+import com.nwrobel.mypycommons.logger
 import com.nwrobel.mypycommons.time
 
 from mlu.settings import MLUSettings
+from mlu.mpd.checkpoint import MpdLogCheckpoint
 
 class MpdLogLine:
    '''
@@ -31,9 +42,114 @@ class MpdLogLine:
         self.dateTime = dateTime
         self.originalText = originalText
 
+class MpdLogTimestampDecoder:
+    '''
+    Decoder for the timestamps at the start of the MPD (syslog) log lines, which have the fixed
+    layout 'YYYY-MM-DDTHH:MM:SS.ffffff'. It gives the same values as datetime.strptime with that
+    format, without parsing the format for each line: the fields are sliced from their known
+    positions, and the date, hour and minute part is decoded only when it differs from the previous
+    line's, so most lines only need their seconds and microseconds decoded.
+
+    Lines that don't have the exact expected layout are decoded with strptime, so invalid
+    timestamps raise the same ValueError.
+    '''
+    TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+    TIMESTAMP_LENGTH = 26
+
+    _EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+    def __init__(self):
+        # Cache of the last decoded 'YYYY-MM-DDTHH:MM:' part
+        self._cachedMinuteText = None
+        self._cachedMinuteValues = None
+        self._cachedMinuteEpochMicros = None
+
+    def decodeDatetime(self, logLine: str) -> datetime:
+        '''
+        Returns the timestamp of the log line as a (naive) datetime.
+        '''
+        secondValues = self._decodeSecondValues(logLine)
+        if (secondValues is None):
+            return datetime.strptime(logLine[0:self.TIMESTAMP_LENGTH], self.TIMESTAMP_FORMAT)
+
+        (year, month, day, hour, minute) = self._cachedMinuteValues
+        return datetime(year, month, day, hour, minute, secondValues[0], secondValues[1])
+
+    def decodeEpochMicros(self, logLine: str) -> int:
+        '''
+        Returns the timestamp of the log line as an integer number of microseconds since the epoch,
+        with the timestamp taken as UTC.
+        '''
+        secondValues = self._decodeSecondValues(logLine)
+        if (secondValues is None):
+            lineDatetime = datetime.strptime(logLine[0:self.TIMESTAMP_LENGTH], self.TIMESTAMP_FORMAT)
+            return self._getEpochMicros(lineDatetime.date(), lineDatetime.hour, lineDatetime.minute) + (lineDatetime.second * 1000000) + lineDatetime.microsecond
+
+        return self._cachedMinuteEpochMicros + (secondValues[0] * 1000000) + secondValues[1]
+
+    def _decodeSecondValues(self, logLine: str):
+        '''
+        Decodes the date, hour and minute part of the timestamp into the cache (if it changed), and
+        returns the (second, microsecond) values, or None if the line doesn't have the expected
+        timestamp layout.
+        '''
+        if (len(logLine) < self.TIMESTAMP_LENGTH or logLine[19] != '.'):
+            return None
+
+        minuteText = logLine[0:17]
+        if (minuteText != self._cachedMinuteText and not self._decodeMinuteText(minuteText)):
+            return None
+
+        secondText = logLine[17:19]
+        microsecondText = logLine[20:26]
+        if (not (secondText + microsecondText).isdigit() or secondText > '59'):
+            return None
+
+        return (int(secondText), int(microsecondText))
+
+    def _decodeMinuteText(self, minuteText: str) -> bool:
+        '''
+        Decodes the 'YYYY-MM-DDTHH:MM:' part of a timestamp into the cache. Returns False if it
+        doesn't have the expected layout.
+        '''
+        if (not (minuteText[4] == '-' and minuteText[7] == '-' and minuteText[10] == 'T' and minuteText[13] == ':' and minuteText[16] == ':')):
+            return False
+
+        fieldsText = minuteText[0:4] + minuteText[5:7] + minuteText[8:10] + minuteText[11:13] + minuteText[14:16]
+        if (not fieldsText.isdigit()):
+            return False
+
+        hour = int(minuteText[11:13])
+        minute = int(minuteText[14:16])
+        if (hour > 23 or minute > 59):
+            return False
+
+        dateValue = date(int(minuteText[0:4]), int(minuteText[5:7]), int(minuteText[8:10]))
+
+        self._cachedMinuteValues = (dateValue.year, dateValue.month, dateValue.day, hour, minute)
+        self._cachedMinuteEpochMicros = self._getEpochMicros(dateValue, hour, minute)
+        self._cachedMinuteText = minuteText
+        return True
+
+    def _getEpochMicros(self, dateValue: date, hour: int, minute: int) -> int:
+        return ((((dateValue.toordinal() - self._EPOCH_ORDINAL) * 24 + hour) * 60 + minute) * 60000000)
+
+class MpdLogOrderError(Exception):
+    '''
+    Raised when an MPD log line is too far out of order to be put back in order while the log is
+    streamed.
+    '''
+    def __init__(self, message):
+        super().__init__(message)
+
 class MpdLogProvider:
     '''
+    Reads the log lines from the MPD log file, streamed (iterateLines), which keeps memory use
+    flat regardless of the size of the log file.
     '''
+    # Size of the blocks of text read from the log file at once
+    _READ_CHUNK_SIZE = 1024 * 1024
+
     def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger) -> None:
         if (not mluSettings):
             raise ValueError("mluSettings not passed")
@@ -45,52 +161,355 @@ class MpdLogProvider:
             raise ValueError("logFilepath must be a valid filepath to an existing file: invalid value '{}'".format(mluSettings.userConfig.mpdConfig.logFilepath))
 
         self.logFilepath = mluSettings.userConfig.mpdConfig.logFilepath
+        # Number of lines held back by iterateLines to put lines written slightly out of order back
+        # in order: a line can be put in order as long as it is less than this many (kept) lines late
+        self._reorderWindowSize = mluSettings.userConfig.mpdConfig.logReorderWindow
         self._logger = commonLogger.getLogger()
+        self._timestampDecoder = MpdLogTimestampDecoder()
+
+    def iterateLines(self, lineFilter: Callable[[str], bool] = None, startOffset: int = 0, endOffset: int = None) -> Iterator[MpdLogLine]:
+        '''
+        Yields the log lines (as MpdLogLine objects) from the MPD log file, ordered by timestamp
+        (earliest first), while reading the file in chunks.
+
+        Only the part of the file between the byte offsets startOffset and endOffset (end of the
+        file if None) is read: these should be offsets of line starts/ends (see
+        getCompleteLinesEndOffset).
+
+        If lineFilter is given, it is called with the raw text of each line, and only the lines for
+        which it returns True are parsed and yielded: it should be a cheap check, used to drop the
+        lines the caller has no use for before any object is created for them.
+
+        Lines are ordered using a reorder buffer of mpd.logReorderWindow lines instead of sorting
+        the whole file. If a line is later than that, MpdLogOrderError is raised, as it can't be
+        put in order anymore.
+        '''
+        return self._iterateLinesInOrder(self._iterateRawLines(startOffset, endOffset), lineFilter)
+
+    def iterateLogFilesLines(self, logFilepaths: List[str], lineFilter: Callable[[str], bool] = None) -> Iterator[MpdLogLine]:
+        '''
+        Yields the log lines from all of the given log files (plain, or compressed/archived: see
+        openMpdLogFile), merged into a single stream ordered by timestamp, as with iterateLines.
+
+        Each file is streamed and put in order on its own, and the files are merged as they are
+        read (k-way merge), so the whole history is read in one pass without holding it in memory.
+        The files should be given oldest first: lines with the same timestamp are yielded in that
+        order. A line that is the same as the line before it is skipped, so that lines found in
+        more than one of the files (a log that was both rotated and archived) are only yielded once.
+        '''
+        fileLineIterators = [
+            self._iterateLinesInOrder(self._iterateRawLinesFromLogFile(logFilepath), lineFilter)
+            for logFilepath in logFilepaths
+        ]
+
+        previousLine = None
+        duplicateLinesCount = 0
+
+        for mpdLogLine in heapq.merge(*fileLineIterators, key=lambda line: line.dateTime):
+            if (previousLine is not None and mpdLogLine.originalText == previousLine.originalText):
+                duplicateLinesCount += 1
+                continue
+
+            previousLine = mpdLogLine
+            yield mpdLogLine
+
+        if (duplicateLinesCount):
+            self._logger.info("Skipped {} MPD log lines found in more than one log file".format(duplicateLinesCount))
+
+    def _iterateLinesInOrder(self, rawLines: Iterable[str], lineFilter: Callable[[str], bool]) -> Iterator[MpdLogLine]:
+        '''
+        Parses and yields the given raw log lines, put in order by timestamp with the reorder buffer
+        (see iterateLines).
+        '''
+        reorderHeap = []
+        lineNumber = 0
+        lastYieldedLine = None
+
+        for logLine in rawLines:
+            if (not logLine or (lineFilter is not None and not lineFilter(logLine))):
+                continue
+
+            mpdLogLine = self.getLineFromRawText(logLine)
+
+            # The line number keeps lines with the same timestamp in file order
+            heapq.heappush(reorderHeap, (mpdLogLine.dateTime, lineNumber, mpdLogLine))
+            lineNumber += 1
+
+            if (len(reorderHeap) > self._reorderWindowSize):
+                nextLine = heapq.heappop(reorderHeap)[2]
+                if (lastYieldedLine is not None and nextLine.dateTime < lastYieldedLine.dateTime):
+                    raise MpdLogOrderError(
+                        "MPD log line is more than {} lines out of order, increase the config value mpd.logReorderWindow: '{}' (after '{}')".format(
+                            self._reorderWindowSize,
+                            nextLine.originalText,
+                            lastYieldedLine.originalText
+                        )
+                    )
+
+                lastYieldedLine = nextLine
+                yield nextLine
+
+        while (reorderHeap):
+            yield heapq.heappop(reorderHeap)[2]
+
+    def getLineFromRawText(self, logLine: str) -> MpdLogLine:
+        '''
+        Parses the raw text of a log line (as written in the log file) into an MpdLogLine.
+        '''
+        return MpdLogLine(
+            dateTime=self._getDatetimeFromRawLogLine(logLine),
+            text=self._getTextFromRawLogLine(logLine),
+            originalText=logLine
+        )
+
+    def getCompleteLinesEndOffset(self) -> int:
+        '''
+        Returns the byte offset of the end of the last complete line of the log file: a last line
+        without a line ending may still be being written, and is left out.
+        '''
+        with open(self.logFilepath, mode='rb') as logFile:
+            endOffset = logFile.seek(0, os.SEEK_END)
 
-    def getLines(self) -> MpdLogLine:
-        self._lines = self._readLogLines()
-        return self._lines
+            while (endOffset > 0):
+                blockStartOffset = max(0, endOffset - self._READ_CHUNK_SIZE)
+                logFile.seek(blockStartOffset)
+                block = logFile.read(endOffset - blockStartOffset)
 
-    def _readLogLines(self) -> List[MpdLogLine]:
+                lineEndIndex = block.rfind(b'\n')
+                if (lineEndIndex >= 0):
+                    return blockStartOffset + lineEndIndex + 1
+                endOffset = blockStartOffset
+
+        return 0
+
+    def getLineAlignedByteRanges(self, rangeSize: int) -> List[Tuple[int, int]]:
         '''
-        Collects all log lines (as MPDLogLine objects) from the MPD log file.
-        The list is then sorted by the timestamp of each line (earliest first) and returned.
+        Splits the log file into consecutive (startOffset, endOffset) byte ranges of about rangeSize
+        bytes, each starting at the start of a line and ending at the end of a line, so that the
+        ranges can be read separately (see iterateLines).
         '''
-        rawLogFileLines = self._getRawLines()
-        self._logger.info("Parsing {} lines from MPD log".format(len(rawLogFileLines)))
-        allMpdLogLines = []
+        byteRanges = []
+
+        with open(self.logFilepath, mode='rb') as logFile:
+            fileSize = logFile.seek(0, os.SEEK_END)
+            startOffset = 0
+
+            while (startOffset < fileSize):
+                # Move the end of the range forward to the end of the line it falls in
+                logFile.seek(min(startOffset + rangeSize, fileSize))
+                logFile.readline()
+                endOffset = min(logFile.tell(), fileSize)
 
-        for logLine in rawLogFileLines:
-            if (logLine):
-                lineDatetime = self._getDatetimeFromRawLogLine(logLine)
-                lineText = self._getTextFromRawLogLine(logLine)
+                byteRanges.append((startOffset, endOffset))
+                startOffset = endOffset
 
-                allMpdLogLines.append(
-                    MpdLogLine(dateTime=lineDatetime, text=lineText, originalText=logLine)
-                )
+        return byteRanges
 
-        # Sort the loglines array
-        sortedLines = self._sortLogLinesByDatetime(allMpdLogLines)
-        return sortedLines
+    def getCheckpoint(self, offset: int, pendingPlaybackLine: Optional[str], previousCheckpoint: Optional[MpdLogCheckpoint]) -> MpdLogCheckpoint:
+        '''
+        Returns a checkpoint for the log file having been ingested up to the given byte offset (end
+        of a line), continuing from previousCheckpoint.
+        '''
+        (lastLineOffset, lastLine) = self._readLineEndingAt(offset)
+
+        lastLineDateTime = None
+        if (lastLine):
+            try:
+                lastLineDateTime = mypycommons.time.formatDatetimeForDisplay(self._getDatetimeFromRawLogLine(lastLine.decode('utf-8')))
+            except ValueError:
+                pass
+
+        return MpdLogCheckpoint(
+            inode=os.stat(self.logFilepath).st_ino,
+            offset=offset,
+            lastLineOffset=lastLineOffset,
+            lastLineHash=self._getLineHash(lastLine) if (lastLine is not None) else None,
+            lastLineDateTime=lastLineDateTime,
+            pendingPlaybackLine=pendingPlaybackLine,
+            previousOffset=previousCheckpoint.offset if (previousCheckpoint) else None,
+            previousLastLineHash=previousCheckpoint.lastLineHash if (previousCheckpoint) else None
+        )
+
+    def checkpointMatchesLogFile(self, checkpoint: MpdLogCheckpoint) -> bool:
+        '''
+        Returns whether or not the log file is still the one the checkpoint was made for, with the
+        same content up to the checkpoint offset: False if it was rotated (other inode), truncated,
+        or rewritten.
+        '''
+        if (os.stat(self.logFilepath).st_ino != checkpoint.inode):
+            return False
 
-    def _getRawLines(self) -> List[str]:
-        rawLogFileLines = mypycommons.file.readFile(self.logFilepath)
-        rawLogFileLines = [logLine.replace('\n', '') for logLine in rawLogFileLines]
-        return rawLogFileLines
+        (lastLineOffset, lastLine) = self._readLineEndingAt(checkpoint.offset)
+        if (lastLine is None):
+            return (checkpoint.lastLineHash is None and checkpoint.offset == 0)
 
-    def _getDatetimeFromRawLogLine(self, logLine: str) -> float:
+        return (lastLineOffset == checkpoint.lastLineOffset and self._getLineHash(lastLine) == checkpoint.lastLineHash)
+
+    def _readLineEndingAt(self, offset: int) -> Tuple[int, Optional[bytes]]:
+        '''
+        Returns the start offset and the content (without the line ending) of the line of the log
+        file that ends at the given offset, or (0, None) if there is none.
+        '''
+        with open(self.logFilepath, mode='rb') as logFile:
+            if (offset <= 0 or logFile.seek(0, os.SEEK_END) < offset):
+                return (0, None)
+
+            logFile.seek(offset - 1)
+            if (logFile.read(1) != b'\n'):
+                return (0, None)
+
+            # Search backwards for the end of the previous line
+            lineEndOffset = offset - 1
+            searchEndOffset = lineEndOffset
+            lineStartOffset = 0
+
+            while (searchEndOffset > 0):
+                blockStartOffset = max(0, searchEndOffset - self._READ_CHUNK_SIZE)
+                logFile.seek(blockStartOffset)
+                block = logFile.read(searchEndOffset - blockStartOffset)
+
+                previousLineEndIndex = block.rfind(b'\n')
+                if (previousLineEndIndex >= 0):
+                    lineStartOffset = blockStartOffset + previousLineEndIndex + 1
+                    break
+                searchEndOffset = blockStartOffset
+
+            logFile.seek(lineStartOffset)
+            return (lineStartOffset, logFile.read(lineEndOffset - lineStartOffset))
+
+    def _getLineHash(self, line: bytes) -> str:
+        return hashlib.sha1(line).hexdigest()
+
+    def _iterateRawLines(self, startOffset: int = 0, endOffset: int = None) -> Iterator[str]:
+        '''
+        Yields the lines of the log file (without the line ending) between the given byte offsets,
+        reading the file in chunks.
+        '''
+        with open(self.logFilepath, mode='rb') as logFile:
+            logFile.seek(startOffset)
+            bytesLeft = (endOffset - startOffset) if (endOffset is not None) else None
+            yield from iterateRawLinesFromStream(logFile, bytesLeft, self._READ_CHUNK_SIZE)
+
+    def _iterateRawLinesFromLogFile(self, logFilepath: str) -> Iterator[str]:
+        '''
+        Yields the lines of the given (plain or compressed/archived) log file.
         '''
-        Gets epoch timestamp from the raw log line of a log file - for the new, MPD logfiles that use syslog
+        self._logger.info("Reading MPD log file: {}".format(logFilepath))
+        with openMpdLogFile(logFilepath) as logFile:
+            yield from iterateRawLinesFromStream(logFile, None, self._READ_CHUNK_SIZE)
+
+    def _getDatetimeFromRawLogLine(self, logLine: str) -> datetime:
+        '''
+        Gets the datetime from the raw log line of a log file - for the new, MPD logfiles that use syslog
         and timestamps have the year
         '''
-        lineTimeData = logLine[0:26]
-        lineDatetime = datetime.strptime(lineTimeData, "%Y-%m-%dT%H:%M:%S.%f")
-        return lineDatetime
+        return self._timestampDecoder.decodeDatetime(logLine)
 
     def _getTextFromRawLogLine(self, logLine: str) -> str:
         lineText = logLine[33:]
         return lineText
 
-    def _sortLogLinesByDatetime(self, mpdLogLines: List[MpdLogLine]) -> List[MpdLogLine]:
-        mpdLogLines.sort(key=lambda line: line.dateTime)
-        return mpdLogLines
\ No newline at end of file
+def iterateRawLinesFromStream(stream: BinaryIO, bytesLeft: Optional[int] = None, readSize: int = 1024 * 1024) -> Iterator[str]:
+    '''
+    Yields the lines (without the line ending) read from the binary stream of a log file, in chunks
+    of readSize bytes, up to bytesLeft bytes (until the end of the stream if None).
+    '''
+    lineRemainder = b''
+
+    while (bytesLeft is None or bytesLeft > 0):
+        chunk = stream.read(readSize if (bytesLeft is None) else min(readSize, bytesLeft))
+        if (not chunk):
+            break
+        if (bytesLeft is not None):
+            bytesLeft -= len(chunk)
+
+        # The last line of the chunk may continue in the next chunk
+        lines = (lineRemainder + chunk).split(b'\n')
+        lineRemainder = lines.pop()
+        for line in lines:
+            yield _decodeRawLine(line)
+
+    if (lineRemainder):
+        yield _decodeRawLine(lineRemainder)
+
+def _decodeRawLine(line: bytes) -> str:
+    if (line.endswith(b'\r')):
+        line = line[:-1]
+    return line.decode('utf-8')
+
+# Extensions of the compressed/archived log files that openMpdLogFile can read
+MPD_LOG_ARCHIVE_EXTENSIONS = ['.7z', '.gz', '.bz2', '.xz']
+
+@contextlib.contextmanager
+def openMpdLogFile(logFilepath: str) -> Iterator[BinaryIO]:
+    '''
+    Opens the given MPD log file for reading as a binary stream, decompressing it while it is read
+    if it is compressed or archived (by extension: see MPD_LOG_ARCHIVE_EXTENSIONS), so that it is
+    never extracted to disk.
+
+    7z archives (as written by the playstats updater when it archives the log) are read with the 7z
+    program, which must be in PATH; the log must be the only file in the archive.
+    '''
+    fileExtension = mypycommons.file.getFileExtension(logFilepath).lower()
+
+    if (fileExtension == '.7z'):
+        sevenZipProgram = shutil.which('7z') or shutil.which('7za')
+        if (sevenZipProgram is None):
+            raise ValueError("The 7z program (p7zip) is needed to read 7z archived MPD log files, but was not found in PATH: {}".format(logFilepath))
+
+        process = subprocess.Popen([sevenZipProgram, 'e', '-so', '-bd', logFilepath], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            yield process.stdout
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+
+        if (process.wait() != 0):
+            raise ValueError("Failed to extract 7z archived MPD log file (7z exit code {}): {}".format(process.returncode, logFilepath))
+
+    elif (fileExtension == '.gz'):
+        with gzip.open(logFilepath, mode='rb') as logFile:
+            yield logFile
+
+    elif (fileExtension == '.bz2'):
+        with bz2.open(logFilepath, mode='rb') as logFile:
+            yield logFile
+
+    elif (fileExtension == '.xz'):
+        with lzma.open(logFilepath, mode='rb') as logFile:
+            yield logFile
+
+    else:
+        with open(logFilepath, mode='rb') as logFile:
+            yield logFile
+
+def getMpdLogHistoryFilepaths(logFilepath: str, logArchiveDir: str) -> List[str]:
+    '''
+    Returns the filepaths of all the logs that make up the MPD log history, oldest first: the
+    archived logs in logArchiveDir (files with the log filename in their name, such as
+    '[timestamp] mpd.log.archive.7z'), the rotated logs next to the log file ('mpd.log.1',
+    'mpd.log.2.gz', etc), then the log file itself.
+    '''
+    logFilename = mypycommons.file.getFilename(logFilepath)
+    logDir = os.path.dirname(os.path.abspath(logFilepath))
+    historyFilepaths = set()
+
+    if (logArchiveDir and mypycommons.file.pathExists(logArchiveDir)):
+        for filename in os.listdir(logArchiveDir):
+            if (logFilename in filename):
+                historyFilepaths.add(os.path.abspath(mypycommons.file.joinPaths(logArchiveDir, filename)))
+
+    for filename in os.listdir(logDir):
+        if (filename.startswith(logFilename + '.')):
+            historyFilepaths.add(os.path.abspath(mypycommons.file.joinPaths(logDir, filename)))
+
+    historyFilepaths.discard(os.path.abspath(logFilepath))
+    historyFilepaths = [filepath for filepath in historyFilepaths if (mypycommons.file.isFile(filepath))]
+
+    # Older logs were last written to before newer ones: order by modified time
+    historyFilepaths.sort(key=lambda filepath: (os.stat(filepath).st_mtime_ns, filepath))
+    historyFilepaths.append(logFilepath)
+
+    return historyFilepaths
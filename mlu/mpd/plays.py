@@ -1,122 +1,300 @@
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 
-import fnmatch
-import re
+import heapq
+import itertools
+import os
 
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.time
 
-from mlu.mpd.log import MpdLogProvider, MpdLogLine
+import mlu.mpd.log
+from mlu.mpd.log import MpdLogProvider, MpdLogLine, MpdLogTimestampDecoder
+from mlu.mpd.checkpoint import MpdLogCheckpoint
+from mlu.mpd.events import MpdLogEventType, MpdLogLineClassifier
 from mlu.tags.playstats.common import Playback
 from mlu.settings import MLUSettings
 
+_EPOCH_DATETIME = datetime(1970, 1, 1)
+
+class MpdLogEvents:
+    '''
+    Compact, picklable arrays of the (non-junk) events parsed from a part of a log, as returned by
+    the worker processes of the parallel mode: for each event, its timestamp (microseconds since
+    the epoch), its MpdLogEventType and its path (None for the event types without one).
+    '''
+    def __init__(self):
+        self.epochMicros = array('q')
+        self.eventTypes = []
+        self.partialPaths = []
+
+    def add(self, epochMicros: int, eventType: str, partialPath: Optional[str]) -> None:
+        self.epochMicros.append(epochMicros)
+        self.eventTypes.append(eventType)
+        self.partialPaths.append(partialPath)
+
+    def sortByTimestamp(self) -> None:
+        '''
+        Sorts the events by timestamp, keeping the events with the same timestamp in read order.
+        '''
+        order = sorted(range(len(self.epochMicros)), key=self.epochMicros.__getitem__)
+        self.epochMicros = array('q', [self.epochMicros[i] for i in order])
+        self.eventTypes = [self.eventTypes[i] for i in order]
+        self.partialPaths = [self.partialPaths[i] for i in order]
+
+    def iterateEvents(self) -> Iterator[Tuple[int, str, Optional[str]]]:
+        return zip(self.epochMicros, self.eventTypes, self.partialPaths)
+
+def getMpdLogRangeEvents(logFilepath: str, startOffset: int, endOffset: Optional[int], lineClassifier: MpdLogLineClassifier) -> MpdLogEvents:
+    '''
+    Parses and classifies the lines of the given log file between the byte offsets (the whole file,
+    which may be compressed, if endOffset is None), and returns its events (lines that are not
+    OTHER) sorted by timestamp. Run in the worker processes of the parallel mode.
+    '''
+    timestampDecoder = MpdLogTimestampDecoder()
+    events = MpdLogEvents()
+
+    if (endOffset is None):
+        logFileContext = mlu.mpd.log.openMpdLogFile(logFilepath)
+    else:
+        logFileContext = open(logFilepath, mode='rb')
+
+    with logFileContext as logFile:
+        bytesLeft = None
+        if (endOffset is not None):
+            logFile.seek(startOffset)
+            bytesLeft = endOffset - startOffset
+
+        for rawLogLine in mlu.mpd.log.iterateRawLinesFromStream(logFile, bytesLeft):
+            if (not lineClassifier.rawLineMayHaveEvent(rawLogLine)):
+                continue
+
+            (eventType, partialPath) = lineClassifier.classify(rawLogLine[33:])
+            if (eventType != MpdLogEventType.OTHER):
+                events.add(timestampDecoder.decodeEpochMicros(rawLogLine), eventType, partialPath)
+
+    events.sortByTimestamp()
+    return events
+
 class MpdPlaybackProvider:
     ''' 
+    Provides the playbacks recorded in the MPD log file.
+
+    Log lines are classified with the given MpdLogLineClassifier (the default classifier if None):
+    lines of any event type other than OTHER end the playback of the previous 'played' line.
     '''
-    def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger) -> None:
+    # Maximum and minimum size of the byte ranges of the log file parsed by each task of the
+    # parallel mode: between these, the log file is split into several ranges per worker
+    _PARALLEL_RANGE_MAX_SIZE = 32 * 1024 * 1024
+    _PARALLEL_RANGE_MIN_SIZE = 1024 * 1024
+    _PARALLEL_RANGES_PER_WORKER = 4
+
+    def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger, lineClassifier: MpdLogLineClassifier = None) -> None:
         if (not mluSettings):
             raise TypeError("mluSettings not passed")
         if (commonLogger is None):
             raise TypeError("CommonLogger not passed")
         
+        self._lineClassifier = lineClassifier if (lineClassifier is not None) else MpdLogLineClassifier()
         self._audioLibraryRootDir = mluSettings.userConfig.audioLibraryRootDir
+        self._logArchiveDir = mluSettings.userConfig.mpdConfig.logArchiveDir
+        self._parseWorkers = mluSettings.userConfig.mpdConfig.parseWorkers
         self._logger = commonLogger.getLogger()
         self._mpdLogProvider = MpdLogProvider(mluSettings, commonLogger)
-        self._mpdLogLines = None
+        self._lastMpdLogLine = None
+        self._deferredPlaybackLine = None
 
     def getPlaybacks(self) -> List[Playback]:
         '''
+        Returns the list of all playbacks found in the MPD log file.
+
+        With more than 1 parse worker (mpd.parseWorkers config), the log file is parsed in parallel
+        (see _getPlaybacksParallel).
         '''
-        self._mpdLogLines = self._mpdLogProvider.getLines()
-        linesWithJunkRemoved = self._getJunkFilteredMpdLogLines()
-
-        playbackList = []
-        # go through each item in logline array:
-        #       check/identify if current line is a 'playback' line (song played, song started/resumed, etc): if so:
-        #           take note of the song filepath
-        #           take note of the timestamp of the play start
-        #           check the next consecutive line (logline coming right after it) to see what happened next
-        #             repeat this until we find a line to see if song was stopped, client exit, played another song, etc
-        #           based on this, calculate the play duration by taking the difference of the timestamps b/w play start
-        #             logline and the logline that indicates when play ended
-        # Have loop go to the next line - we will do the above again next time we hit the next consecutive 'playback' line
-
-        # Go through each line in the list of log lines
-        for (index, currentLine) in enumerate(linesWithJunkRemoved):
-            # If the current log line is one that indicates a song was played back, get the info from the line
-            if (self._mpdLogLineIsPlaybackStarted(currentLine)):
-                
-                audioFilepath = self._getFilepathFromMpdLogLine(currentLine)
-                playbackStartTime = currentLine.dateTime
-
-                # determine playback duration: find out when the song actually stopped by looking ahead at the
-                # next log line in the list (the list is ordered by time, least to most recent)
-                # This next line indicates when the song playback ended
-                try:
-                    nextLine = linesWithJunkRemoved[index + 1]
-
-                    # Get the playback duration from the difference b/w playback stop and start times
-                    playbackStopTime = nextLine.dateTime
-                    playbackTimedelta = playbackStopTime - playbackStartTime
-
-                # If the list is out of bounds, we are at the end of the list, and we have no real way to know what the play duration is,
-                # To handle this, we just will set timedelta to 0 (count this as a play)
-                except IndexError:
-                    self._logger.warning("Last playback line in log reached, unable to determine exact play duration for final 'played' line")
-                    playbackTimedelta = None
-
-                playbackInstance = Playback(audioFilepath, playbackStartTime, playbackTimedelta)
-                playbackList.append(playbackInstance)
-
-        return playbackList
+        if (self._parseWorkers > 1):
+            rangeSize = os.path.getsize(self._mpdLogProvider.logFilepath) // (self._parseWorkers * self._PARALLEL_RANGES_PER_WORKER)
+            rangeSize = min(max(rangeSize, self._PARALLEL_RANGE_MIN_SIZE), self._PARALLEL_RANGE_MAX_SIZE)
 
-    def getLastPlaybackMpdLogLine(self) -> Optional[MpdLogLine]:
-        ''' 
+            byteRanges = self._mpdLogProvider.getLineAlignedByteRanges(rangeSize)
+            tasks = [(self._mpdLogProvider.logFilepath, startOffset, endOffset) for (startOffset, endOffset) in byteRanges]
+            return self._getPlaybacksParallel(tasks, skipDuplicateEvents=False)
+
+        return list(self.iteratePlaybacks())
+
+    def iteratePlaybacks(self) -> Iterator[Playback]:
         '''
-        linesWithJunkRemoved = self._getJunkFilteredMpdLogLines()
-        lastLine = linesWithJunkRemoved[-1]
+        Yields the playbacks found in the MPD log file, in order of playback time, while streaming
+        the log: only the playback and client lines are parsed, and only the last of these is kept.
 
-        if (self._mpdLogLineIsPlaybackStarted(lastLine)):
-            return lastLine
-        else:
-            return None
+        For each 'played' line (song played), the playback duration is the time until the next
+        (non-junk) event line, which indicates when the playback ended: song stopped, client exit,
+        another song played, etc.
+        '''
+        lines = self._mpdLogProvider.iterateLines(lineFilter=self._lineClassifier.rawLineMayHaveEvent)
+        return self._iteratePlaybacksFromLines(lines, deferLastPlayback=False)
 
-    def _getJunkFilteredMpdLogLines(self) -> List[MpdLogLine]:
-        ''' 
+    def getHistoryPlaybacks(self) -> Tuple[List[Playback], List[str]]:
+        '''
+        Returns the playbacks found in the whole MPD log history: the archived and rotated logs (see
+        mlu.mpd.log.getMpdLogHistoryFilepaths) and the log file, read as a single log merged by
+        timestamp, and the list of the log files that were read.
         '''
-        linesWithJunkRemoved = [logLine for logLine in self._mpdLogLines if (not self._mpdLogLineIsJunk(logLine))]
-        return linesWithJunkRemoved
+        logFilepaths = mlu.mpd.log.getMpdLogHistoryFilepaths(self._mpdLogProvider.logFilepath, self._logArchiveDir)
+        self._logger.info("Reading {} MPD log files (log history)".format(len(logFilepaths)))
 
-    def _mpdLogLineIsJunk(self, mpdLogLine: MpdLogLine) -> bool:
-        ''' 
+        if (self._parseWorkers > 1):
+            # Compressed files can only be read from the start: each one is parsed by a single task
+            tasks = [(logFilepath, 0, None) for logFilepath in logFilepaths]
+            return (self._getPlaybacksParallel(tasks, skipDuplicateEvents=True), logFilepaths)
+
+        lines = self._mpdLogProvider.iterateLogFilesLines(logFilepaths, lineFilter=self._lineClassifier.rawLineMayHaveEvent)
+        playbacks = list(self._iteratePlaybacksFromLines(lines, deferLastPlayback=False))
+
+        return (playbacks, logFilepaths)
+
+    def _getPlaybacksParallel(self, tasks: List[Tuple[str, int, Optional[int]]], skipDuplicateEvents: bool) -> List[Playback]:
         '''
-        if (self._mpdLogLineIsPlaybackStarted(mpdLogLine) or self._mpdLogLineIsClientClosedOrOpen(mpdLogLine)):
-            return False
-        else:
-            return True    
+        Returns the playbacks from the given parts of log files, given as (logFilepath, startOffset,
+        endOffset) tasks (see getMpdLogRangeEvents), which are parsed and classified on a process
+        pool. The events of each part come back sorted, and are merged by timestamp (k-way merge)
+        before the playbacks are made from them, as in _iteratePlaybacksFromLines.
 
-    def _mpdLogLineIsPlaybackStarted(self, mpdLogLine: MpdLogLine) -> bool:
+        Unlike the sequential read, which only puts lines back in order within its reorder buffer,
+        all events are fully ordered. If skipDuplicateEvents is True, an event that is the same as
+        the event before it is skipped (the same line found in more than one log file).
         '''
+        self._logger.info("Parsing MPD log in {} parts on {} worker processes".format(len(tasks), self._parseWorkers))
+        self._lastMpdLogLine = None
+
+        with ProcessPoolExecutor(max_workers=self._parseWorkers) as executor:
+            partEvents = list(executor.map(getMpdLogRangeEvents, *zip(*tasks), itertools.repeat(self._lineClassifier)))
+
+        events = heapq.merge(*[part.iterateEvents() for part in partEvents], key=lambda event: event[0])
+        playbacks = []
+        playbackStartEvent = None
+        previousEvent = None
+
+        for event in events:
+            if (skipDuplicateEvents and event == previousEvent):
+                continue
+            previousEvent = event
+
+            # This event indicates when the playback of the previous event ended
+            if (playbackStartEvent is not None):
+                playbacks.append(self._getPlaybackFromEvent(playbackStartEvent, timedelta(microseconds=event[0] - playbackStartEvent[0])))
+
+            playbackStartEvent = event if (event[1] == MpdLogEventType.PLAYED) else None
+
+        if (playbackStartEvent is not None):
+            self._logger.warning("Last playback line in log reached, unable to determine exact play duration for final 'played' line")
+            playbacks.append(self._getPlaybackFromEvent(playbackStartEvent, None))
+
+        return playbacks
+
+    def _getPlaybackFromEvent(self, event: Tuple[int, str, Optional[str]], duration: Optional[timedelta]) -> Playback:
+        (epochMicros, eventType, partialPath) = event
+        return Playback(
+            self._getFilepathFromPartialPath(partialPath),
+            _EPOCH_DATETIME + timedelta(microseconds=epochMicros),
+            duration
+        )
+
+    def getPlaybacksSinceCheckpoint(self, checkpoint: Optional[MpdLogCheckpoint]) -> Tuple[List[Playback], MpdLogCheckpoint]:
         '''
-        if (fnmatch.fnmatchcase(mpdLogLine.text, "*player: played \"*\"")):
-            return True
-        else:
-            return False
+        Returns the playbacks from the part of the MPD log file written since the given checkpoint
+        (the whole file if None), and the new checkpoint for the end of this part.
 
-    def _mpdLogLineIsClientClosedOrOpen(self, mpdLogLine: MpdLogLine) -> bool:
+        Only complete lines are read. If the last playback line read has no line after it, its
+        playback is not returned: it is kept in the new checkpoint, and returned by the next call,
+        once its duration is known.
+
+        If the log file does not match the checkpoint anymore (rotated, truncated or rewritten),
+        the whole file is read.
         '''
+        startOffset = 0
+        pendingLines = []
+
+        if (checkpoint is not None):
+            if (self._mpdLogProvider.checkpointMatchesLogFile(checkpoint)):
+                startOffset = checkpoint.offset
+            else:
+                self._logger.warning("MPD log file was rotated, truncated or rewritten since the last checkpoint (last line: {}): reading the whole file".format(checkpoint.lastLineDateTime))
+
+            if (checkpoint.pendingPlaybackLine):
+                pendingLines.append(self._mpdLogProvider.getLineFromRawText(checkpoint.pendingPlaybackLine))
+
+        endOffset = self._mpdLogProvider.getCompleteLinesEndOffset()
+        if (endOffset < startOffset):
+            endOffset = startOffset
+
+        self._logger.info("Reading MPD log file from byte offset {} to {}".format(startOffset, endOffset))
+        lines = itertools.chain(
+            pendingLines,
+            self._mpdLogProvider.iterateLines(lineFilter=self._lineClassifier.rawLineMayHaveEvent, startOffset=startOffset, endOffset=endOffset)
+        )
+        playbacks = list(self._iteratePlaybacksFromLines(lines, deferLastPlayback=True))
+
+        pendingPlaybackLine = self._deferredPlaybackLine.originalText if (self._deferredPlaybackLine) else None
+        newCheckpoint = self._mpdLogProvider.getCheckpoint(endOffset, pendingPlaybackLine, checkpoint)
+
+        return (playbacks, newCheckpoint)
+
+    def _iteratePlaybacksFromLines(self, lines: Iterable[MpdLogLine], deferLastPlayback: bool) -> Iterator[Playback]:
+        '''
+        Yields the playbacks from the given log lines (see iteratePlaybacks). If deferLastPlayback is
+        True, a last playback line with no line after it is not yielded, but kept in
+        _deferredPlaybackLine.
+        '''
+        self._lastMpdLogLine = None
+        self._deferredPlaybackLine = None
+        playbackStartLine = None
+        playbackStartPath = None
+
+        for currentLine in lines:
+            (eventType, partialPath) = self._lineClassifier.classify(currentLine.text)
+            if (eventType == MpdLogEventType.OTHER):
+                continue
+
+            # This line indicates when the playback of the previous line ended
+            if (playbackStartLine is not None):
+                playbackTimedelta = currentLine.dateTime - playbackStartLine.dateTime
+                yield Playback(self._getFilepathFromPartialPath(playbackStartPath), playbackStartLine.dateTime, playbackTimedelta)
+
+            if (eventType == MpdLogEventType.PLAYED):
+                playbackStartLine = currentLine
+                playbackStartPath = partialPath
+            else:
+                playbackStartLine = None
+
+            self._lastMpdLogLine = currentLine
+
+        # If the log ends with a playback line, we have no real way to know what the play duration
+        # is: the playback is either left for the next incremental read, or included without a
+        # duration (counted as a play)
+        if (playbackStartLine is not None and deferLastPlayback):
+            self._deferredPlaybackLine = playbackStartLine
+
+        elif (playbackStartLine is not None):
+            self._logger.warning("Last playback line in log reached, unable to determine exact play duration for final 'played' line")
+            yield Playback(self._getFilepathFromPartialPath(playbackStartPath), playbackStartLine.dateTime, None)
+
+    def getLastPlaybackMpdLogLine(self) -> Optional[MpdLogLine]:
+        ''' 
+        Returns the last (non-junk) log line read by the last getPlaybacks() call if it is a playback
+        line, otherwise None (always None after a parallel read).
         '''
-        if (fnmatch.fnmatchcase(mpdLogLine.text, "*client: * opened from*") or
-            fnmatch.fnmatchcase(mpdLogLine.text, "*client: * closed")):
-            return True
+        lastLine = self._lastMpdLogLine
+
+        if (lastLine is not None and self._lineClassifier.classify(lastLine.text)[0] == MpdLogEventType.PLAYED):
+            return lastLine
         else:
-            return False
+            return None
 
-    def _getFilepathFromMpdLogLine(self, mpdLogLine: MpdLogLine) -> str:
+    def _getFilepathFromPartialPath(self, partialPath: str) -> str:
         '''
-        Parses the given MPDLogLine and returns the filepath for the audio file that was played/mentioned
-        in this log line.
+        Returns the full filepath of the audio file with the given path (relative to the library
+        root dir) captured from a log line.
         '''
-        partialPath = re.findall('"([^"]*)"', mpdLogLine.text)[0]
-        fullPath = mypycommons.file.joinPaths(self._audioLibraryRootDir, partialPath)
-        return fullPath
\ No newline at end of file
+        return mypycommons.file.joinPaths(self._audioLibraryRootDir, partialPath)
@@ -0,0 +1,111 @@
+'''
+mlu.report
+
+Module containing the report writers, which write the summary reports (tables of rows) to a file
+in one of the report formats: pretty text table (PrettyTable), CSV or JSONL. The CSV and JSONL
+reports are written as the rows are produced.
+'''
+
+import csv
+import json
+from typing import Iterable, List, Optional
+
+from prettytable import PrettyTable
+
+class ReportFormat:
+    '''
+    Formats of the report files, and their file extension.
+    '''
+    TEXT = 'text'
+    CSV = 'csv'
+    JSONL = 'jsonl'
+
+    _FILE_EXTENSIONS = {
+        TEXT: '.txt',
+        CSV: '.csv',
+        JSONL: '.jsonl'
+    }
+
+    @classmethod
+    def getFileExtension(cls, reportFormat: str) -> str:
+        if (reportFormat not in cls._FILE_EXTENSIONS):
+            raise ValueError("Unknown report format: {}".format(reportFormat))
+
+        return cls._FILE_EXTENSIONS[reportFormat]
+
+class ReportColumn:
+    '''
+    Column of a report.
+
+    Params:
+        name: column name (header of the text table, CSV header, key of the JSONL objects)
+        align: alignment of the values in the text table: 'l' (left) or 'r' (right)
+        maxWidth: maximum width of the column in the text table, longer values are wrapped
+    '''
+    def __init__(self, name: str, align: str = 'l', maxWidth: Optional[int] = None):
+        self.name = name
+        self.align = align
+        self.maxWidth = maxWidth
+
+def getReportFilename(baseFilename: str, reportFormat: str) -> str:
+    return baseFilename + ReportFormat.getFileExtension(reportFormat)
+
+def writeReport(reportFilepath: str, columns: List[ReportColumn], rows: Iterable[list], reportFormat: str) -> int:
+    '''
+    Writes the given rows (lists of values, one per column) to the report file, in the given
+    format, and returns the number of rows written.
+
+    CSV and JSONL rows are written as they are read from the given iterable (which can be a
+    generator), so these reports are never held in memory. The text table is made with
+    PrettyTable, which needs all the rows to size its columns.
+    '''
+    ReportFormat.getFileExtension(reportFormat)
+
+    if (reportFormat == ReportFormat.CSV):
+        return _writeCsvReport(reportFilepath, columns, rows)
+    elif (reportFormat == ReportFormat.JSONL):
+        return _writeJsonlReport(reportFilepath, columns, rows)
+    else:
+        return _writeTextReport(reportFilepath, columns, rows)
+
+def _writeCsvReport(reportFilepath: str, columns: List[ReportColumn], rows: Iterable[list]) -> int:
+    rowsCount = 0
+
+    with open(reportFilepath, mode='w', encoding='utf-8', newline='') as reportFile:
+        csvWriter = csv.writer(reportFile)
+        csvWriter.writerow([column.name for column in columns])
+
+        for row in rows:
+            csvWriter.writerow(row)
+            rowsCount += 1
+
+    return rowsCount
+
+def _writeJsonlReport(reportFilepath: str, columns: List[ReportColumn], rows: Iterable[list]) -> int:
+    rowsCount = 0
+    columnNames = [column.name for column in columns]
+
+    with open(reportFilepath, mode='w', encoding='utf-8') as reportFile:
+        for row in rows:
+            reportFile.write(json.dumps(dict(zip(columnNames, row)), ensure_ascii=False, default=str) + '\n')
+            rowsCount += 1
+
+    return rowsCount
+
+def _writeTextReport(reportFilepath: str, columns: List[ReportColumn], rows: Iterable[list]) -> int:
+    table = PrettyTable()
+    table.field_names = [column.name for column in columns]
+    for column in columns:
+        table.align[column.name] = column.align
+
+    table.max_width = {column.name: column.maxWidth for column in columns if (column.maxWidth is not None)}
+
+    rowsCount = 0
+    for row in rows:
+        table.add_row(row)
+        rowsCount += 1
+
+    with open(reportFilepath, mode='w', encoding='utf-8') as reportFile:
+        reportFile.write(table.get_string())
+
+    return rowsCount
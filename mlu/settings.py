@@ -9,6 +9,8 @@ from typing import List
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.file
 
+from mlu.tags.audiofmt.common import DEFAULT_TAG_PADDING_RESERVE
+
 class MLUVotePlaylistFileConfigItem:
     def __init__(self, filename: str, value: float):
         self.filename = filename
@@ -100,16 +102,51 @@ class MLUConvertPlaylistsConfig:
             self.inputDir = jsonConfig['inputDir']
             self.outputDir = jsonConfig['outputDir']
 
+class MLULibraryTagsConfig:
+    def __init__(self, jsonConfig: dict):
+        if (jsonConfig is None):
+            self.scanWorkers = 1
+            self.fastRead = False
+        else:
+            self.scanWorkers = getConfigOrNull(jsonConfig, 'scanWorkers') or 1
+            self.fastRead = getConfigOrNull(jsonConfig, 'fastRead') or False
+
+class MLUTagWriteConfig:
+    def __init__(self, jsonConfig: dict):
+        self.paddingReserve = DEFAULT_TAG_PADDING_RESERVE
+        self.writeWorkers = 1
+
+        if (jsonConfig is not None):
+            paddingReserve = getConfigOrNull(jsonConfig, 'paddingReserve')
+            if (paddingReserve is not None):
+                self.paddingReserve = paddingReserve
+
+            writeWorkers = getConfigOrNull(jsonConfig, 'writeWorkers')
+            if (writeWorkers is not None):
+                self.writeWorkers = writeWorkers
+
 class MLUMpdConfig:
     def __init__(self, jsonConfig: dict):
         if (jsonConfig is None):
             self.logFilepath = ''
             self.logArchiveDir = ''
             self.outputDir = ''
+            self.parseWorkers = 1
+            self.logReorderWindow = 10000
+            self.host = 'localhost'
+            self.port = 6600
+            self.password = None
+            self.playbackJournalFilepath = ''
         else:
             self.logFilepath = jsonConfig['logFilepath']
             self.logArchiveDir = jsonConfig['logArchiveDir']
             self.outputDir = jsonConfig['outputDir']
+            self.parseWorkers = getConfigOrNull(jsonConfig, 'parseWorkers') or 1
+            self.logReorderWindow = getConfigOrNull(jsonConfig, 'logReorderWindow') or 10000
+            self.host = getConfigOrNull(jsonConfig, 'host') or 'localhost'
+            self.port = getConfigOrNull(jsonConfig, 'port') or 6600
+            self.password = getConfigOrNull(jsonConfig, 'password')
+            self.playbackJournalFilepath = getConfigOrNull(jsonConfig, 'playbackJournalFilepath') or ''
 
 def getConfigOrNull(jsonConfig, keyName):
     try:
@@ -121,6 +158,9 @@ class MLUUserConfig:
     def __init__(self, jsonConfig: dict):
         self.audioLibraryRootDir = jsonConfig['audioLibraryRootDir']
         self.tagBackupFilepath = jsonConfig['tagBackupFilepath']
+        self.tagIndexFilepath = getConfigOrNull(jsonConfig, 'tagIndexFilepath')
+        self.playHistoryFilepath = getConfigOrNull(jsonConfig, 'playHistoryFilepath')
+        self.reportFormat = getConfigOrNull(jsonConfig, 'reportFormat') or 'text'
         
         logDir = jsonConfig['logDir']
         if (logDir):
@@ -132,6 +172,8 @@ class MLUUserConfig:
         self.convertPlaylistsConfig = MLUConvertPlaylistsConfig(getConfigOrNull(jsonConfig, 'convertPlaylists'))
         self.ratingConfig = MLURatingConfig(getConfigOrNull(jsonConfig, 'rating'))
         self.mpdConfig = MLUMpdConfig(getConfigOrNull(jsonConfig, 'mpd'))
+        self.libraryTagsConfig = MLULibraryTagsConfig(getConfigOrNull(jsonConfig, 'libraryTags'))
+        self.tagWriteConfig = MLUTagWriteConfig(getConfigOrNull(jsonConfig, 'tagWrite'))
 
 
 
@@ -151,6 +193,8 @@ class MLUSettings:
         self.cacheDir = ''
         self.tempDir = ''
         self.testDataDir = ''
+        self.audioPropertiesCacheFilepath = ''
+        self.audioValidationCacheFilepath = ''
         self.loggerName = "mlu-script"
 
         self._loadSettings(configFilename)
@@ -169,9 +213,20 @@ class MLUSettings:
         self.cacheDir = mypycommons.file.joinPaths(self.projectRootDir, '~cache')
         self.tempDir = mypycommons.file.joinPaths(self.cacheDir, 'temp')
         self.testDataDir = mypycommons.file.joinPaths(self.projectRootDir, 'test/data') 
+        self.audioPropertiesCacheFilepath = mypycommons.file.joinPaths(self.cacheDir, 'audio-properties-cache.json')
+        self.audioValidationCacheFilepath = mypycommons.file.joinPaths(self.cacheDir, 'audio-validation-cache.json')
 
         self.userConfig = self._getUserConfig(configFilename)
 
+        if (not self.userConfig.tagIndexFilepath):
+            self.userConfig.tagIndexFilepath = mypycommons.file.joinPaths(self.cacheDir, 'library-tag-index.sqlite')
+
+        if (not self.userConfig.playHistoryFilepath):
+            self.userConfig.playHistoryFilepath = mypycommons.file.joinPaths(self.cacheDir, 'play-history.sqlite')
+
+        if (not self.userConfig.mpdConfig.playbackJournalFilepath):
+            self.userConfig.mpdConfig.playbackJournalFilepath = mypycommons.file.joinPaths(self.cacheDir, 'mpd-playback-journal.jsonl')
+
     def _createDirectories(self):
         if (not mypycommons.file.pathExists(self.defaultLogDir)):
             mypycommons.file.createDirectory(self.defaultLogDir)
@@ -0,0 +1,135 @@
+'''
+mlu.tags.audiofmt.common
+
+Module for functionality that is shared between the audio format handler classes in the
+mlu.tags.audiofmt modules.
+'''
+
+import mutagen
+
+from mlu.tags.values import TagWriteMode
+
+# Padding (in bytes) left after the tags when a tags write has to rewrite the whole file, so that
+# following writes of the same tags fit in place
+DEFAULT_TAG_PADDING_RESERVE = 64 * 1024
+
+class AudioFormatHandlerBase:
+    '''
+    Base class for the audio format handlers. Handles loading the mutagen interface for the audio
+    file, either by parsing the file again on every call (default) or by reusing a single parsed
+    interface for the duration of a session (see openSession).
+
+    Handlers for formats that have a header-only reader (see mlu.tags.audiofmt.fastread) can use it
+    instead of mutagen when useFastRead is True and no session is open.
+
+    Tags are saved without moving the audio data whenever the new tags fit in the existing padding.
+    If they don't, the whole file has to be rewritten anyway, and tagPaddingReserve bytes of padding
+    are added so that the next updates fit in place.
+
+    Params:
+        audioFilepath: absolute filepath of the audio file
+        useFastRead: whether or not to read tags and properties with the header-only reader, if
+            the format has one
+        tagPaddingReserve: padding to leave after the tags when the file has to be rewritten
+    '''
+    # Key of the DATE_ALL_PLAYS tag (all the play times, replaced by the play history database) in
+    # the mutagen interface of the format
+    _DATE_ALL_PLAYS_KEY = None
+
+    def __init__(self, audioFilepath, useFastRead=False, tagPaddingReserve=DEFAULT_TAG_PADDING_RESERVE):
+        self.audioFilepath = audioFilepath
+        self.useFastRead = useFastRead
+        self.tagPaddingReserve = tagPaddingReserve
+        self._sessionMutagenInterface = None
+        self._tagWriteMode = None
+
+    def openSession(self):
+        '''
+        Parses the audio file once and keeps the resulting mutagen interface, so that all following
+        getTags(), getProperties() and setTags() calls use it instead of parsing the file again.
+
+        Changes made to the file by something other than this handler while the session is open
+        will not be seen until the session is closed.
+        '''
+        self._sessionMutagenInterface = self._loadMutagenInterface()
+
+    def closeSession(self):
+        '''
+        Drops the mutagen interface kept by openSession: following calls parse the file again.
+        '''
+        self._sessionMutagenInterface = None
+
+    def sessionIsOpen(self):
+        return (self._sessionMutagenInterface is not None)
+
+    def getDateAllPlays(self):
+        '''
+        Returns the value of the DATE_ALL_PLAYS tag, which is no longer written ('' if not set).
+        '''
+        return self._getTagValueFromMutagenInterface(self._getMutagenInterface(), self._DATE_ALL_PLAYS_KEY)
+
+    def removeDateAllPlays(self):
+        '''
+        Removes the DATE_ALL_PLAYS tag. Returns the TagWriteMode of the save, SKIPPED if the file
+        does not have the tag.
+        '''
+        mutagenInterface = self._getMutagenInterface()
+        if (mutagenInterface.tags is None or self._DATE_ALL_PLAYS_KEY not in mutagenInterface.tags):
+            return TagWriteMode.SKIPPED
+
+        del mutagenInterface.tags[self._DATE_ALL_PLAYS_KEY]
+        return self._saveMutagenInterface(mutagenInterface)
+
+    def _getMutagenInterface(self):
+        '''
+        Returns the session mutagen interface if a session is open, otherwise a newly parsed one.
+        '''
+        if (self.sessionIsOpen()):
+            return self._sessionMutagenInterface
+        else:
+            return self._loadMutagenInterface()
+
+    def _loadMutagenInterface(self):
+        return mutagen.File(self.audioFilepath)
+
+    def _saveMutagenInterface(self, mutagenInterface, **saveKwargs):
+        '''
+        Saves the tags of the given mutagen interface to the file, using the padding policy of this
+        handler. Returns the TagWriteMode of the save.
+        '''
+        # If mutagen does not ask for the padding to use (Ogg Opus files with padding data that must
+        # be kept), it can't be known whether the file was rewritten
+        self._tagWriteMode = TagWriteMode.FULL_REWRITE
+        mutagenInterface.save(padding=self._getTagWritePadding, **saveKwargs)
+
+        return self._tagWriteMode
+
+    def _getTagWritePadding(self, paddingInfo):
+        '''
+        Padding callback for mutagen's save(): keeps the existing padding if the new tags fit in it,
+        which lets mutagen overwrite the tags in place, otherwise adds the padding reserve.
+        '''
+        if (paddingInfo.padding >= 0):
+            self._tagWriteMode = TagWriteMode.IN_PLACE
+            return paddingInfo.padding
+        else:
+            self._tagWriteMode = TagWriteMode.FULL_REWRITE
+            return max(self.tagPaddingReserve, 0)
+
+    def _getFastReadMetadata(self):
+        '''
+        Returns the FastReadMetadata of the audio file from the header-only reader, or None if it
+        is not used (not enabled, a session is open, or the format has no such reader) or could not
+        read the file, in which case mutagen should be used instead.
+        '''
+        if (not self.useFastRead or self.sessionIsOpen()):
+            return None
+
+        return self._readFastReadMetadata()
+
+    def _readFastReadMetadata(self):
+        '''
+        Reads the audio file with the header-only reader of the format: overridden by the handlers
+        of formats that have one.
+        '''
+        return None
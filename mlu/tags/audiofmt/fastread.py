@@ -0,0 +1,231 @@
+'''
+mlu.tags.audiofmt.fastread
+
+Module containing header-only readers for FLAC and Ogg Opus audio files. These read only the
+metadata at the start of the file (FLAC: STREAMINFO and VORBIS_COMMENT blocks, Ogg Opus: OpusHead
+and OpusTags packets, plus the last Ogg page for the duration) using a few small bounded reads,
+instead of having mutagen build its full object model of the file.
+
+The readers only handle the common, simple file layouts. For anything unusual (ID3 tags in front of
+a FLAC stream, multiplexed/chained Ogg streams, oversized comment blocks, invalid data, ...) they
+return None, and the caller should fall back to reading the file with mutagen.
+'''
+
+import struct
+from typing import Dict, List, Optional
+
+# Comment blocks larger than this (embedded cover art, usually) are left to mutagen
+MAX_COMMENT_BLOCK_SIZE = 1024 * 1024
+
+FLAC_BLOCK_TYPE_STREAMINFO = 0
+FLAC_BLOCK_TYPE_VORBIS_COMMENT = 4
+
+OGG_PAGE_HEADER_SIZE = 27
+OGG_LAST_PAGE_SEARCH_SIZE = 256 * 256
+
+class FastReadMetadata:
+    '''
+    Data structure holding the metadata read by the header-only readers.
+
+    Params:
+        comments: dict of the Vorbis comments, with the lowercase comment name as key and a list of
+            the values of that comment as value (same values as mutagen's VComment lookup)
+        length: duration of the audio, in seconds
+    '''
+    def __init__(self, comments: Dict[str, List[str]], length: float):
+        self.comments = comments
+        self.length = length
+
+class _FastReadNotSupportedError(Exception):
+    '''
+    Raised internally by the readers when the file layout is not one they handle.
+    '''
+    pass
+
+def readFlacMetadata(audioFilepath: str) -> Optional[FastReadMetadata]:
+    '''
+    Reads the comments and duration of a FLAC file from its STREAMINFO and VORBIS_COMMENT metadata
+    blocks. Returns None if the file can't be read this way.
+    '''
+    try:
+        with open(audioFilepath, mode='rb') as audioFile:
+            return _readFlacMetadata(audioFile)
+
+    except (_FastReadNotSupportedError, OSError, struct.error, UnicodeError):
+        return None
+
+def readOggOpusMetadata(audioFilepath: str) -> Optional[FastReadMetadata]:
+    '''
+    Reads the comments and duration of an Ogg Opus file from its OpusHead and OpusTags packets
+    and its last Ogg page. Returns None if the file can't be read this way.
+    '''
+    try:
+        with open(audioFilepath, mode='rb') as audioFile:
+            return _readOggOpusMetadata(audioFile)
+
+    except (_FastReadNotSupportedError, OSError, struct.error, UnicodeError):
+        return None
+
+def _readFlacMetadata(audioFile) -> FastReadMetadata:
+    if (audioFile.read(4) != b'fLaC'):
+        raise _FastReadNotSupportedError()
+
+    comments = None
+    length = None
+    isLastBlock = False
+
+    while (not isLastBlock and (comments is None or length is None)):
+        blockHeader = _readExactly(audioFile, 4)
+        isLastBlock = bool(blockHeader[0] & 0x80)
+        blockType = blockHeader[0] & 0x7F
+        blockSize = int.from_bytes(blockHeader[1:4], 'big')
+
+        if (blockType == FLAC_BLOCK_TYPE_STREAMINFO):
+            length = _getFlacLengthFromStreamInfo(_readExactly(audioFile, blockSize))
+
+        elif (blockType == FLAC_BLOCK_TYPE_VORBIS_COMMENT):
+            if (comments is not None or blockSize > MAX_COMMENT_BLOCK_SIZE):
+                raise _FastReadNotSupportedError()
+            comments = _parseVorbisComments(_readExactly(audioFile, blockSize))
+
+        else:
+            audioFile.seek(blockSize, 1)
+
+    if (length is None):
+        raise _FastReadNotSupportedError()
+    if (comments is None):
+        comments = {}
+
+    return FastReadMetadata(comments, length)
+
+def _getFlacLengthFromStreamInfo(streamInfo: bytes) -> float:
+    if (len(streamInfo) < 18):
+        raise _FastReadNotSupportedError()
+
+    # 20 bit sample rate, 3 bit channels, 5 bit bits per sample, 36 bit total samples
+    sampleRate = (streamInfo[10] << 12) | (streamInfo[11] << 4) | (streamInfo[12] >> 4)
+    totalSamples = ((streamInfo[13] & 0x0F) << 32) | int.from_bytes(streamInfo[14:18], 'big')
+
+    if (not sampleRate):
+        raise _FastReadNotSupportedError()
+
+    return totalSamples / float(sampleRate)
+
+def _readOggOpusMetadata(audioFile) -> FastReadMetadata:
+    # The first page must hold only the OpusHead packet and start the stream
+    (headerType, granulePosition, serial, packets, pageIsComplete) = _readOggPage(audioFile)
+    if (not (headerType & 0x02) or len(packets) != 1 or not pageIsComplete or not packets[0].startswith(b'OpusHead')):
+        raise _FastReadNotSupportedError()
+
+    opusHead = packets[0]
+    if (len(opusHead) < 19 or (opusHead[8] >> 4) != 0):
+        raise _FastReadNotSupportedError()
+    preSkip = struct.unpack('<H', opusHead[10:12])[0]
+
+    # The OpusTags packet starts on the next page, and may continue over several pages
+    opusTags = b''
+    while (True):
+        (headerType, granulePosition, pageSerial, packets, pageIsComplete) = _readOggPage(audioFile)
+        if (pageSerial != serial or len(packets) != 1):
+            raise _FastReadNotSupportedError()
+
+        opusTags += packets[0]
+        if (len(opusTags) > MAX_COMMENT_BLOCK_SIZE):
+            raise _FastReadNotSupportedError()
+        if (pageIsComplete):
+            break
+
+    if (not opusTags.startswith(b'OpusTags')):
+        raise _FastReadNotSupportedError()
+    comments = _parseVorbisComments(opusTags[8:])
+
+    # The duration is taken from the granule position of the last page, which must end the stream
+    audioFile.seek(0, 2)
+    fileSize = audioFile.tell()
+    audioFile.seek(max(0, fileSize - OGG_LAST_PAGE_SEARCH_SIZE))
+    fileEndData = audioFile.read()
+
+    lastPageIndex = fileEndData.rfind(b'OggS')
+    if (lastPageIndex < 0 or len(fileEndData) - lastPageIndex < OGG_PAGE_HEADER_SIZE):
+        raise _FastReadNotSupportedError()
+
+    (lastHeaderType, lastGranulePosition, lastSerial) = _parseOggPageHeader(fileEndData[lastPageIndex:lastPageIndex + OGG_PAGE_HEADER_SIZE])[0:3]
+    if (lastSerial != serial or not (lastHeaderType & 0x04) or lastGranulePosition == -1):
+        raise _FastReadNotSupportedError()
+
+    length = (lastGranulePosition - preSkip) / float(48000)
+    return FastReadMetadata(comments, length)
+
+def _readOggPage(audioFile):
+    '''
+    Reads the Ogg page at the current file position. Returns the page header type, granule position,
+    serial, list of the packet data on the page, and whether or not the last packet on the page is
+    complete (does not continue on the next page).
+    '''
+    (headerType, granulePosition, serial, segmentCount) = _parseOggPageHeader(_readExactly(audioFile, OGG_PAGE_HEADER_SIZE))
+    segmentTable = _readExactly(audioFile, segmentCount)
+    pageData = _readExactly(audioFile, sum(segmentTable))
+
+    packets = []
+    packetStart = 0
+    packetSize = 0
+    for lacingValue in segmentTable:
+        packetSize += lacingValue
+        if (lacingValue < 255):
+            packets.append(pageData[packetStart:packetStart + packetSize])
+            packetStart += packetSize
+            packetSize = 0
+
+    pageIsComplete = (packetSize == 0)
+    if (not pageIsComplete):
+        packets.append(pageData[packetStart:])
+
+    return (headerType, granulePosition, serial, packets, pageIsComplete)
+
+def _parseOggPageHeader(pageHeader: bytes):
+    (capturePattern, version, headerType, granulePosition, serial, sequenceNumber, crc, segmentCount) = struct.unpack('<4sBBqIIIB', pageHeader)
+    if (capturePattern != b'OggS' or version != 0):
+        raise _FastReadNotSupportedError()
+
+    return (headerType, granulePosition, serial, segmentCount)
+
+def _parseVorbisComments(commentData: bytes) -> Dict[str, List[str]]:
+    '''
+    Parses Vorbis comment data (without the framing bit check) into a dict of lowercase comment
+    name -> list of values, the same way mutagen's VComment does.
+    '''
+    comments = {}
+    offset = 0
+
+    vendorLength = struct.unpack_from('<I', commentData, offset)[0]
+    offset += 4 + vendorLength
+    commentCount = struct.unpack_from('<I', commentData, offset)[0]
+    offset += 4
+
+    for i in range(commentCount):
+        commentLength = struct.unpack_from('<I', commentData, offset)[0]
+        offset += 4
+        if (offset + commentLength > len(commentData)):
+            raise _FastReadNotSupportedError()
+
+        comment = commentData[offset:offset + commentLength].decode('utf-8', 'replace')
+        offset += commentLength
+
+        # Malformed comments (no '=') are kept by mutagen under a generated name, so they can't
+        # match any of the comments MLU reads
+        if ('=' not in comment):
+            continue
+
+        (name, value) = comment.split('=', 1)
+        if (not name.isascii()):
+            raise _FastReadNotSupportedError()
+
+        comments.setdefault(name.lower(), []).append(value)
+
+    return comments
+
+def _readExactly(audioFile, size: int) -> bytes:
+    data = audioFile.read(size)
+    if (len(data) != size):
+        raise _FastReadNotSupportedError()
+    return data
@@ -14,15 +14,18 @@ import com.nwrobel.mypycommons.time
 import com.nwrobel.mypycommons.utils
 
 from mlu.tags import values
+from mlu.tags.audiofmt.common import AudioFormatHandlerBase, DEFAULT_TAG_PADDING_RESERVE
 
-class AudioFormatHandlerM4A:
-    def __init__(self, audioFilepath):
-        self.audioFilepath = audioFilepath
+class AudioFormatHandlerM4A(AudioFormatHandlerBase):
+    _DATE_ALL_PLAYS_KEY = '----:com.apple.iTunes:DATE_ALL_PLAYS'
+
+    def __init__(self, audioFilepath, useFastRead=False, tagPaddingReserve=DEFAULT_TAG_PADDING_RESERVE):
+        super().__init__(audioFilepath, useFastRead, tagPaddingReserve)
 
     def getProperties(self):
         '''
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
         duration = timedelta(seconds=mutagenInterface.info.length)
 
         audioProperties = values.AudioFileProperties(duration)
@@ -33,7 +36,7 @@ class AudioFormatHandlerM4A:
         '''
         Returns an AudioFileTags object for the tag values for the M4A audio file
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
 
         # Standard M4A tags
         title = self._getTagValueFromMutagenInterface(mutagenInterface, '\xa9nam')
@@ -61,7 +64,9 @@ class AudioFormatHandlerM4A:
     def setTags(self, audioFileTags):
         '''
         '''
-        mutagenInterface = MP4(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
+        if (mutagenInterface.tags is None):
+            mutagenInterface.add_tags()
 
         # Standard M4A tags
         # mutagenInterface['\xa9nam'] = audioFileTags.title
@@ -75,7 +80,7 @@ class AudioFormatHandlerM4A:
         mutagenInterface['----:com.apple.iTunes:PLAY_COUNT'] = (str(audioFileTags.playCount)).encode('utf-8')
         mutagenInterface['----:com.apple.iTunes:RATING'] = (str(audioFileTags.rating)).encode('utf-8')
 
-        mutagenInterface.save()
+        return self._saveMutagenInterface(mutagenInterface)
 
     def _getTagValueFromMutagenInterface(self, mutagenInterface, mutagenKey):
 
@@ -17,15 +17,19 @@ import com.nwrobel.mypycommons.utils
 import com.nwrobel.mypycommons.string
 
 from mlu.tags import values
+from mlu.tags.values import TagWriteMode
+from mlu.tags.audiofmt.common import AudioFormatHandlerBase, DEFAULT_TAG_PADDING_RESERVE
 
-class AudioFormatHandlerMP3:
-    def __init__(self, audioFilepath):
-        self.audioFilepath = audioFilepath
+class AudioFormatHandlerMP3(AudioFormatHandlerBase):
+    _DATE_ALL_PLAYS_KEY = 'TXXX:DATE_ALL_PLAYS'
+
+    def __init__(self, audioFilepath, useFastRead=False, tagPaddingReserve=DEFAULT_TAG_PADDING_RESERVE):
+        super().__init__(audioFilepath, useFastRead, tagPaddingReserve)
 
     def getProperties(self):
         '''
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
         duration = timedelta(seconds=mutagenInterface.info.length)
 
         audioProperties = values.AudioFileProperties(duration)
@@ -35,7 +39,7 @@ class AudioFormatHandlerMP3:
         '''
         Returns an AudioFileTags object for the tag values for the Mp3 audio file
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
 
         title = self._getTagValueFromMutagenInterface(mutagenInterface, 'TIT2')
         artist = self._getTagValueFromMutagenInterface(mutagenInterface, 'TPE1')
@@ -74,13 +78,31 @@ class AudioFormatHandlerMP3:
         # mutagenInterface.save()
         
         # Use the ID3 interface for setting the nonstandard Mp3 tags
-        mutagenInterface = ID3(self.audioFilepath, v2_version=3)
+        mutagenInterface = self._getMutagenInterface()
+        if (mutagenInterface.tags is None):
+            mutagenInterface.add_tags()
+
+        # Tags are written as ID3v2.3, so the loaded (v2.4) frames must be converted first
+        mutagenInterface.tags.update_to_v23()
 
         mutagenInterface['TXXX:DATE_LAST_PLAYED'] = TXXX(3, desc='DATE_LAST_PLAYED', text=audioFileTags.dateLastPlayed)
         mutagenInterface['TXXX:PLAY_COUNT'] = TXXX(3, desc='PLAY_COUNT', text=str(audioFileTags.playCount))
         mutagenInterface['TXXX:RATING'] = TXXX(3, desc='RATING', text=str(audioFileTags.rating))
 
-        mutagenInterface.save(v2_version=3)
+        return self._saveMutagenInterface(mutagenInterface, v2_version=3)
+
+    def removeDateAllPlays(self):
+        '''
+        '''
+        mutagenInterface = self._getMutagenInterface()
+        if (mutagenInterface.tags is None or self._DATE_ALL_PLAYS_KEY not in mutagenInterface.tags):
+            return TagWriteMode.SKIPPED
+
+        # Saved as ID3v2.3, as setTags does
+        mutagenInterface.tags.update_to_v23()
+        del mutagenInterface.tags[self._DATE_ALL_PLAYS_KEY]
+
+        return self._saveMutagenInterface(mutagenInterface, v2_version=3)
 
     def _getTagValueFromMutagenInterface(self, mutagenInterface, mutagenKey):
         try:
@@ -13,16 +13,24 @@ import com.nwrobel.mypycommons.time
 import com.nwrobel.mypycommons.utils
 
 from mlu.tags import values
+from mlu.tags.audiofmt.common import AudioFormatHandlerBase, DEFAULT_TAG_PADDING_RESERVE
+from mlu.tags.audiofmt import fastread
 
-class AudioFormatHandlerOggOpus:
-    def __init__(self, audioFilepath):
-        self.audioFilepath = audioFilepath
+class AudioFormatHandlerOggOpus(AudioFormatHandlerBase):
+    _DATE_ALL_PLAYS_KEY = 'date_all_plays'
+
+    def __init__(self, audioFilepath, useFastRead=False, tagPaddingReserve=DEFAULT_TAG_PADDING_RESERVE):
+        super().__init__(audioFilepath, useFastRead, tagPaddingReserve)
 
     def getProperties(self):
         '''
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
-        duration = timedelta(seconds=mutagenInterface.info.length)
+        fastReadMetadata = self._getFastReadMetadata()
+        if (fastReadMetadata is not None):
+            duration = timedelta(seconds=fastReadMetadata.length)
+        else:
+            mutagenInterface = self._getMutagenInterface()
+            duration = timedelta(seconds=mutagenInterface.info.length)
 
         audioProperties = values.AudioFileProperties(duration)
         return audioProperties
@@ -31,8 +39,12 @@ class AudioFormatHandlerOggOpus:
         '''
         Returns an AudioFileTags object for the tag values for the FLAC audio file
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
-        tags = mutagenInterface.tags
+        # The tag value lookups work the same on the comments read by the header-only reader
+        fastReadMetadata = self._getFastReadMetadata()
+        if (fastReadMetadata is not None):
+            mutagenInterface = fastReadMetadata.comments
+        else:
+            mutagenInterface = self._getMutagenInterface()
 
         title = self._getTagValueFromMutagenInterface(mutagenInterface, 'title')
         artist = self._getTagValueFromMutagenInterface(mutagenInterface, 'artist')
@@ -59,13 +71,16 @@ class AudioFormatHandlerOggOpus:
     def setTags(self, audioFileTags):
         '''
         '''
-        mutagenInterface = mutagen.File(self.audioFilepath)
+        mutagenInterface = self._getMutagenInterface()
 
         mutagenInterface['date_last_played'] = audioFileTags.dateLastPlayed
         mutagenInterface['play_count'] = str(audioFileTags.playCount)
         mutagenInterface['rating'] = str(audioFileTags.rating)
 
-        mutagenInterface.save()
+        return self._saveMutagenInterface(mutagenInterface)
+
+    def _readFastReadMetadata(self):
+        return fastread.readOggOpusMetadata(self.audioFilepath)
 
     def _getTagValueFromMutagenInterface(self, mutagenInterface, mutagenKey):
         try:
@@ -0,0 +1,104 @@
+'''
+mlu.tags.cache
+
+Module containing the audio file properties cache, which keeps the properties (duration) read
+from audio files so that they are only read once for each version of a file, and the audio file
+validation cache, which keeps the versions of the files that passed the validity check.
+'''
+
+from datetime import timedelta
+from typing import Optional
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+import mlu.tags.io
+import mlu.library.audiolib
+from mlu.tags.values import AudioFileProperties
+
+class AudioFilePropertiesCache:
+    '''
+    Cache of AudioFileProperties, keyed by audio filepath. A cached entry is only used while the
+    size and modified time of the audio file are the same as when its properties were read.
+
+    The cache is held in memory, and if cacheFilepath is given it is loaded from that JSON file and
+    can be written back to it with save(), so that it is kept across runs.
+
+    Params:
+        cacheFilepath: filepath of the JSON file to keep the cache in, or None to only keep it in
+            memory
+        useFastRead: whether or not to read the properties with the header-only readers, for the
+            formats that have one
+    '''
+    def __init__(self, cacheFilepath: Optional[str] = None, useFastRead: bool = False):
+        self.cacheFilepath = cacheFilepath
+        self.useFastRead = useFastRead
+        self._entries = {}
+        self._changed = False
+
+        if (self.cacheFilepath and mypycommons.file.pathExists(self.cacheFilepath)):
+            self._entries = mypycommons.file.readJsonFile(self.cacheFilepath)
+
+    def getProperties(self, audioFilepath: str) -> AudioFileProperties:
+        '''
+        Returns the properties of the given audio file, from the cache if the file has not changed
+        since they were cached, otherwise read from the file (and cached).
+        '''
+        stat = mlu.library.audiolib.getAudioFileStatSignature(audioFilepath)
+        entry = self._entries.get(audioFilepath)
+
+        if (entry is not None and entry['size'] == stat['size'] and entry['mtimeNs'] == stat['mtimeNs']):
+            return AudioFileProperties(timedelta(seconds=entry['duration']))
+
+        handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath, self.useFastRead)
+        properties = handler.getProperties()
+
+        self._entries[audioFilepath] = {
+            'size': stat['size'],
+            'mtimeNs': stat['mtimeNs'],
+            'duration': properties.duration.total_seconds()
+        }
+        self._changed = True
+
+        return properties
+
+    def save(self) -> None:
+        '''
+        Writes the cache to the cache file, if there is one and the cache has new entries.
+        '''
+        if (self.cacheFilepath and self._changed):
+            mypycommons.file.writeJsonFile(self.cacheFilepath, self._entries)
+            self._changed = False
+
+class AudioFileValidationCache:
+    '''
+    Cache of the audio files that passed the validity check (see
+    mlu.utilities.testAudioFilesForErrors), keyed by audio filepath. A file is only considered
+    validated while its stat signature (see mlu.library.audiolib.getAudioFileStatSignature) is the
+    same as when it was checked.
+
+    Kept in memory, and in the given JSON cache file (if any) with save(), like
+    AudioFilePropertiesCache.
+    '''
+    def __init__(self, cacheFilepath: Optional[str] = None):
+        self.cacheFilepath = cacheFilepath
+        self._entries = {}
+        self._changed = False
+
+        if (self.cacheFilepath and mypycommons.file.pathExists(self.cacheFilepath)):
+            self._entries = mypycommons.file.readJsonFile(self.cacheFilepath)
+
+    def isValidated(self, audioFilepath: str, statSignature: dict) -> bool:
+        return (self._entries.get(audioFilepath) == statSignature)
+
+    def setValidated(self, audioFilepath: str, statSignature: dict) -> None:
+        self._entries[audioFilepath] = statSignature
+        self._changed = True
+
+    def save(self) -> None:
+        '''
+        Writes the cache to the cache file, if there is one and the cache has new entries.
+        '''
+        if (self.cacheFilepath and self._changed):
+            mypycommons.file.writeJsonFile(self.cacheFilepath, self._entries)
+            self._changed = False
@@ -12,6 +12,7 @@ from mlu.tags.audiofmt import flac
 from mlu.tags.audiofmt import mp3
 from mlu.tags.audiofmt import m4a
 from mlu.tags.audiofmt import oggOpus
+from mlu.tags.audiofmt.common import DEFAULT_TAG_PADDING_RESERVE
 
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.file
@@ -38,10 +39,24 @@ class AudioFileMetadataHandler:
     '''
     Class that reads data for a single audio file.
 
+    By default, every getTags(), getProperties() and setTags() call parses the audio file again.
+    The handler can also be used as a context manager (or with openSession/closeSession), in which
+    case the file is parsed only once and all calls within the session use that parsed data:
+
+        with AudioFileMetadataHandler(audioFilepath) as handler:
+            tags = handler.getTags()
+            ...
+            handler.setTags(tags)
+
     Params:
         audioFilepath: absolute filepath of the audio file
+        useFastRead: if True, tags and properties of FLAC and Ogg Opus files are read with the
+            header-only readers (mlu.tags.audiofmt.fastread) when no session is open, falling back
+            to mutagen for files those can't handle
+        tagPaddingReserve: padding (in bytes) to leave after the tags when setTags() can't write
+            them in place and the whole file has to be rewritten
     '''
-    def __init__(self, audioFilepath):
+    def __init__(self, audioFilepath, useFastRead=False, tagPaddingReserve=DEFAULT_TAG_PADDING_RESERVE):
         # validate that the filepath exists
         if (not mypycommons.file.isFile(audioFilepath)):
             raise AudioFileNonExistentError("Given 'audioFilepath' must be a valid filepath, invalid value '{}'".format(audioFilepath))
@@ -59,16 +74,36 @@ class AudioFileMetadataHandler:
             raise AudioFileFormatNotSupportedError("Cannot open file '{}': Audio file format is not supported".format(self.audioFilepath))
 
         if (self._audioFileType == 'flac'):
-            self._audioFmtHandler = flac.AudioFormatHandlerFLAC(self.audioFilepath)
+            self._audioFmtHandler = flac.AudioFormatHandlerFLAC(self.audioFilepath, useFastRead, tagPaddingReserve)
 
         elif (self._audioFileType == 'mp3'):
-            self._audioFmtHandler = mp3.AudioFormatHandlerMP3(self.audioFilepath)
+            self._audioFmtHandler = mp3.AudioFormatHandlerMP3(self.audioFilepath, useFastRead, tagPaddingReserve)
 
         elif (self._audioFileType == 'm4a'):
-            self._audioFmtHandler = m4a.AudioFormatHandlerM4A(self.audioFilepath)
+            self._audioFmtHandler = m4a.AudioFormatHandlerM4A(self.audioFilepath, useFastRead, tagPaddingReserve)
 
         elif (self._audioFileType == 'opus'):
-            self._audioFmtHandler = oggOpus.AudioFormatHandlerOggOpus(self.audioFilepath)
+            self._audioFmtHandler = oggOpus.AudioFormatHandlerOggOpus(self.audioFilepath, useFastRead, tagPaddingReserve)
+
+    def __enter__(self):
+        self.openSession()
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.closeSession()
+
+    def openSession(self):
+        '''
+        Parses the audio file once: tags, properties, the change check done by setTags() and the
+        save operation will all use this parsed data until closeSession() is called.
+        '''
+        self._audioFmtHandler.openSession()
+
+    def closeSession(self):
+        '''
+        Ends the session started by openSession(): following calls will parse the file again.
+        '''
+        self._audioFmtHandler.closeSession()
 
     def getTags(self):
         '''
@@ -82,9 +117,12 @@ class AudioFileMetadataHandler:
         This method performs a write operation on the audio file to write the given tag values.
 
         Only the following tags will be set: 
-        DATE_ALL_PLAYS, DATE_LAST_PLAYED, PLAY_COUNT, VOTES, RATING
+        DATE_LAST_PLAYED, PLAY_COUNT, VOTES, RATING
 
         Coming later: allowing you to also set genre, lyrics, comment
+
+        Returns the TagWriteMode of the operation: whether the write was skipped, done in place or
+        needed the whole file to be rewritten.
         '''
 
         # TODO: perform validation here
@@ -93,11 +131,15 @@ class AudioFileMetadataHandler:
 
         # Check to see whether or not the new tags to be set are actually new (did the values actually
         # change?): if not, a write operation is not needed
+        # Within a session, this uses the already parsed data and does not read the file again
         currentTags = self.getTags()
         if (currentTags.equals(audioFileTags)):
             logger.debug("setTags() write operation skipped (no change needed): the current tag values are the same as the new given tag values")
+            return values.TagWriteMode.SKIPPED
         else:
-            self._audioFmtHandler.setTags(audioFileTags)
+            tagWriteMode = self._audioFmtHandler.setTags(audioFileTags)
+            logger.debug("setTags() write operation done ({}): {}".format(tagWriteMode, self.audioFilepath))
+            return tagWriteMode
 
     def getProperties(self):
         '''
@@ -105,110 +147,20 @@ class AudioFileMetadataHandler:
         '''
         return self._audioFmtHandler.getProperties()
 
+    def getDateAllPlays(self):
+        '''
+        Returns the value of the DATE_ALL_PLAYS tag of the audio file ('' if it does not have it).
 
+        This tag is no longer written (the plays are kept in the play history database): it is only
+        read to import the plays from it, see removeDateAllPlays().
+        '''
+        return self._audioFmtHandler.getDateAllPlays()
 
-    
-
-
-
-
-
-
-
-
- 
-
-
-
-     
-
-
-
-
-
-
-
-
-
-
-    # def _setTagsForFLACFile(self, audioFileTags):
-    #     '''
-    #     Sets the FLAC file's tags to that of the AudioFileTags object given.
-    #     '''
-    #     mutagenInterface = mutagen.File(self.audioFilepath)
-
-    #     mutagenInterface['title'] = audioFileTags.title
-    #     mutagenInterface['artist'] = audioFileTags.artist
-    #     mutagenInterface['album'] = audioFileTags.album
-    #     mutagenInterface['albumartist'] = audioFileTags.albumArtist
-    #     mutagenInterface['composer'] = audioFileTags.composer
-    #     mutagenInterface['date'] = audioFileTags.date
-    #     mutagenInterface['genre'] = audioFileTags.genre
-    #     mutagenInterface['tracknumber'] = audioFileTags.trackNumber
-    #     mutagenInterface['tracktotal'] = audioFileTags.totalTracks
-    #     mutagenInterface['discnumber'] = audioFileTags.discNumber
-    #     mutagenInterface['disctotal'] = audioFileTags.totalDiscs
-    #     mutagenInterface['bpm'] = audioFileTags.bpm
-    #     mutagenInterface['key'] = audioFileTags.key
-    #     mutagenInterface['lyrics'] = audioFileTags.lyrics
-    #     mutagenInterface['comment'] = audioFileTags.comment
-    #     mutagenInterface['date_added'] = audioFileTags.dateAdded
-    #     mutagenInterface['date_all_plays'] = audioFileTags.dateAllPlays
-    #     mutagenInterface['date_last_played'] = audioFileTags.dateLastPlayed
-    #     mutagenInterface['play_count'] = audioFileTags.playCount
-    #     mutagenInterface['votes'] = audioFileTags.votes
-    #     mutagenInterface['rating'] = audioFileTags.rating
-
-    #     mutagenInterface.save()
-
-    # def _setTagsForMp3File(self, audioFileTags):
-    #     '''
-    #     Sets the Mp3 file's tags to that of the AudioFileTags object given.
-    #     '''
-    #     # Use the EasyId3 interface for setting the standard Mp3 tags
-    #     mutagenInterface = EasyID3(self.audioFilepath)
-
-    #     mutagenInterface['title'] = audioFileTags.title
-    #     mutagenInterface['artist'] = audioFileTags.artist
-    #     mutagenInterface['album'] = audioFileTags.album
-    #     mutagenInterface['albumartist'] = audioFileTags.albumArtist
-    #     mutagenInterface['genre'] = audioFileTags.genre
-
-    #     mutagenInterface.save()
-        
-    #     # Use the ID3 interface for setting the nonstandard Mp3 tags
-    #     mutagenInterface = ID3(self.audioFilepath, v2_version=3)
-
-    #     mutagenInterface['TXXX:DATE_ALL_PLAYS'] = TXXX(3, desc='DATE_ALL_PLAYS', text=audioFileTags.dateAllPlays)
-    #     mutagenInterface['TXXX:DATE_LAST_PLAYED'] = TXXX(3, desc='DATE_LAST_PLAYED', text=audioFileTags.dateLastPlayed)
-    #     mutagenInterface['TXXX:PLAY_COUNT'] = TXXX(3, desc='PLAY_COUNT', text=audioFileTags.playCount)
-    #     mutagenInterface['TXXX:VOTES'] = TXXX(3, desc='VOTES', text=audioFileTags.votes)
-    #     mutagenInterface['TXXX:RATING'] = TXXX(3, desc='RATING', text=audioFileTags.rating)
-
-    #     mutagenInterface.save(v2_version=3)
-
-
-    # def _setTagsForM4AFile(self, audioFileTags):
-    #     '''
-    #     Sets the M4A file's tags to that of the AudioFileTags object given.
-    #     '''
-
-    #     mutagenInterface = MP4(self.audioFilepath)
-
-    #     # Standard M4A tags
-    #     mutagenInterface['\xa9nam'] = audioFileTags.title
-    #     mutagenInterface['\xa9ART'] = audioFileTags.artist
-    #     mutagenInterface['\xa9alb'] = audioFileTags.album
-    #     mutagenInterface['aART'] = audioFileTags.albumArtist
-    #     mutagenInterface['\xa9gen'] = audioFileTags.genre
-
-    #     # trackNumber, totalTracks, discNumber, and totalDiscs tags are not supported by MLU for
-    #     # M4A files due to limitations of mutagen
-
-    #     # Nonstandard (custom) M4A tags
-    #     mutagenInterface['----:com.apple.iTunes:DATE_ALL_PLAYS'] = (audioFileTags.dateAllPlays).encode('utf-8')
-    #     mutagenInterface['----:com.apple.iTunes:DATE_LAST_PLAYED'] = (audioFileTags.dateLastPlayed).encode('utf-8')
-    #     mutagenInterface['----:com.apple.iTunes:PLAY_COUNT'] = (audioFileTags.playCount).encode('utf-8')
-    #     mutagenInterface['----:com.apple.iTunes:VOTES'] = (audioFileTags.votes).encode('utf-8')
-    #     mutagenInterface['----:com.apple.iTunes:RATING'] = (audioFileTags.rating).encode('utf-8')
-
+    def removeDateAllPlays(self):
+        '''
+        Removes the DATE_ALL_PLAYS tag from the audio file. Returns the TagWriteMode of the operation
+        (SKIPPED if the file does not have the tag).
+        '''
+        tagWriteMode = self._audioFmtHandler.removeDateAllPlays()
+        logger.debug("removeDateAllPlays() write operation done ({}): {}".format(tagWriteMode, self.audioFilepath))
+        return tagWriteMode
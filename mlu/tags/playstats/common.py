@@ -1,9 +1,10 @@
-from typing import List
+from typing import Dict, List
 from datetime import datetime, timedelta
 
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.time
 import mlu.tags.io
+from mlu.tags.cache import AudioFilePropertiesCache
 from com.nwrobel.mypycommons.utils import stringIsNullOrEmpty, listIsNullOrEmpty
 
 class Playback:
@@ -100,10 +101,30 @@ def getUniqueAudioFilesFromPlaybacks(playbacks: List[Playback]) -> List[str]:
     audioFilePaths = sorted(set([playback.audioFilepath for playback in playbacks]))
     return audioFilePaths
 
-def getAudioFileDuration(audioFilepath: str) -> timedelta:
+def groupPlaybacksByAudioFile(playbacks: List[Playback]) -> Dict[str, List[Playback]]:
+    '''
+    Returns the given playbacks grouped by audio file, in one pass over the list: a dict of the
+    playbacks of each audio filepath, in the order they are in the list.
+    '''
+    playbacksByAudioFile = {}
+
+    for playback in playbacks:
+        audioFilePlaybacks = playbacksByAudioFile.get(playback.audioFilepath)
+        if (audioFilePlaybacks is None):
+            playbacksByAudioFile[playback.audioFilepath] = [playback]
+        else:
+            audioFilePlaybacks.append(playback)
+
+    return playbacksByAudioFile
+
+def getAudioFileDuration(audioFilepath: str, propertiesCache: AudioFilePropertiesCache = None) -> timedelta:
     ''' 
+    Returns the duration of the audio file, using the given properties cache if there is one.
     '''
-    handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath)
-    properties = handler.getProperties()
+    if (propertiesCache is not None):
+        properties = propertiesCache.getProperties(audioFilepath)
+    else:
+        handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath)
+        properties = handler.getProperties()
 
     return properties.duration
\ No newline at end of file
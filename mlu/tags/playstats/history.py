@@ -0,0 +1,300 @@
+'''
+mlu.tags.playstats.history
+
+Module containing the play history database: a local SQLite database holding every playback saved
+to the playstat tags, as compact integer epoch values. The audio file tags only keep the play count
+and the date last played.
+
+The database also keeps the play count of each audio file per day, which the history queries (top
+tracks, artists and albums, plays per day or week, etc) are answered from.
+'''
+
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from mlu.tags.playstats.common import Playback
+
+_EPOCH_DATETIME = datetime(1970, 1, 1)
+_EPOCH_DATE = date(1970, 1, 1)
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+class TrackPlayCount:
+    '''
+    Number of plays of a single audio file, with its basic tags from the library tag index (None if
+    the index is not attached or has no entry for the file).
+    '''
+    def __init__(self, filepath: str, title: Optional[str], artist: Optional[str], album: Optional[str], playCount: int):
+        self.filepath = filepath
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.playCount = playCount
+
+class PlayHistoryDatabase:
+    '''
+    Class for reading from and writing to the play history database. Can be used as a context
+    manager, which closes the database connection on exit.
+
+    Each audio file is stored once (by filepath) and its plays refer to it by id. A play is stored
+    as its start time, in seconds since 1970-01-01 (naive, like the playback datetimes), and its
+    duration in seconds (NULL if unknown). An audio file has at most one play per start time, so
+    adding the same playbacks again does not add plays.
+
+    The filepath is the only identity of an audio file: the plays of a file that is moved or
+    renamed stay with its old filepath until they are moved with moveAudioFile, and a different
+    file later saved at the old filepath gets them.
+
+    The queries take date ranges as dates (both ends included), and are answered from the daily
+    play counts. The queries by artist or album need the library tag index to be attached
+    (attachLibraryTagIndex), for the tags of the audio files.
+
+    Params:
+        databaseFilepath: filepath of the SQLite database file, which is created if it does not exist
+    '''
+    def __init__(self, databaseFilepath: str):
+        self.databaseFilepath = databaseFilepath
+        self._connection = sqlite3.connect(databaseFilepath)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._libraryTagIndexAttached = False
+        self._createSchema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def attachLibraryTagIndex(self, tagIndexFilepath: str) -> None:
+        '''
+        Attaches the library tag index database (see mlu.library.tagindex) to the connection, so that
+        the queries get the tags of the audio files from it.
+        '''
+        self._connection.execute("ATTACH DATABASE ? AS library", (tagIndexFilepath,))
+        self._libraryTagIndexAttached = True
+
+    def addPlaybacks(self, playbacks: Iterable[Playback]) -> int:
+        '''
+        Adds the given playbacks, and returns the number of plays added (playbacks already in the
+        database are not counted).
+        '''
+        addedCount = 0
+
+        with self._connection:
+            for playback in playbacks:
+                audioFileId = self._getAudioFileId(playback.audioFilepath)
+                playedAt = getEpochSecondsFromDateTime(playback.dateTime)
+
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO plays (audioFileId, playedAt, duration) VALUES (?, ?, ?)",
+                    (
+                        audioFileId,
+                        playedAt,
+                        round(playback.duration.total_seconds()) if (playback.duration is not None) else None
+                    )
+                )
+
+                if (cursor.rowcount):
+                    self._connection.execute(
+                        "INSERT INTO daily_plays (day, audioFileId, playCount) VALUES (?, ?, 1) " +
+                        "ON CONFLICT (day, audioFileId) DO UPDATE SET playCount = playCount + 1",
+                        (playedAt // _SECONDS_PER_DAY, audioFileId)
+                    )
+                    addedCount += 1
+
+        return addedCount
+
+    def moveAudioFile(self, oldAudioFilepath: str, newAudioFilepath: str) -> int:
+        '''
+        Moves the plays of the audio file at oldAudioFilepath to newAudioFilepath, after the file
+        was moved or renamed. If the new filepath already has plays, the plays are merged (a play
+        with the same start time is kept once). Returns the number of plays moved.
+        '''
+        with self._connection:
+            oldAudioFileId = self._findAudioFileId(oldAudioFilepath)
+            if (oldAudioFileId is None):
+                return 0
+
+            newAudioFileId = self._findAudioFileId(newAudioFilepath)
+            if (newAudioFileId is None):
+                self._connection.execute("UPDATE audio_files SET filepath = ? WHERE id = ?", (newAudioFilepath, oldAudioFileId))
+                return self._connection.execute("SELECT COUNT(*) FROM plays WHERE audioFileId = ?", (oldAudioFileId,)).fetchone()[0]
+
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO plays (audioFileId, playedAt, duration) SELECT ?, playedAt, duration FROM plays WHERE audioFileId = ?",
+                (newAudioFileId, oldAudioFileId)
+            )
+            movedCount = cursor.rowcount
+
+            # Count the daily plays of the new filepath again from its merged plays
+            self._connection.execute("DELETE FROM daily_plays WHERE audioFileId IN (?, ?)", (oldAudioFileId, newAudioFileId))
+            self._connection.execute("DELETE FROM plays WHERE audioFileId = ?", (oldAudioFileId,))
+            self._connection.execute("DELETE FROM audio_files WHERE id = ?", (oldAudioFileId,))
+            self._connection.execute(
+                "INSERT INTO daily_plays (day, audioFileId, playCount) " +
+                "SELECT playedAt / ?, audioFileId, COUNT(*) FROM plays WHERE audioFileId = ? GROUP BY playedAt / ?",
+                (_SECONDS_PER_DAY, newAudioFileId, _SECONDS_PER_DAY)
+            )
+
+        return movedCount
+
+    def getPlaybacks(self, audioFilepath: str) -> List[Playback]:
+        '''
+        Returns the playbacks of the given audio file, oldest first.
+        '''
+        cursor = self._connection.execute(
+            "SELECT p.playedAt, p.duration FROM plays p JOIN audio_files f ON (f.id = p.audioFileId) " +
+            "WHERE f.filepath = ? ORDER BY p.playedAt",
+            (audioFilepath,)
+        )
+        return [self._getPlaybackFromValues(audioFilepath, row[0], row[1]) for row in cursor]
+
+    def getPlayCount(self, audioFilepath: str) -> int:
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM plays p JOIN audio_files f ON (f.id = p.audioFileId) WHERE f.filepath = ?",
+            (audioFilepath,)
+        ).fetchone()[0]
+
+    def getPlaysCount(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+
+    def getTopTracks(self, startDate: date, endDate: date, limit: int) -> List[TrackPlayCount]:
+        '''
+        Returns the most played audio files in the given date range, most played first.
+        '''
+        tagColumns = "t.title, t.artist, t.album" if (self._libraryTagIndexAttached) else "NULL, NULL, NULL"
+        tagJoin = "LEFT JOIN library.audio_files t ON (t.filepath = f.filepath) " if (self._libraryTagIndexAttached) else ""
+
+        cursor = self._connection.execute(
+            "SELECT f.filepath, {}, c.playCount FROM (".format(tagColumns) +
+            "SELECT audioFileId, SUM(playCount) AS playCount FROM daily_plays WHERE day BETWEEN ? AND ? GROUP BY audioFileId" +
+            ") c JOIN audio_files f ON (f.id = c.audioFileId) " + tagJoin +
+            "ORDER BY c.playCount DESC, f.filepath LIMIT ?",
+            (getEpochDayFromDate(startDate), getEpochDayFromDate(endDate), limit)
+        )
+        return [TrackPlayCount(*row) for row in cursor]
+
+    def getTopArtists(self, startDate: date, endDate: date, limit: int) -> List[Tuple[Optional[str], int]]:
+        '''
+        Returns the (artist, play count) of the most played artists in the given date range, most
+        played first. The plays of audio files that are not in the library tag index have the
+        artist None.
+        '''
+        return self._getTopTagValues('t.artist', startDate, endDate, limit)
+
+    def getTopAlbums(self, startDate: date, endDate: date, limit: int) -> List[Tuple[Optional[str], Optional[str], int]]:
+        '''
+        Returns the (album artist, album, play count) of the most played albums in the given date
+        range, most played first. The album artist is the artist for audio files without one.
+        '''
+        return self._getTopTagValues("COALESCE(NULLIF(t.albumArtist, ''), t.artist), t.album", startDate, endDate, limit)
+
+    def getPlaysPerDay(self, startDate: date, endDate: date) -> List[Tuple[date, int]]:
+        '''
+        Returns the (day, play count) of each day in the given date range that has plays.
+        '''
+        cursor = self._connection.execute(
+            "SELECT day, SUM(playCount) FROM daily_plays WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day",
+            (getEpochDayFromDate(startDate), getEpochDayFromDate(endDate))
+        )
+        return [(getDateFromEpochDay(row[0]), row[1]) for row in cursor]
+
+    def getPlaysPerWeek(self, startDate: date, endDate: date) -> List[Tuple[date, int]]:
+        '''
+        Returns the (first day of the week, play count) of each week (Monday to Sunday) in the given
+        date range that has plays. Only the plays in the date range are counted.
+        '''
+        # 1970-01-01 was a Thursday: day + 3 is the number of days since the Monday before it
+        cursor = self._connection.execute(
+            "SELECT day - ((day + 3) % 7) AS week, SUM(playCount) FROM daily_plays WHERE day BETWEEN ? AND ? GROUP BY week ORDER BY week",
+            (getEpochDayFromDate(startDate), getEpochDayFromDate(endDate))
+        )
+        return [(getDateFromEpochDay(row[0]), row[1]) for row in cursor]
+
+    def getNotPlayedSince(self, sinceDateTime: datetime) -> List[Tuple[str, Optional[datetime]]]:
+        '''
+        Returns the (filepath, date last played) of the audio files not played since the given
+        time, never played first, then least recently played first. If the library tag index is
+        attached, the library audio files that were never played are included (date last played
+        None).
+        '''
+        query = (
+            "SELECT f.filepath, MAX(p.playedAt) AS lastPlayedAt FROM audio_files f LEFT JOIN plays p ON (p.audioFileId = f.id) " +
+            "GROUP BY f.id HAVING lastPlayedAt IS NULL OR lastPlayedAt < ?"
+        )
+        if (self._libraryTagIndexAttached):
+            query += " UNION ALL SELECT t.filepath, NULL FROM library.audio_files t WHERE t.filepath NOT IN (SELECT filepath FROM audio_files)"
+
+        cursor = self._connection.execute(
+            "SELECT filepath, lastPlayedAt FROM ({}) ORDER BY lastPlayedAt, filepath".format(query),
+            (getEpochSecondsFromDateTime(sinceDateTime),)
+        )
+        return [(row[0], getDateTimeFromEpochSeconds(row[1]) if (row[1] is not None) else None) for row in cursor]
+
+    def _getTopTagValues(self, tagColumns: str, startDate: date, endDate: date, limit: int) -> list:
+        if (not self._libraryTagIndexAttached):
+            raise ValueError("library tag index not attached, it is needed for the tags of the audio files")
+
+        cursor = self._connection.execute(
+            "SELECT {}, SUM(c.playCount) AS playCount FROM (".format(tagColumns) +
+            "SELECT audioFileId, SUM(playCount) AS playCount FROM daily_plays WHERE day BETWEEN ? AND ? GROUP BY audioFileId" +
+            ") c JOIN audio_files f ON (f.id = c.audioFileId) LEFT JOIN library.audio_files t ON (t.filepath = f.filepath) " +
+            "GROUP BY {} ORDER BY playCount DESC LIMIT ?".format(tagColumns),
+            (getEpochDayFromDate(startDate), getEpochDayFromDate(endDate), limit)
+        )
+        return [tuple(row) for row in cursor]
+
+    def _findAudioFileId(self, audioFilepath: str) -> Optional[int]:
+        row = self._connection.execute("SELECT id FROM audio_files WHERE filepath = ?", (audioFilepath,)).fetchone()
+        return row[0] if (row is not None) else None
+
+    def _getAudioFileId(self, audioFilepath: str) -> int:
+        self._connection.execute("INSERT OR IGNORE INTO audio_files (filepath) VALUES (?)", (audioFilepath,))
+        return self._connection.execute("SELECT id FROM audio_files WHERE filepath = ?", (audioFilepath,)).fetchone()[0]
+
+    def _getPlaybackFromValues(self, audioFilepath: str, playedAt: int, duration: Optional[int]) -> Playback:
+        return Playback(
+            audioFilepath,
+            getDateTimeFromEpochSeconds(playedAt),
+            timedelta(seconds=duration) if (duration is not None) else None
+        )
+
+    def _createSchema(self) -> None:
+        with self._connection:
+            self._connection.executescript('''
+                CREATE TABLE IF NOT EXISTS audio_files (
+                    id INTEGER PRIMARY KEY,
+                    filepath TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS plays (
+                    audioFileId INTEGER NOT NULL REFERENCES audio_files (id),
+                    playedAt INTEGER NOT NULL,
+                    duration INTEGER,
+                    PRIMARY KEY (audioFileId, playedAt)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS plays_playedAt_idx ON plays (playedAt);
+                CREATE TABLE IF NOT EXISTS daily_plays (
+                    day INTEGER NOT NULL,
+                    audioFileId INTEGER NOT NULL REFERENCES audio_files (id),
+                    playCount INTEGER NOT NULL,
+                    PRIMARY KEY (day, audioFileId)
+                ) WITHOUT ROWID;
+
+                -- Left by databases created when the DATE_ALL_PLAYS import was done automatically
+                DROP TABLE IF EXISTS settings;
+            ''')
+
+def getEpochSecondsFromDateTime(dateTime: datetime) -> int:
+    return (dateTime - _EPOCH_DATETIME) // timedelta(seconds=1)
+
+def getDateTimeFromEpochSeconds(epochSeconds: int) -> datetime:
+    return _EPOCH_DATETIME + timedelta(seconds=epochSeconds)
+
+def getEpochDayFromDate(dateValue: date) -> int:
+    return (dateValue - _EPOCH_DATE).days
+
+def getDateFromEpochDay(epochDay: int) -> date:
+    return _EPOCH_DATE + timedelta(days=epochDay)
@@ -1,6 +1,8 @@
-from typing import List, Optional, Tuple
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from datetime import timedelta, datetime
-from prettytable import PrettyTable
+import heapq
 import math 
 
 from com.nwrobel import mypycommons
@@ -12,20 +14,38 @@ import com.nwrobel.mypycommons.time
 import mlu.tags.io
 import mlu.tags.common
 import mlu.utilities
+import mlu.report
+import mlu.library.audiolib
 import mlu.tags.playstats.common 
+import mlu.mpd.checkpoint
 from mlu.tags.playstats.common import Playback, AudioFilePlaybackList
+import mlu.tags.playstats.store
+from mlu.tags.playstats.store import PlaybackStore, PlaybackStoreFormatError
+from mlu.tags.playstats.tagjournal import PlaystatTagWriteJournal
+from mlu.tags.playstats.history import PlayHistoryDatabase
+from mlu.tags.values import TagWriteMode
+from mlu.tags.cache import AudioFilePropertiesCache, AudioFileValidationCache
+from mlu.report import ReportColumn
+from mlu.library.tagindex import LibraryTagIndex
 from mlu.mpd.plays import MpdPlaybackProvider
+from mlu.mpd.journal import PlaybackJournal
 from mlu.settings import MLUSettings
 
 class PlaystatTags:
-    def __init__(self, audioFilepath: str):
+    def __init__(self, audioFilepath: str, tagPaddingReserve: int):
         self.audioFilepath = audioFilepath
         self.playCount = 0
         self.dateLastPlayed = None
-        self.dateAllPlays = []
-        self._handler = mlu.tags.io.AudioFileMetadataHandler(self.audioFilepath)
+        self._handler = mlu.tags.io.AudioFileMetadataHandler(self.audioFilepath, tagPaddingReserve=tagPaddingReserve)
 
-        self._loadTags()
+        # Parse the file only once for loading, the change check and saving of the tags:
+        # the session is closed once the tags are saved, or if they can't be loaded
+        self._handler.openSession()
+        try:
+            self._loadTags()
+        except:
+            self._handler.closeSession()
+            raise
 
     def _loadTags(self):
         currentTags = self._handler.getTags()
@@ -36,31 +56,50 @@ class PlaystatTags:
         
         if (currentTags.dateLastPlayed):
             self.dateLastPlayed = mypycommons.time.getDateTimeFromFormattedTime(currentTags.dateLastPlayed)
-        
-        if (currentTags.dateAllPlays):
-            currentDateAllPlaysList = mlu.tags.common.formatAudioTagToValuesList(currentTags.dateAllPlays)
-            self.dateAllPlays = [mypycommons.time.getDateTimeFromFormattedTime(x) for x in currentDateAllPlaysList]
 
-    def saveTags(self):
+    def getTagValues(self) -> dict:
         '''
-        Write current class values to file, formatted 
+        Returns the current class values, formatted as they are written to the file.
         '''
-        playCountFmt = str(self.playCount)
-        dateLastPlayedFmt = mypycommons.time.formatDatetimeForDisplay(self.dateLastPlayed)
+        return {
+            'playCount': str(self.playCount),
+            'dateLastPlayed': mypycommons.time.formatDatetimeForDisplay(self.dateLastPlayed)
+        }
 
-        dateAllPlaysFmtList = [mypycommons.time.formatDatetimeForDisplay(x) for x in self.dateAllPlays]
-        dateAllPlaysFmt = mlu.tags.common.formatValuesListToAudioTag(dateAllPlaysFmtList)
+    def setTagValues(self, tagValues: dict) -> None:
+        '''
+        Sets the class values from the given formatted values (see getTagValues).
+        '''
+        self.playCount = int(tagValues['playCount'])
+        self.dateLastPlayed = mypycommons.time.getDateTimeFromFormattedTime(tagValues['dateLastPlayed'])
 
-        currentTags = self._handler.getTags()
-        currentTags.playCount = playCountFmt
-        currentTags.dateLastPlayed = dateLastPlayedFmt
-        currentTags.dateAllPlays = dateAllPlaysFmt
+    def saveTags(self):
+        '''
+        Write current class values to file, formatted. Returns the TagWriteMode of the write.
+        The session of the file is closed, whether the write succeeds or not.
+        '''
+        try:
+            tagValues = self.getTagValues()
+
+            currentTags = self._handler.getTags()
+            currentTags.playCount = tagValues['playCount']
+            currentTags.dateLastPlayed = tagValues['dateLastPlayed']
 
-        self._handler.setTags(currentTags)
+            return self._handler.setTags(currentTags)
+        finally:
+            self._handler.closeSession()
 
 class PlaystatTagUpdaterForMpd:
     ''' 
     '''
+    _CHECKPOINT_FILENAME = 'mpd-log-checkpoint.json'
+    _HISTORY_LOG_FILES_FILENAME = 'mpd-log-history-files.json'
+    _JOURNAL_FILENAME = 'mpd-playback-journal.jsonl'
+    _TAG_WRITE_JOURNAL_FILENAME = 'playstat-tags-written.jsonl'
+
+    # Number of audio files whose tags are written between two writes of the tag write journal
+    _TAG_WRITE_BATCH_SIZE = 32
+
     def __init__(self, mluSettings: MLUSettings, commonLogger: mypycommons.logger.CommonLogger) -> None:
         if (mluSettings is None):
             raise TypeError("mluSettings not passed")
@@ -69,20 +108,75 @@ class PlaystatTagUpdaterForMpd:
 
         self._settings = mluSettings
         self._logger = commonLogger.getLogger()
-        self._mpdPlaybackProvider = MpdPlaybackProvider(mluSettings, commonLogger)
+        self._commonLogger = commonLogger
+        self._mpdPlaybackProvider = None
+        self._audioPropertiesCache = AudioFilePropertiesCache(
+            self._settings.audioPropertiesCacheFilepath,
+            self._settings.userConfig.libraryTagsConfig.fastRead
+        )
+        self._audioValidationCache = AudioFileValidationCache(self._settings.audioValidationCacheFilepath)
         self._playbacks = None
+        self._playbacksByAudioFile = None
         self._uniqueAudioFiles = None
 
-    def processMpdLogFile(self) -> None:
+        # Basic tags (title, artist, album) of the audio files in the summaries, read at most once
+        # per run
+        self._audioFilesBasicTags = {}
+
+    def processMpdLogFile(self, incremental: bool = False, history: bool = False, fromJournal: bool = False) -> Optional[str]:
         ''' 
+        Loads the playbacks from the MPD log file and writes them to a new data dir, whose filepath
+        is returned (None if the audio files check failed).
+
+        If incremental is True, only the part of the log file written since the last saved
+        checkpoint is read, and the new checkpoint is written to the data dir: it is saved once the
+        tags are updated from that data dir.
+
+        If history is True, the playbacks are loaded from the whole log history (the archived and
+        rotated logs, and the log file), to rebuild the play history. The tags already have these
+        playbacks, so the tags can't be updated from the data dir.
+
+        If fromJournal is True, the playbacks are loaded from the playback journal (recorded live by
+        track-mpd-playbacks.py) instead of the log file. They are moved from the journal to the
+        data dir.
         '''
-        self._logger.info("Loading playback info from mpd log file")
-        
-        self._playbacks = self._mpdPlaybackProvider.getPlaybacks()
-        self._uniqueAudioFiles = mlu.tags.playstats.common.getUniqueAudioFilesFromPlaybacks(self._playbacks)
+        if ([incremental, history, fromJournal].count(True) > 1):
+            raise ValueError("only one of incremental, history and fromJournal can be used")
+
+        newCheckpoint = None
+        historyLogFilepaths = None
+        playbackJournal = None
+
+        if (fromJournal):
+            self._logger.info("Loading playback info from playback journal: {}".format(self._settings.userConfig.mpdConfig.playbackJournalFilepath))
+            playbackJournal = PlaybackJournal(self._settings.userConfig.mpdConfig.playbackJournalFilepath)
+            self._playbacks = playbackJournal.startLoading()
+
+            if (not self._playbacks):
+                self._logger.info("No playbacks in the playback journal")
+                return None
+        else:
+            self._logger.info("Loading playback info from mpd log file")
+
+        if (history):
+            self._playbacks, historyLogFilepaths = self._getMpdPlaybackProvider().getHistoryPlaybacks()
+        elif (incremental):
+            checkpoint = mlu.mpd.checkpoint.readCheckpointFile(self._getCheckpointFilepath())
+            self._playbacks, newCheckpoint = self._getMpdPlaybackProvider().getPlaybacksSinceCheckpoint(checkpoint)
+        elif (not fromJournal):
+            self._playbacks = self._getMpdPlaybackProvider().getPlaybacks()
+
+        # Index of the playbacks of each audio file, used by the filtering and conversion below
+        self._playbacksByAudioFile = mlu.tags.playstats.common.groupPlaybacksByAudioFile(self._playbacks)
+        self._uniqueAudioFiles = sorted(self._playbacksByAudioFile)
 
         self._logger.info("Testing all found audio files for validity")
-        audioFileErrors = mlu.utilities.testAudioFilesForErrors(self._uniqueAudioFiles)
+        audioFileErrors = mlu.utilities.testAudioFilesForErrors(
+            self._uniqueAudioFiles,
+            self._audioValidationCache,
+            self._settings.userConfig.libraryTagsConfig.scanWorkers
+        )
+        self._audioValidationCache.save()
 
         if (audioFileErrors):
             audioFileErrorLogText = ''
@@ -91,13 +185,13 @@ class PlaystatTagUpdaterForMpd:
 
             self._logger.error("The following audio files failed validity check:\n{}".format(audioFileErrorLogText))
             self._logger.info("exiting due to failed check. open log file and manually fix file paths or remove those lines")
-            return
+            return None
 
         self._logger.info("Excluding partial playbacks (<20% played) for playback data")
-        finalPlaybacks, excludedPlaybacks = self._filterPlaybacks()
+        finalPlaybacksByAudioFile, excludedPlaybacksByAudioFile = self._filterPlaybacks()
 
-        finalPlaybackLists = self._convertPlaybacksToAudioFilePlaybackLists(finalPlaybacks)
-        excludedPlaybackLists = self._convertPlaybacksToAudioFilePlaybackLists(excludedPlaybacks)
+        finalPlaybackLists = self._convertPlaybacksToAudioFilePlaybackLists(finalPlaybacksByAudioFile)
+        excludedPlaybackLists = self._convertPlaybacksToAudioFilePlaybackLists(excludedPlaybacksByAudioFile)
 
         outputDir = self._getOutputFilesDir()
         self._logger.info("Writing included and excluded playbacks data json output files")
@@ -108,24 +202,98 @@ class PlaystatTagUpdaterForMpd:
         self._saveHistorySummaryOutputFile(finalPlaybackLists, outputDir)
         self._saveTotalsSummaryOutputFile(finalPlaybackLists, outputDir)
 
+        if (newCheckpoint is not None):
+            self._logger.info("Writing MPD log checkpoint to data dir, to be saved with the tags: offset {}, last line {}".format(newCheckpoint.offset, newCheckpoint.lastLineDateTime))
+            mlu.mpd.checkpoint.writeCheckpointFile(mypycommons.file.joinPaths(outputDir, self._CHECKPOINT_FILENAME), newCheckpoint)
+
+        if (historyLogFilepaths is not None):
+            mypycommons.file.writeJsonFile(mypycommons.file.joinPaths(outputDir, self._HISTORY_LOG_FILES_FILENAME), historyLogFilepaths)
+
+        if (playbackJournal is not None):
+            self._logger.info("Moving loaded playback journal entries to data dir")
+            playbackJournal.finishLoading(mypycommons.file.joinPaths(outputDir, self._JOURNAL_FILENAME))
+
+        self._audioPropertiesCache.save()
+        return outputDir
+
+    def ingestMpdLogFile(self) -> None:
+        '''
+        Incrementally loads the playbacks written to the MPD log file since the last checkpoint and
+        updates the playstat tags from them, in one step. The log file is not archived or cleared.
+        '''
+        outputDir = self.processMpdLogFile(incremental=True)
+        if (outputDir is not None):
+            self.updatePlaystatTags(mypycommons.file.getFilename(outputDir))
+
 
     def updatePlaystatTags(self, dataDirName: str) -> None:
         dataDir = mypycommons.file.joinPaths(self._settings.userConfig.mpdConfig.outputDir, dataDirName)
 
+        if (mypycommons.file.pathExists(mypycommons.file.joinPaths(dataDir, self._HISTORY_LOG_FILES_FILENAME))):
+            self._logger.info("Data dir was loaded from the whole MPD log history, whose playbacks are already counted in the tags: adding its playbacks to the play history database only (tags not updated)")
+            self._addPlaybacksToPlayHistory(self._loadPlaybacksOutputFile(dataDir, 'playbacks.data.json'))
+            return
+
+        # Data dirs loaded incrementally must be saved in the order they were loaded, and only once
+        checkpointFilepath = self._getCheckpointFilepath()
+        newCheckpoint = mlu.mpd.checkpoint.readCheckpointFile(mypycommons.file.joinPaths(dataDir, self._CHECKPOINT_FILENAME))
+
+        if (newCheckpoint is not None and not newCheckpoint.continuesFrom(mlu.mpd.checkpoint.readCheckpointFile(checkpointFilepath))):
+            self._logger.error("Data dir was loaded from an MPD log checkpoint that is not the current one (it was already saved, or another data dir was saved since): tags not updated")
+            return
+
+        tagWriteJournal = PlaystatTagWriteJournal(mypycommons.file.joinPaths(dataDir, self._TAG_WRITE_JOURNAL_FILENAME))
+        if (tagWriteJournal.isComplete()):
+            self._logger.error("Playstat tags were already updated from this data dir: tags not updated")
+            return
+
         self._logger.info("Loading data file from dir {}".format(dataDir))
         audioFilePlaybackLists = self._loadPlaybacksOutputFile(dataDir, 'playbacks.data.json')
 
-        self._logger.info("Setting playstat tags for {} audio files".format(len(audioFilePlaybackLists)))
-        for audioFilePlaybackList in audioFilePlaybackLists:
-            self._updatePlaystatTagsForAudioFilePlaybackList(audioFilePlaybackList)
+        # Resume an interrupted update: the files already written have the playbacks counted
+        writtenAudioFilepaths = tagWriteJournal.getWrittenAudioFilepaths()
+        playbackListsToWrite = [playbackList for playbackList in audioFilePlaybackLists if (playbackList.audioFilepath not in writtenAudioFilepaths)]
+        if (writtenAudioFilepaths):
+            self._logger.info("Resuming playstat tags update: skipping {} audio files already written".format(len(audioFilePlaybackLists) - len(playbackListsToWrite)))
+
+        writeWorkers = self._settings.userConfig.tagWriteConfig.writeWorkers
+        self._logger.info("Setting playstat tags for {} audio files ({} workers)".format(len(playbackListsToWrite), writeWorkers))
+        with PlayHistoryDatabase(self._settings.userConfig.playHistoryFilepath) as playHistory:
+            tagWriteModeCounts = self._updatePlaystatTagsForAudioFilePlaybackLists(playbackListsToWrite, tagWriteJournal, playHistory, writeWorkers)
+
+        self._logger.info("Playstat tags set: {} written in place, {} needed a full file rewrite, {} unchanged".format(
+            tagWriteModeCounts.get(TagWriteMode.IN_PLACE, 0),
+            tagWriteModeCounts.get(TagWriteMode.FULL_REWRITE, 0),
+            tagWriteModeCounts.get(TagWriteMode.SKIPPED, 0)
+        ))
+
+        if (newCheckpoint is not None):
+            self._logger.info("Saving MPD log checkpoint (the log file is not archived or cleared): {}".format(checkpointFilepath))
+            mlu.mpd.checkpoint.writeCheckpointFile(checkpointFilepath, newCheckpoint)
+        elif (mypycommons.file.pathExists(mypycommons.file.joinPaths(dataDir, self._JOURNAL_FILENAME))):
+            self._logger.info("Data dir was loaded from the playback journal: the MPD log file is not archived or cleared")
+        else:
+            self._archiveMpdLogFile()
+            self._resetMpdLogFile()
 
-        self._archiveMpdLogFile()
-        self._resetMpdLogFile()
+        tagWriteJournal.markComplete()
 
         self._logger.info("Writing summary output files for tags written to data dir: {}".format(dataDir))
         self._saveHistorySummaryOutputFile(audioFilePlaybackLists, dataDir)
         self._saveTotalsSummaryOutputFile(audioFilePlaybackLists, dataDir)
 
+        self._audioPropertiesCache.save()
+
+
+    def _getMpdPlaybackProvider(self) -> MpdPlaybackProvider:
+        '''
+        Returns the MPD log playback provider, created when first needed, so that the MPD log file
+        is not required when the playbacks are loaded from the playback journal.
+        '''
+        if (self._mpdPlaybackProvider is None):
+            self._mpdPlaybackProvider = MpdPlaybackProvider(self._settings, self._commonLogger)
+
+        return self._mpdPlaybackProvider
 
     def _archiveMpdLogFile(self) -> None:
         mpdLogArchiveFilename = '[{}] {}.archive.7z'.format(
@@ -141,11 +309,209 @@ class PlaystatTagUpdaterForMpd:
         self._logger.info("Clearing MPD log file: {}".format(self._settings.userConfig.mpdConfig.logFilepath))
         mypycommons.file.clearFileContents(self._settings.userConfig.mpdConfig.logFilepath)
 
-    def _updatePlaystatTagsForAudioFilePlaybackList(self, audioFilePlaybackList: AudioFilePlaybackList) -> None:
+    def _addPlaybacksToPlayHistory(self, audioFilePlaybackLists: List[AudioFilePlaybackList]) -> None:
+        playbacks = self._convertAudioFilePlaybackListsToPlaybacks(audioFilePlaybackLists)
+
+        with PlayHistoryDatabase(self._settings.userConfig.playHistoryFilepath) as playHistory:
+            addedCount = playHistory.addPlaybacks(playbacks)
+
+        self._logger.info("Added {} plays to the play history database ({} were already in it): {}".format(
+            addedCount,
+            len(playbacks) - addedCount,
+            self._settings.userConfig.playHistoryFilepath
+        ))
+
+    def movePlayHistory(self, oldAudioFilepath: str, newAudioFilepath: str) -> None:
         '''
-        Alter PLAY_COUNT, DATE_LAST_PLAYED, DATE_ALL_PLAYS
+        Moves the plays in the play history database of an audio file that was moved or renamed to
+        its new filepath (the database knows the audio files by filepath only).
         '''
-        playstatTags = PlaystatTags(audioFilePlaybackList.audioFilepath)
+        with PlayHistoryDatabase(self._settings.userConfig.playHistoryFilepath) as playHistory:
+            movedCount = playHistory.moveAudioFile(oldAudioFilepath, newAudioFilepath)
+
+        self._logger.info("Moved {} plays in the play history database from '{}' to '{}'".format(movedCount, oldAudioFilepath, newAudioFilepath))
+
+    def importDateAllPlaysToPlayHistory(self, removeTags: bool) -> None:
+        '''
+        Imports the plays of the DATE_ALL_PLAYS tags of the library audio files (the tag that kept
+        all the play times before the play history database) into the play history database. If
+        removeTags is True, the tag is then removed from the files whose plays were imported.
+
+        The tags are read in batches, on a thread pool, and the plays of each batch are committed
+        to the database. The import can be run again: plays already in the database are not added
+        again. The tags are only removed once the plays of every file are committed, and a file
+        whose tag can't be read keeps its tag.
+        '''
+        with PlayHistoryDatabase(self._settings.userConfig.playHistoryFilepath) as playHistory:
+            importedAudioFilepaths = self._importDateAllPlaysToPlayHistory(playHistory)
+
+        if (removeTags):
+            self._removeDateAllPlaysFromAudioFiles(importedAudioFilepaths)
+        else:
+            self._logger.info("DATE_ALL_PLAYS tags left on the audio files (not removed)")
+
+    def _importDateAllPlaysToPlayHistory(self, playHistory: PlayHistoryDatabase) -> List[str]:
+        '''
+        Adds the plays of the DATE_ALL_PLAYS tags of the library audio files to the play history
+        database, and returns the filepaths of the audio files whose plays were added.
+        '''
+        audioFilepaths = mlu.library.audiolib.getAllLibraryAudioFilepaths(self._settings.userConfig.audioLibraryRootDir)
+        writeWorkers = self._settings.userConfig.tagWriteConfig.writeWorkers
+        self._logger.info("Importing the plays of the DATE_ALL_PLAYS tags of {} library audio files to the play history database ({} workers)".format(len(audioFilepaths), writeWorkers))
+
+        addedCount = 0
+        importedAudioFilepaths = []
+
+        with ThreadPoolExecutor(max_workers=max(writeWorkers, 1)) as executor:
+            for batchStart in range(0, len(audioFilepaths), self._TAG_WRITE_BATCH_SIZE):
+                batchAudioFilepaths = audioFilepaths[batchStart:batchStart + self._TAG_WRITE_BATCH_SIZE]
+                tagReads = [executor.submit(self._getDateAllPlaysPlaybacks, audioFilepath) for audioFilepath in batchAudioFilepaths]
+
+                batchPlaybacks = []
+                batchImportedAudioFilepaths = []
+                for (audioFilepath, tagRead) in zip(batchAudioFilepaths, tagReads):
+                    try:
+                        playbacks = tagRead.result()
+                    except Exception as error:
+                        self._logger.error("Failed to read DATE_ALL_PLAYS tag for audio file, its plays were not imported: {}: {}".format(audioFilepath, error))
+                    else:
+                        if (playbacks):
+                            batchPlaybacks.extend(playbacks)
+                            batchImportedAudioFilepaths.append(audioFilepath)
+
+                # Committed before the next batch is read
+                addedCount += playHistory.addPlaybacks(batchPlaybacks)
+                importedAudioFilepaths.extend(batchImportedAudioFilepaths)
+
+        self._logger.info("Imported {} plays from the DATE_ALL_PLAYS tags of {} audio files (plays already in the database are not counted)".format(addedCount, len(importedAudioFilepaths)))
+        return importedAudioFilepaths
+
+    def _removeDateAllPlaysFromAudioFiles(self, audioFilepaths: List[str]) -> None:
+        '''
+        Removes the DATE_ALL_PLAYS tag from the given audio files, on a thread pool. A file whose
+        tag can't be removed is logged and skipped.
+        '''
+        writeWorkers = self._settings.userConfig.tagWriteConfig.writeWorkers
+        self._logger.info("Removing the DATE_ALL_PLAYS tags of {} audio files ({} workers)".format(len(audioFilepaths), writeWorkers))
+        tagsRemovedCount = 0
+
+        with ThreadPoolExecutor(max_workers=max(writeWorkers, 1)) as executor:
+            tagRemovals = [executor.submit(self._removeDateAllPlays, audioFilepath) for audioFilepath in audioFilepaths]
+            for (audioFilepath, tagRemoval) in zip(audioFilepaths, tagRemovals):
+                try:
+                    tagRemoval.result()
+                except Exception as error:
+                    self._logger.error("Failed to remove DATE_ALL_PLAYS tag for audio file (its plays were imported): {}: {}".format(audioFilepath, error))
+                else:
+                    tagsRemovedCount += 1
+
+        self._logger.info("Removed the DATE_ALL_PLAYS tag from {} audio files".format(tagsRemovedCount))
+
+    def _getDateAllPlaysPlaybacks(self, audioFilepath: str) -> List[Playback]:
+        dateAllPlays = mlu.tags.io.AudioFileMetadataHandler(audioFilepath).getDateAllPlays()
+        return [
+            Playback(audioFilepath, mypycommons.time.getDateTimeFromFormattedTime(playDateTimeFmt), None)
+            for playDateTimeFmt in mlu.tags.common.formatAudioTagToValuesList(dateAllPlays)
+        ]
+
+    def _removeDateAllPlays(self, audioFilepath: str) -> TagWriteMode:
+        handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath, tagPaddingReserve=self._settings.userConfig.tagWriteConfig.paddingReserve)
+        return handler.removeDateAllPlays()
+
+    def _updatePlaystatTagsForAudioFilePlaybackLists(
+        self,
+        audioFilePlaybackLists: List[AudioFilePlaybackList],
+        tagWriteJournal: PlaystatTagWriteJournal,
+        playHistory: PlayHistoryDatabase,
+        writeWorkers: int
+    ) -> Dict[str, int]:
+        '''
+        Updates the playstat tags of the audio files of the given playback lists, in batches, on a
+        thread pool (with more than 1 worker). For each batch:
+
+        - the current tags of the files are read, and their new values are recorded to the tag
+          write journal as pending, before any file is written
+        - the files are written, then the playbacks of those that were written are added to the
+          play history database, and the files are recorded to the journal as written
+
+        If the update is interrupted, the files of a batch that are pending but not written may
+        already have their new values: on resume, those files are set to the recorded values
+        instead of having their playbacks added again. If a file fails, the other files of its
+        batch are still written and recorded before the error is raised.
+
+        Returns the number of files written with each TagWriteMode.
+        '''
+        tagWriteModeCounts = {}
+        pendingTagValues = tagWriteJournal.getPendingTagValues()
+
+        with ThreadPoolExecutor(max_workers=max(writeWorkers, 1)) as executor:
+            for batchStart in range(0, len(audioFilePlaybackLists), self._TAG_WRITE_BATCH_SIZE):
+                batchPlaybackLists = audioFilePlaybackLists[batchStart:batchStart + self._TAG_WRITE_BATCH_SIZE]
+                tagReads = [
+                    executor.submit(self._getUpdatedPlaystatTags, playbackList, pendingTagValues.get(playbackList.audioFilepath))
+                    for playbackList in batchPlaybackLists
+                ]
+                (batchPlaystatTags, readPlaybackLists, error) = self._getTagWriteResults(batchPlaybackLists, tagReads, "Failed to read playstat tags for audio file")
+
+                tagWriteJournal.addPending({playstatTags.audioFilepath: playstatTags.getTagValues() for playstatTags in batchPlaystatTags})
+
+                tagWrites = [executor.submit(playstatTags.saveTags) for playstatTags in batchPlaystatTags]
+                (tagWriteModes, writtenPlaybackLists, writeError) = self._getTagWriteResults(readPlaybackLists, tagWrites, "Failed to set playstat tags for audio file")
+                error = error or writeError
+
+                for (tagWriteMode, playbackList) in zip(tagWriteModes, writtenPlaybackLists):
+                    tagWriteModeCounts[tagWriteMode] = tagWriteModeCounts.get(tagWriteMode, 0) + 1
+                    if (tagWriteMode == TagWriteMode.FULL_REWRITE):
+                        self._logger.info("Playstat tags did not fit in the existing tag padding, the audio file was rewritten: {}".format(playbackList.audioFilepath))
+
+                # The database connection is only used from this thread. Adding the same playbacks
+                # again (the batch is written again after a crash) does not add plays.
+                playHistory.addPlaybacks(self._convertAudioFilePlaybackListsToPlaybacks(writtenPlaybackLists))
+                tagWriteJournal.addBatch([playbackList.audioFilepath for playbackList in writtenPlaybackLists])
+                if (error is not None):
+                    raise error
+
+        return tagWriteModeCounts
+
+    def _getTagWriteResults(self, playbackLists: List[AudioFilePlaybackList], futures: list, errorMessage: str):
+        '''
+        Waits for the given futures (one per playback list). Returns the results and the playback
+        lists of those that succeeded, and the first error raised (None if there was none), after
+        logging each failure with the given message.
+        '''
+        results = []
+        succeededPlaybackLists = []
+        firstError = None
+
+        for (playbackList, future) in zip(playbackLists, futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                self._logger.error("{}: {}".format(errorMessage, playbackList.audioFilepath))
+                firstError = firstError or error
+            else:
+                succeededPlaybackLists.append(playbackList)
+
+        return (results, succeededPlaybackLists, firstError)
+
+    def _getUpdatedPlaystatTags(self, audioFilePlaybackList: AudioFilePlaybackList, pendingTagValues: Optional[dict]) -> PlaystatTags:
+        '''
+        Alter PLAY_COUNT, DATE_LAST_PLAYED (all the plays are kept in the play history database).
+        Returns the PlaystatTags of the file with the new values set, to be saved.
+
+        If pendingTagValues is given (the values recorded for the file before an interrupted
+        update), the tags are set to these values instead, as the file may already have them.
+        '''
+        playstatTags = PlaystatTags(audioFilePlaybackList.audioFilepath, self._settings.userConfig.tagWriteConfig.paddingReserve)
+
+        if (pendingTagValues is not None):
+            playstatTags.setTagValues(pendingTagValues)
+            self._logger.info("Setting playstat tags for audio file to the values recorded before the update was interrupted: {}, PlayCount={}, DateLastPlayed={}".format(
+                audioFilePlaybackList.audioFilepath,
+                pendingTagValues['playCount'],
+                pendingTagValues['dateLastPlayed']
+            ))
+            return playstatTags
 
         # Set new values
         newPlayCount = playstatTags.playCount + audioFilePlaybackList.getPlaybacksTotal()
@@ -161,14 +527,6 @@ class PlaystatTagUpdaterForMpd:
             # If the current date last played is before our latest one from MPD, set our latest
             if (dateLastPlayedMpd > playstatTags.dateLastPlayed):
                 playstatTags.dateLastPlayed = dateLastPlayedMpd
-            
-        # All plays
-        newDateAllPlaysList = playstatTags.dateAllPlays
-        for playbackDateTime in audioFilePlaybackList.getPlaybacksDateTimes():
-            newDateAllPlaysList.append(playbackDateTime)
-
-        newDateAllPlaysList.sort()
-        playstatTags.dateAllPlays = newDateAllPlaysList
 
         self._logger.info("Setting playstat tags for audio file, values: {}, PlayCountAdded={}, NewPlayCount={}, NewDateLastPlayed={}".format(
             audioFilePlaybackList.audioFilepath,
@@ -177,47 +535,44 @@ class PlaystatTagUpdaterForMpd:
             mypycommons.time.formatDatetimeForDisplay(playstatTags.dateLastPlayed)
         ))
 
-        playstatTags.saveTags()
+        return playstatTags
 
     def _saveHistorySummaryOutputFile(self, playbackLists: List[AudioFilePlaybackList], outputDir) -> None:
         # History file: ordered by playback time
         # title, artist, album, playback time, duration played
-
-        playbacks = self._convertAudioFilePlaybackListsToPlaybacks(playbackLists)
-        playbacks.sort(key=lambda x: x.dateTime)
-
-        outputFilename = 'summary-playback-history.txt'
+        reportFormat = self._settings.userConfig.reportFormat
+        outputFilename = mlu.report.getReportFilename('summary-playback-history', reportFormat)
         outputFilepath = mypycommons.file.joinPaths(outputDir, outputFilename)
         self._logger.info("Saving playback history summary file: {}".format(outputFilepath))
 
-        table = PrettyTable()
-        table.field_names = ["Track Title", "Artist", "Album", "Date Played", "Playback Duration"]
-        table.align["Track Title"] = "l"
-        table.align["Artist"] = "l"
-        table.align["Album"] = "l"
-        table.align["Date Played"] = "r"
-        table.align["Playback Duration"] = "r"
-        table._max_width = {
-            "Track Title" : 120,
-            "Artist": 120,
-            "Album": 120
-        }
+        columns = [
+            ReportColumn("Track Title", 'l', 120),
+            ReportColumn("Artist", 'l', 120),
+            ReportColumn("Album", 'l', 120),
+            ReportColumn("Date Played", 'r'),
+            ReportColumn("Playback Duration", 'r')
+        ]
+        self._loadAudioFilesBasicTags([playbackList.audioFilepath for playbackList in playbackLists])
+
+        mlu.report.writeReport(outputFilepath, columns, self._getHistorySummaryRows(playbackLists), reportFormat)
+
+    def _getHistorySummaryRows(self, playbackLists: List[AudioFilePlaybackList]):
+        # The playbacks of each list are sorted by time: merge them in time order
+        playbacks = heapq.merge(*[playbackList.playbacks for playbackList in playbackLists], key=lambda x: x.dateTime)
 
         for playback in playbacks:
-            basicTags = self._getAudioFileBasicTags(playback.audioFilepath)
-            table.add_row([
+            basicTags = self._audioFilesBasicTags[playback.audioFilepath]
+            yield [
                 basicTags['title'],
                 basicTags['artist'],
-                basicTags['album'], 
+                basicTags['album'],
                 mypycommons.time.formatDatetimeForDisplay(playback.dateTime),
                 self._getPlaybackDurationFmt(playback.audioFilepath, playback.duration)
-            ])
-
-        mypycommons.file.writeToFile(outputFilepath, table.get_string())
+            ]
 
     def _getPlaybackDurationFmt(self, audioFilepath: str, playbackDuration: timedelta):
         if (playbackDuration is not None):
-            totalDuration = mlu.tags.playstats.common.getAudioFileDuration(audioFilepath)
+            totalDuration = mlu.tags.playstats.common.getAudioFileDuration(audioFilepath, self._audioPropertiesCache)
             percentOfAudioPlayed = (playbackDuration.total_seconds() / totalDuration.total_seconds()) * 100
             percentFmt = "{:0.0f}".format(percentOfAudioPlayed)
 
@@ -235,48 +590,49 @@ class PlaystatTagUpdaterForMpd:
         # Sort audio files by play count
         playbackLists.sort(key=lambda x: x.getPlaybacksTotal(), reverse=True)
 
-        outputFilename = 'summary-playback-totals.txt'
+        reportFormat = self._settings.userConfig.reportFormat
+        outputFilename = mlu.report.getReportFilename('summary-playback-totals', reportFormat)
         outputFilepath = mypycommons.file.joinPaths(outputDir, outputFilename)
         self._logger.info("Saving playback totals summary file: {}".format(outputFilepath))
 
-        table = PrettyTable()
-        table.field_names = ["Track Title", "Artist", "Album", "Play Count", "Dates Played"]
-        table.align["Track Title"] = "l"
-        table.align["Artist"] = "l"
-        table.align["Album"] = "l"
-        table.align["Play Count"] = "r"
-        table.align["Dates Played"] = "l"
-        table._max_width = {
-            "Track Title" : 120,
-            "Artist": 120,
-            "Album": 120
-        }
+        columns = [
+            ReportColumn("Track Title", 'l', 120),
+            ReportColumn("Artist", 'l', 120),
+            ReportColumn("Album", 'l', 120),
+            ReportColumn("Play Count", 'r'),
+            ReportColumn("Dates Played", 'l')
+        ]
+        self._loadAudioFilesBasicTags([playbackList.audioFilepath for playbackList in playbackLists])
+
+        mlu.report.writeReport(outputFilepath, columns, self._getTotalsSummaryRows(playbackLists), reportFormat)
 
+    def _getTotalsSummaryRows(self, playbackLists: List[AudioFilePlaybackList]):
         for audioFilePlaybackList in playbackLists:
-            basicTags = self._getAudioFileBasicTags(audioFilePlaybackList.audioFilepath)
+            basicTags = self._audioFilesBasicTags[audioFilePlaybackList.audioFilepath]
             playbackDateTimes = audioFilePlaybackList.getPlaybacksDateTimes()
             playbackDatesFmt = [mypycommons.time.formatDatetimeForDisplay(x) for x in playbackDateTimes]
 
-            table.add_row([
+            yield [
                 basicTags['title'],
                 basicTags['artist'],
-                basicTags['album'], 
+                basicTags['album'],
                 audioFilePlaybackList.getPlaybacksTotal(),
                 ", ".join(playbackDatesFmt)
-            ])
-
-        mypycommons.file.writeToFile(outputFilepath, table.get_string())
+            ]
 
-    def _filterPlaybacks(self) -> Tuple[List[Playback], List[Playback]]:
+    def _filterPlaybacks(self) -> Tuple[Dict[str, List[Playback]], Dict[str, List[Playback]]]:
         '''
-        Remove any playbacks in which less than 20% of the song was played.
+        Remove any playbacks in which less than 20% of the song was played. Returns the included and
+        the excluded playbacks, grouped by audio file.
         '''
-        filteredPlaybacks = []
-        excludedPlaybacks = []
+        filteredPlaybacksByAudioFile = {}
+        excludedPlaybacksByAudioFile = {}
 
         for audioFile in self._uniqueAudioFiles:
-            thisFileDuration = mlu.tags.playstats.common.getAudioFileDuration(audioFile)
-            thisFilePlaybacks = self._getPlaybacksForAudioFile(self._playbacks, audioFile)
+            thisFileDuration = mlu.tags.playstats.common.getAudioFileDuration(audioFile, self._audioPropertiesCache)
+            thisFilePlaybacks = self._playbacksByAudioFile[audioFile]
+            filteredPlaybacks = filteredPlaybacksByAudioFile.setdefault(audioFile, [])
+            excludedPlaybacks = excludedPlaybacksByAudioFile.setdefault(audioFile, [])
 
             for playback in thisFilePlaybacks:
                 if (playback.duration is None):
@@ -297,25 +653,53 @@ class PlaystatTagUpdaterForMpd:
                     else:
                         excludedPlaybacks.append(playback)
 
-        return (filteredPlaybacks, excludedPlaybacks)
+        return (filteredPlaybacksByAudioFile, excludedPlaybacksByAudioFile)
 
-    def _getAudioFileBasicTags(self, audioFilepath: str) -> dict:
-        handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath)
-        tags = handler.getTags()
+    def _loadAudioFilesBasicTags(self, audioFilepaths: List[str]) -> None:
+        '''
+        Gets the basic tags of the given audio files that were not gotten yet in this run: from the
+        library tag index, for the files whose index entry is up to date (same stat signature),
+        otherwise read from the file. A file whose tags can't be read gets empty basic tags, so that
+        it is still listed in the summaries.
+        '''
+        audioFilepathsToLoad = [audioFilepath for audioFilepath in audioFilepaths if (audioFilepath not in self._audioFilesBasicTags)]
+        if (not audioFilepathsToLoad):
+            return
 
+        tagIndexFilepath = self._settings.userConfig.tagIndexFilepath
+        if (tagIndexFilepath and mypycommons.file.pathExists(tagIndexFilepath)):
+            with LibraryTagIndex(tagIndexFilepath) as tagIndex:
+                for audioFilepath in audioFilepathsToLoad:
+                    entry = tagIndex.getEntry(audioFilepath)
+                    if (entry is not None and os.path.isfile(audioFilepath) and entry.stat == mlu.library.audiolib.getAudioFileStatSignature(audioFilepath)):
+                        self._audioFilesBasicTags[audioFilepath] = self._getBasicTagsFromTags(entry.tags)
+
+        for audioFilepath in audioFilepathsToLoad:
+            if (audioFilepath not in self._audioFilesBasicTags):
+                try:
+                    handler = mlu.tags.io.AudioFileMetadataHandler(audioFilepath)
+                    basicTags = self._getBasicTagsFromTags(handler.getTags())
+                except Exception:
+                    self._logger.exception("Failed to read tags of audio file for the summaries, listing it without tags: File='{}'".format(audioFilepath))
+                    basicTags = { 'title': '', 'artist': '', 'album': '' }
+
+                self._audioFilesBasicTags[audioFilepath] = basicTags
+
+    def _getBasicTagsFromTags(self, tags) -> dict:
         return {
             'title': tags.title,
             'artist': tags.artist,
             'album': tags.album
         }
 
-    def _convertPlaybacksToAudioFilePlaybackLists(self, playbacks: List[Playback]) -> List[AudioFilePlaybackList]:
+    def _convertPlaybacksToAudioFilePlaybackLists(self, playbacksByAudioFile: Dict[str, List[Playback]]) -> List[AudioFilePlaybackList]:
         '''
+        Returns an AudioFilePlaybackList for each audio file that has playbacks, ordered by filepath.
         '''
         audioFilePlaybackLists = []
 
         for audioFile in self._uniqueAudioFiles:
-            thisFilePlaybacks = self._getPlaybacksForAudioFile(playbacks, audioFile)
+            thisFilePlaybacks = playbacksByAudioFile.get(audioFile)
             if (thisFilePlaybacks):
                 audioFilePlaybackLists.append(AudioFilePlaybackList(thisFilePlaybacks))
 
@@ -332,11 +716,6 @@ class PlaystatTagUpdaterForMpd:
 
         return allPlaybacks
 
-    def _getPlaybacksForAudioFile(self, allPlaybacks: List[Playback], audioFilepath: str) -> List[Playback]:
-        ''' 
-        '''        
-        return [playback for playback in allPlaybacks if (playback.audioFilepath == audioFilepath)]
-
     def _getDefaultOutputFilesDir(self) -> str:
         ''' 
         '''
@@ -348,6 +727,15 @@ class PlaystatTagUpdaterForMpd:
 
         return scriptCacheDir
 
+    def _getCheckpointFilepath(self) -> str:
+        '''
+        Returns the filepath of the checkpoint of the last saved incremental MPD log ingestion.
+        '''
+        if (self._settings.userConfig.mpdConfig.outputDir):
+            return mypycommons.file.joinPaths(self._settings.userConfig.mpdConfig.outputDir, self._CHECKPOINT_FILENAME)
+        else:
+            return mypycommons.file.joinPaths(self._getDefaultOutputFilesDir(), self._CHECKPOINT_FILENAME)
+
     def _getOutputFilesDir(self) -> str:
         
         dirName = '[{}] playback-data-output'.format(mypycommons.time.getCurrentTimestampForFilename())
@@ -364,6 +752,9 @@ class PlaystatTagUpdaterForMpd:
 
     def _savePlaybacksOutputFile(self, audioFilePlaybackLists: List[AudioFilePlaybackList], outputDir: str, outputFilename: str) -> None:
         ''' 
+        Writes the playbacks to the given JSON data file (for review and editing), then to its
+        playback store file, which is loaded instead of the JSON while the JSON is unchanged (the
+        store holds the JSON's size, modified time and hash).
         '''
         outputFilepath = mypycommons.file.joinPaths(outputDir, outputFilename)
         self._logger.info("Writing playbacks data output file: {}".format(outputFilename))
@@ -374,10 +765,35 @@ class PlaystatTagUpdaterForMpd:
 
         mypycommons.file.writeJsonFile(outputFilepath, dictList)
 
+        store = PlaybackStore()
+        for playbackList in audioFilePlaybackLists:
+            for playback in playbackList.playbacks:
+                store.add(playback)
+        store.sourceFileSignature = mlu.tags.playstats.store.getSourceFileSignature(outputFilepath)
+        store.save(self._getPlaybacksStoreFilepath(outputFilepath))
+
     def _loadPlaybacksOutputFile(self, outputDir: str, outputFilename: str) -> List[AudioFilePlaybackList]:
         ''' 
+        Loads the playbacks of the given JSON data file. They are loaded from its playback store
+        file when the store was made from the JSON as it is now (same size, modified time and
+        hash): if the JSON was edited since it was written, or the store is missing or invalid, the
+        JSON is parsed.
         '''
         outputFilepath = mypycommons.file.joinPaths(outputDir, outputFilename)
+        storeFilepath = self._getPlaybacksStoreFilepath(outputFilepath)
+
+        store = None
+        if (mypycommons.file.pathExists(storeFilepath)):
+            try:
+                store = PlaybackStore.load(storeFilepath)
+            except PlaybackStoreFormatError:
+                self._logger.exception("Failed to load playback store file, loading the JSON data file instead: {}".format(storeFilepath))
+
+        if (store is not None and store.isSavedFrom(outputFilepath)):
+            playbacksByAudioFile = mlu.tags.playstats.common.groupPlaybacksByAudioFile(store.iteratePlaybacks())
+            return [AudioFilePlaybackList(playbacks) for playbacks in playbacksByAudioFile.values()]
+        elif (store is not None):
+            self._logger.info("JSON data file changed since its playback store file was written, loading the JSON: {}".format(outputFilename))
 
         json = mypycommons.file.readJsonFile(outputFilepath)
         audioFilePlaybackLists = []
@@ -397,3 +813,6 @@ class PlaystatTagUpdaterForMpd:
             audioFilePlaybackLists.append(AudioFilePlaybackList(playbacks))
 
         return audioFilePlaybackLists
+
+    def _getPlaybacksStoreFilepath(self, outputFilepath: str) -> str:
+        return os.path.splitext(outputFilepath)[0] + '.store'
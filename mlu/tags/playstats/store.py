@@ -0,0 +1,203 @@
+'''
+mlu.tags.playstats.store
+
+Module containing the playback store: a compact, columnar container of playbacks, with a binary
+file format that is loaded back with a few bulk array copies instead of parsing JSON.
+'''
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+from mlu.tags.playstats.common import Playback
+
+_EPOCH_DATETIME = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Duration value of the playbacks of unknown duration
+_UNKNOWN_DURATION = -1
+
+class PlaybackStoreFormatError(Exception):
+    '''
+    Raised when a file is not a valid playback store file.
+    '''
+    def __init__(self, message):
+        super().__init__(message)
+
+class PlaybackStore:
+    '''
+    Columnar store of playbacks. Audio filepaths are interned: each distinct filepath is stored
+    once, and each playback refers to it by its path id.
+
+    Columns (one value per playback):
+        pathIds: path id of the audio file played (index in audioFilepaths)
+        startEpochMicros: playback start time, as microseconds since 1970-01-01 (naive, like the
+            playback datetimes)
+        durationMicros: playback duration in microseconds (-1 if unknown)
+
+    The store can also hold the signature of the file it was made from (sourceFileSignature, see
+    getSourceFileSignature), so that it is only used in place of that file while the file is
+    unchanged (isSavedFrom).
+
+    File format (little-endian), written by save and read by load:
+        magic (8 bytes), path count, playback count and paths size (unsigned 64-bit ints), source
+        file size (unsigned 64-bit int), modified time (signed 64-bit int, nanoseconds) and SHA-1
+        hash (20 bytes, all zero if there is no source file), the NUL-separated UTF-8 audio
+        filepaths, padding to a multiple of 8 bytes, then the startEpochMicros, durationMicros
+        (signed 64-bit ints) and pathIds (unsigned 32-bit ints) columns
+    '''
+    _MAGIC = b'MLUPBS\x00\x02'
+    _HEADER_STRUCT = struct.Struct('<8sQQQQq20s')
+    _NO_SOURCE_HASH = bytes(20)
+
+    def __init__(self):
+        self.audioFilepaths = []
+        self.pathIds = array('I')
+        self.startEpochMicros = array('q')
+        self.durationMicros = array('q')
+        self.sourceFileSignature = None
+        self._pathIdsByFilepath = {}
+
+    @classmethod
+    def fromPlaybacks(cls, playbacks: Iterable[Playback]):
+        store = cls()
+        for playback in playbacks:
+            store.add(playback)
+
+        return store
+
+    @classmethod
+    def load(cls, storeFilepath: str):
+        '''
+        Loads the store saved in the given file. The file is memory-mapped, and each column is
+        copied from it in a single operation.
+        '''
+        store = cls()
+
+        with open(storeFilepath, mode='rb') as storeFile:
+            if (os.fstat(storeFile.fileno()).st_size < cls._HEADER_STRUCT.size):
+                raise PlaybackStoreFormatError("Not a playback store file (too short): {}".format(storeFilepath))
+
+            with mmap.mmap(storeFile.fileno(), 0, access=mmap.ACCESS_READ) as storeData:
+                (magic, pathCount, playbackCount, pathsSize, sourceSize, sourceMtimeNs, sourceHash) = cls._HEADER_STRUCT.unpack_from(storeData, 0)
+                if (magic != cls._MAGIC):
+                    raise PlaybackStoreFormatError("Not a playback store file (unknown format): {}".format(storeFilepath))
+
+                if (sourceHash != cls._NO_SOURCE_HASH):
+                    store.sourceFileSignature = (sourceSize, sourceMtimeNs, sourceHash)
+
+                pathsOffset = cls._HEADER_STRUCT.size
+                offset = _getAlignedOffset(pathsOffset + pathsSize)
+                columns = (store.startEpochMicros, store.durationMicros, store.pathIds)
+
+                if (offset + sum(playbackCount * column.itemsize for column in columns) > len(storeData)):
+                    raise PlaybackStoreFormatError("Playback store file is truncated: {}".format(storeFilepath))
+
+                if (pathCount):
+                    store.audioFilepaths = storeData[pathsOffset:pathsOffset + pathsSize].decode('utf-8').split('\0')
+                store._pathIdsByFilepath = {filepath: pathId for (pathId, filepath) in enumerate(store.audioFilepaths)}
+
+                if (len(store.audioFilepaths) != pathCount):
+                    raise PlaybackStoreFormatError("Playback store file is corrupt: {}".format(storeFilepath))
+
+                for column in columns:
+                    columnSize = playbackCount * column.itemsize
+                    column.frombytes(storeData[offset:offset + columnSize])
+                    offset += columnSize
+
+        if (sys.byteorder != 'little'):
+            for column in (store.startEpochMicros, store.durationMicros, store.pathIds):
+                column.byteswap()
+
+        return store
+
+    def save(self, storeFilepath: str) -> None:
+        pathsData = '\0'.join(self.audioFilepaths).encode('utf-8')
+        (sourceSize, sourceMtimeNs, sourceHash) = self.sourceFileSignature if (self.sourceFileSignature) else (0, 0, self._NO_SOURCE_HASH)
+        header = self._HEADER_STRUCT.pack(self._MAGIC, len(self.audioFilepaths), self.getPlaybackCount(), len(pathsData), sourceSize, sourceMtimeNs, sourceHash)
+        paddingSize = _getAlignedOffset(len(header) + len(pathsData)) - (len(header) + len(pathsData))
+
+        columns = [self.startEpochMicros, self.durationMicros, self.pathIds]
+        if (sys.byteorder != 'little'):
+            columns = [array(column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+
+        with open(storeFilepath, mode='wb') as storeFile:
+            storeFile.write(header)
+            storeFile.write(pathsData)
+            storeFile.write(bytes(paddingSize))
+            for column in columns:
+                column.tofile(storeFile)
+
+    def add(self, playback: Playback) -> None:
+        pathId = self._pathIdsByFilepath.get(playback.audioFilepath)
+        if (pathId is None):
+            pathId = len(self.audioFilepaths)
+            self.audioFilepaths.append(playback.audioFilepath)
+            self._pathIdsByFilepath[playback.audioFilepath] = pathId
+
+        self.pathIds.append(pathId)
+        self.startEpochMicros.append((playback.dateTime - _EPOCH_DATETIME) // _ONE_MICROSECOND)
+        self.durationMicros.append((playback.duration // _ONE_MICROSECOND) if (playback.duration is not None) else _UNKNOWN_DURATION)
+
+    def getPlaybackCount(self) -> int:
+        return len(self.pathIds)
+
+    def getPlayback(self, index: int) -> Playback:
+        durationMicros = self.durationMicros[index]
+
+        return Playback(
+            self.audioFilepaths[self.pathIds[index]],
+            _EPOCH_DATETIME + timedelta(microseconds=self.startEpochMicros[index]),
+            timedelta(microseconds=durationMicros) if (durationMicros != _UNKNOWN_DURATION) else None
+        )
+
+    def iteratePlaybacks(self) -> Iterator[Playback]:
+        '''
+        Yields the playbacks of the store, in the order they were added, creating the Playback
+        objects one at a time.
+        '''
+        for index in range(self.getPlaybackCount()):
+            yield self.getPlayback(index)
+
+    def getPlaybacks(self) -> List[Playback]:
+        return list(self.iteratePlaybacks())
+
+    def isSavedFrom(self, sourceFilepath: str) -> bool:
+        '''
+        Returns whether the store was made from the given file as it is now: its size, modified
+        time and hash must all be the same as in the store's source file signature. The file is
+        only hashed if its size and modified time match.
+        '''
+        if (self.sourceFileSignature is None or not os.path.isfile(sourceFilepath)):
+            return False
+
+        (sourceSize, sourceMtimeNs, sourceHash) = self.sourceFileSignature
+        fileStat = os.stat(sourceFilepath)
+        if (fileStat.st_size != sourceSize or fileStat.st_mtime_ns != sourceMtimeNs):
+            return False
+
+        return (getSourceFileSignature(sourceFilepath) == self.sourceFileSignature)
+
+def getSourceFileSignature(sourceFilepath: str) -> Tuple[int, int, bytes]:
+    '''
+    Returns the signature of the given file, to be set as the sourceFileSignature of a store made
+    from it: its size, modified time (nanoseconds) and SHA-1 hash.
+    '''
+    fileStat = os.stat(sourceFilepath)
+    sourceHash = hashlib.sha1()
+
+    with open(sourceFilepath, mode='rb') as sourceFile:
+        for block in iter(lambda: sourceFile.read(1024 * 1024), b''):
+            sourceHash.update(block)
+
+    return (fileStat.st_size, fileStat.st_mtime_ns, sourceHash.digest())
+
+def _getAlignedOffset(offset: int) -> int:
+    return (offset + 7) // 8 * 8
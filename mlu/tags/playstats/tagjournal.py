@@ -0,0 +1,99 @@
+'''
+mlu.tags.playstats.tagjournal
+
+Module containing the playstat tag write journal, which records the new playstat tag values of
+the audio files updated from a data dir before they are written, and the files once written, so
+that an interrupted update can be resumed without counting the same playbacks twice.
+'''
+
+import json
+import os
+from typing import Dict, List, Set
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+class PlaystatTagWriteJournal:
+    '''
+    Journal file of a playstat tags update, kept in the data dir the tags are updated from. For
+    each batch of audio files, the new tag values of the files are appended (and synced to disk) as
+    one JSON line before the files are written (pending), then the files written as another line.
+    A last line marks the update as complete.
+
+    A line that was only partly written (the update was killed while writing it) is dropped when
+    the journal is opened: the files of that batch are written again on resume.
+    '''
+    def __init__(self, journalFilepath: str):
+        if (not journalFilepath):
+            raise ValueError("journalFilepath not passed")
+
+        self.journalFilepath = journalFilepath
+        self._writtenAudioFilepaths = set()
+        self._pendingTagValues = {}
+        self._complete = False
+
+        if (mypycommons.file.pathExists(self.journalFilepath)):
+            self._load()
+
+    def getWrittenAudioFilepaths(self) -> Set[str]:
+        return set(self._writtenAudioFilepaths)
+
+    def getPendingTagValues(self) -> Dict[str, dict]:
+        '''
+        Returns the tag values recorded for the audio files that are pending but were not recorded
+        as written: these files may or may not have been written before the update was interrupted.
+        '''
+        return {
+            audioFilepath: tagValues for (audioFilepath, tagValues) in self._pendingTagValues.items()
+            if (audioFilepath not in self._writtenAudioFilepaths)
+        }
+
+    def isComplete(self) -> bool:
+        return self._complete
+
+    def addPending(self, tagValuesByAudioFilepath: Dict[str, dict]) -> None:
+        '''
+        Records the new playstat tag values of the given audio files, before they are written.
+        '''
+        if (not tagValuesByAudioFilepath):
+            return
+
+        self._appendEntry({'pending': tagValuesByAudioFilepath})
+        self._pendingTagValues.update(tagValuesByAudioFilepath)
+
+    def addBatch(self, audioFilepaths: List[str]) -> None:
+        '''
+        Records that the playstat tags of the given audio files were written.
+        '''
+        if (not audioFilepaths):
+            return
+
+        self._appendEntry({'audioFilepaths': audioFilepaths})
+        self._writtenAudioFilepaths.update(audioFilepaths)
+
+    def markComplete(self) -> None:
+        self._appendEntry({'complete': True})
+        self._complete = True
+
+    def _appendEntry(self, entry: dict) -> None:
+        with open(self.journalFilepath, mode='a', encoding='utf-8') as journalFile:
+            journalFile.write(json.dumps(entry) + '\n')
+            journalFile.flush()
+            os.fsync(journalFile.fileno())
+
+    def _load(self) -> None:
+        completeLinesSize = 0
+
+        with open(self.journalFilepath, mode='rb') as journalFile:
+            for line in journalFile:
+                if (not line.endswith(b'\n')):
+                    break
+
+                entry = json.loads(line.decode('utf-8'))
+                self._pendingTagValues.update(entry.get('pending', {}))
+                self._writtenAudioFilepaths.update(entry.get('audioFilepaths', []))
+                self._complete = self._complete or entry.get('complete', False)
+                completeLinesSize += len(line)
+
+        if (completeLinesSize < os.path.getsize(self.journalFilepath)):
+            os.truncate(self.journalFilepath, completeLinesSize)
@@ -2,7 +2,6 @@
 Module that handles ratestat tags (votes, rating) updates.
 ''' 
 
-from prettytable import PrettyTable
 from typing import List
 
 from com.nwrobel import mypycommons
@@ -14,6 +13,8 @@ import com.nwrobel.mypycommons.time
 import mlu.tags.io
 import mlu.tags.common
 import mlu.library.playlist
+import mlu.report
+from mlu.report import ReportColumn
 from mlu.settings import MLUSettings
 
 class AudioFileVoteData:
@@ -131,15 +132,16 @@ class RatestatTagsUpdater:
         Updates the ratestat tags for an audio file, given an AudioFileVoteData object containing the
         new votes to be added.
         '''
-        tagHandler = mlu.tags.io.AudioFileMetadataHandler(audioFileVoteData.filepath)
-        currentTags = tagHandler.getTags()
+        tagPaddingReserve = self.settings.userConfig.tagWriteConfig.paddingReserve
+        with mlu.tags.io.AudioFileMetadataHandler(audioFileVoteData.filepath, tagPaddingReserve=tagPaddingReserve) as tagHandler:
+            currentTags = tagHandler.getTags()
 
-        newTags = currentTags
-        newTags.rating = self._getRatingTagValue(audioFileVoteData.votes)
+            newTags = currentTags
+            newTags.rating = self._getRatingTagValue(audioFileVoteData.votes)
 
-        tagHandler.setTags(newTags)
+            tagWriteMode = tagHandler.setTags(newTags)
 
-        self.logger.info("Updated ratestat tags to the following values: File={}, NewRating={}".format(audioFileVoteData.filepath, newTags.rating))
+        self.logger.info("Updated ratestat tags to the following values: File={}, NewRating={}, WriteMode={}".format(audioFileVoteData.filepath, newTags.rating, tagWriteMode))
 
     def _getRatingTagValue(self, votes: List[float]) -> str:
         if (votes):
@@ -153,36 +155,38 @@ class RatestatTagsUpdater:
 
     def _writeSummaryFile(self, audioFileVoteDataList: List[AudioFileVoteData]):
         '''
-        Writes out a log file containing a table in pretty format with the ratestat tags updates.
+        Writes out a log file containing a table (in the configured report format) with the
+        ratestat tags updates.
         '''
-        tagUpdatesTable = PrettyTable()
-        tagUpdatesTable.field_names = ["Title", "Artist", "Votes Added", "New Rating"]
-        tagUpdatesTable.align["Title"] = "l"
-        tagUpdatesTable.align["Artist"] = "l"
-        tagUpdatesTable.align["Votes Added"] = "r"
-        tagUpdatesTable.align["New Rating"] = "r"
-
+        columns = [
+            ReportColumn("Title", 'l'),
+            ReportColumn("Artist", 'l'),
+            ReportColumn("Votes Added", 'r'),
+            ReportColumn("New Rating", 'r')
+        ]
+        mlu.report.writeReport(self.summaryFilepath, columns, self._getSummaryRows(audioFileVoteDataList), self.settings.userConfig.reportFormat)
+
+    def _getSummaryRows(self, audioFileVoteDataList: List[AudioFileVoteData]):
         for audioFileVotesData in audioFileVoteDataList:
             tagHandler = mlu.tags.io.AudioFileMetadataHandler(audioFileVotesData.filepath)
             currentTags = tagHandler.getTags()
 
             votesAdded = mlu.tags.common.formatValuesListToAudioTag(audioFileVotesData.votes)
 
-            tagUpdatesTable.add_row([
-                currentTags.title, 
-                currentTags.artist, 
+            yield [
+                currentTags.title,
+                currentTags.artist,
                 votesAdded,
                 currentTags.rating
-            ])
-
-        mypycommons.file.writeToFile(filepath=self.summaryFilepath, content=tagUpdatesTable.get_string())
+            ]
 
     def _getSummaryFilepath(self) -> str:
         '''
         Returns the filepath for the ratestat tags updates summary log file
         '''
-        backupFilename = "[{}] RatestatTagsUpdater_tag-updates-summary.txt".format(
-            mypycommons.time.getCurrentTimestampForFilename()
+        backupFilename = mlu.report.getReportFilename(
+            "[{}] RatestatTagsUpdater_tag-updates-summary".format(mypycommons.time.getCurrentTimestampForFilename()),
+            self.settings.userConfig.reportFormat
         )
         filepath = mypycommons.file.joinPaths(self.settings.userConfig.logDir, backupFilename)
         return filepath
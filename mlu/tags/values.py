@@ -67,6 +67,18 @@ class AudioFileTags:
 
         return tagsAreEqual
 
+class TagWriteMode:
+    '''
+    Values describing how a tags write operation was done on an audio file.
+
+    SKIPPED: the tags did not change, so the file was not written
+    IN_PLACE: the new tags fit in the existing tag padding, only the tag data was overwritten
+    FULL_REWRITE: the new tags did not fit, the audio data following the tags had to be moved
+    '''
+    SKIPPED = 'skipped'
+    IN_PLACE = 'in-place'
+    FULL_REWRITE = 'full-rewrite'
+
 class AudioFileProperties:
     '''
     Data structure holding the values for a single audio file of all the file properties supported 
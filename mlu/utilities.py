@@ -1,7 +1,12 @@
+import os
+import stat
 import traceback
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
 
-from mlu.tags.io import AudioFileMetadataHandler, AudioFileFormatNotSupportedError, AudioFileNonExistentError
+import mlu.library.audiolib
+from mlu.tags.io import AudioFileMetadataHandler, AudioFileFormatNotSupportedError, AudioFileNonExistentError, SUPPORTED_AUDIO_TYPES
+from mlu.tags.cache import AudioFileValidationCache
 
 class AudioFileError:
     ''' 
@@ -13,26 +18,92 @@ class AudioFileError:
         self.audioFilepath = audioFilepath
         self.exceptionMessage = exceptionMessage
 
-def testAudioFilesForErrors(audioFilepaths: List[str]):
-    ''' 
+def testAudioFilesForErrors(audioFilepaths: List[str], validationCache: Optional[AudioFileValidationCache] = None, workers: int = 1):
+    '''
+    Checks that the given audio files exist, are of a supported format and that their tags and
+    properties can be read. Returns the list of AudioFileError for the files that failed.
+
+    Without a validation cache, every file is fully parsed. With one, the existence and format of
+    each file are checked from a single stat and its extension, and only the files that are new or
+    changed since they last passed the check are parsed (and added to the cache, which the caller
+    saves).
+
+    Params:
+        validationCache: cache of the files that passed the check, or None
+        workers: number of threads parsing the files
     '''
     audioFileErrorList = []
+    audioFilepathsToParse = []
+    statSignatures = {}
 
     for audioFilepath in audioFilepaths:
+        if (validationCache is None):
+            audioFilepathsToParse.append(audioFilepath)
+            continue
+
         try:
-            handler = AudioFileMetadataHandler(audioFilepath)
-            handler.getTags()
-            handler.getProperties()
+            fileStat = os.stat(audioFilepath)
+        except OSError:
+            fileStat = None
 
-        except AudioFileNonExistentError:
+        if (fileStat is None or not stat.S_ISREG(fileStat.st_mode)):
             audioFileErrorList.append(AudioFileError(audioFilepath, AudioFileError.NOT_FOUND))
+            continue
 
-        except AudioFileFormatNotSupportedError:
+        if (os.path.splitext(audioFilepath)[1].replace('.', '').lower() not in SUPPORTED_AUDIO_TYPES):
             audioFileErrorList.append(AudioFileError(audioFilepath, AudioFileError.NOT_SUPPORTED))
+            continue
+
+        statSignature = mlu.library.audiolib.getStatSignatureFromFileStat(fileStat)
+        if (not validationCache.isValidated(audioFilepath, statSignature)):
+            audioFilepathsToParse.append(audioFilepath)
+            statSignatures[audioFilepath] = statSignature
 
-        # catch all other exceptions
-        except Exception as e:
-            excStr = traceback.format_exc()
-            audioFileErrorList.append(AudioFileError(audioFilepath, excStr))
+    if (workers <= 1):
+        testResults = map(_testAudioFileForError, audioFilepathsToParse)
+        _addAudioFileTestResults(audioFilepathsToParse, testResults, audioFileErrorList, validationCache, statSignatures)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            testResults = executor.map(_testAudioFileForError, audioFilepathsToParse)
+            _addAudioFileTestResults(audioFilepathsToParse, testResults, audioFileErrorList, validationCache, statSignatures)
 
     return audioFileErrorList
+
+def _addAudioFileTestResults(
+    audioFilepaths: List[str],
+    testResults: Iterable[Optional[AudioFileError]],
+    audioFileErrorList: List[AudioFileError],
+    validationCache: Optional[AudioFileValidationCache],
+    statSignatures: dict
+) -> None:
+    '''
+    Adds the errors of the given test results (one per audio file, in order) to the error list,
+    and the files that passed to the validation cache, if there is one.
+    '''
+    for (audioFilepath, audioFileError) in zip(audioFilepaths, testResults):
+        if (audioFileError is not None):
+            audioFileErrorList.append(audioFileError)
+        elif (validationCache is not None):
+            validationCache.setValidated(audioFilepath, statSignatures[audioFilepath])
+
+def _testAudioFileForError(audioFilepath: str) -> Optional[AudioFileError]:
+    '''
+    Parses the audio file once, reading its tags and properties, and returns the AudioFileError if
+    that failed, otherwise None.
+    '''
+    try:
+        with AudioFileMetadataHandler(audioFilepath) as handler:
+            handler.getTags()
+            handler.getProperties()
+
+    except AudioFileNonExistentError:
+        return AudioFileError(audioFilepath, AudioFileError.NOT_FOUND)
+
+    except AudioFileFormatNotSupportedError:
+        return AudioFileError(audioFilepath, AudioFileError.NOT_SUPPORTED)
+
+    # catch all other exceptions
+    except Exception:
+        return AudioFileError(audioFilepath, traceback.format_exc())
+
+    return None
@@ -0,0 +1,53 @@
+'''
+Benchmark of the MPD log line timestamp decoding: compares datetime.strptime (the previous decoding
+of every log line) with MpdLogTimestampDecoder, on a synthetic log of consecutive timestamps.
+'''
+import argparse
+import time
+from datetime import datetime, timedelta
+
+# Do setup processing so that this script can import all the needed modules from the "mlu" package.
+# This is necessary because these scripts are not located in the root directory of the project, but
+# instead in the 'scripts' folder.
+import envsetup
+envsetup.PreparePythonProjectEnvironment()
+
+from mlu.mpd.log import MpdLogTimestampDecoder
+
+def getSyntheticLogLines(lineCount):
+    lines = []
+    lineDatetime = datetime(2023, 12, 31, 22, 0, 0)
+
+    for lineNumber in range(lineCount):
+        lineDatetime += timedelta(seconds=1, microseconds=lineNumber % 1000)
+        lines.append("{}+00:00 host mpd[123]: player: played \"a/{}.flac\"".format(lineDatetime.strftime(MpdLogTimestampDecoder.TIMESTAMP_FORMAT), lineNumber))
+
+    return lines
+
+def runBenchmark(name, decodeFunction, lines):
+    startTime = time.perf_counter()
+    values = [decodeFunction(line) for line in lines]
+    elapsedTime = time.perf_counter() - startTime
+
+    print("{:<28} {:8.3f} s  {:8.0f} lines/s".format(name, elapsedTime, len(lines) / elapsedTime))
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", 
+        help="number of synthetic log lines to decode",
+        default=1000000,
+        type=int,
+        dest='lineCount'
+    )
+    args = parser.parse_args()
+
+    print("Generating {} synthetic MPD log lines".format(args.lineCount))
+    lines = getSyntheticLogLines(args.lineCount)
+
+    strptimeValues = runBenchmark("datetime.strptime", lambda line: datetime.strptime(line[0:26], MpdLogTimestampDecoder.TIMESTAMP_FORMAT), lines)
+    decoderValues = runBenchmark("decoder (datetime)", MpdLogTimestampDecoder().decodeDatetime, lines)
+    runBenchmark("decoder (epoch microseconds)", MpdLogTimestampDecoder().decodeEpochMicros, lines)
+
+    if (decoderValues != strptimeValues):
+        raise Exception("Decoded timestamps differ from datetime.strptime")
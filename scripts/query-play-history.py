@@ -0,0 +1,107 @@
+'''
+Queries the play history database (the playbacks saved by update-playstat-tags-from-mpd-log.py)
+and prints the results as a table. Dates are given as YYYY-MM-DD: both ends of a date range are
+included.
+
+    query-play-history.py top-tracks --from 2023-01-01 --to 2023-12-31 --limit 20
+    query-play-history.py top-artists --from 2023-01-01
+    query-play-history.py top-albums --from 2023-01-01
+    query-play-history.py plays-per-day --from 2023-06-01 --to 2023-06-30
+    query-play-history.py plays-per-week --from 2023-01-01
+    query-play-history.py not-played-since 2022-01-01
+
+The tags of the audio files (for the tracks, artists and albums) are read from the library tag
+index, which is kept up to date by the library tags loader.
+'''
+import argparse
+from datetime import date, datetime
+
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+import com.nwrobel.mypycommons.time
+from prettytable import PrettyTable
+
+# Do setup processing so that this script can import all the needed modules from the "mlu" package.
+# This is necessary because these scripts are not located in the root directory of the project, but
+# instead in the 'scripts' folder.
+import envsetup
+envsetup.PreparePythonProjectEnvironment()
+
+from mlu.tags.playstats.history import PlayHistoryDatabase
+from mlu.settings import MLUSettings
+
+def getDateFromArg(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def getTable(fieldNames, rows) -> PrettyTable:
+    table = PrettyTable()
+    table.field_names = fieldNames
+    table.align = "l"
+    for row in rows:
+        table.add_row(['' if (value is None) else value for value in row])
+
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--config-file",
+        help="config file name in mlu/config",
+        default="mlu.config.json",
+        type=str,
+        dest='configFile'
+    )
+    subparsers = parser.add_subparsers(dest='query', required=True)
+
+    for (queryName, queryHelp) in [
+        ('top-tracks', "most played tracks in the date range"),
+        ('top-artists', "most played artists in the date range"),
+        ('top-albums', "most played albums in the date range"),
+        ('plays-per-day', "number of plays of each day in the date range"),
+        ('plays-per-week', "number of plays of each week (Monday to Sunday) in the date range")
+    ]:
+        queryParser = subparsers.add_parser(queryName, help=queryHelp)
+        queryParser.add_argument("--from", type=getDateFromArg, default=date.min, dest='startDate', help="first day of the date range (default: the first play)")
+        queryParser.add_argument("--to", type=getDateFromArg, default=date.today(), dest='endDate', help="last day of the date range (default: today)")
+        if (queryName.startswith('top-')):
+            queryParser.add_argument("--limit", type=int, default=25, dest='limit', help="number of results (default 25)")
+
+    notPlayedSinceParser = subparsers.add_parser('not-played-since', help="library tracks not played since the given date (never played first)")
+    notPlayedSinceParser.add_argument("sinceDate", type=getDateFromArg)
+
+    args = parser.parse_args()
+    settings = MLUSettings(configFilename=args.configFile)
+
+    if (not mypycommons.file.pathExists(settings.userConfig.playHistoryFilepath)):
+        raise FileNotFoundError("Play history database not found, save some playstat tags first: {}".format(settings.userConfig.playHistoryFilepath))
+
+    with PlayHistoryDatabase(settings.userConfig.playHistoryFilepath) as playHistory:
+        if (mypycommons.file.pathExists(settings.userConfig.tagIndexFilepath)):
+            playHistory.attachLibraryTagIndex(settings.userConfig.tagIndexFilepath)
+
+        if (args.query == 'top-tracks'):
+            trackPlayCounts = playHistory.getTopTracks(args.startDate, args.endDate, args.limit)
+            table = getTable(["Track Title", "Artist", "Album", "Play Count", "File"], [
+                (x.title, x.artist, x.album, x.playCount, x.filepath) for x in trackPlayCounts
+            ])
+
+        elif (args.query == 'top-artists'):
+            table = getTable(["Artist", "Play Count"], playHistory.getTopArtists(args.startDate, args.endDate, args.limit))
+
+        elif (args.query == 'top-albums'):
+            table = getTable(["Album Artist", "Album", "Play Count"], playHistory.getTopAlbums(args.startDate, args.endDate, args.limit))
+
+        elif (args.query == 'plays-per-day'):
+            table = getTable(["Day", "Play Count"], playHistory.getPlaysPerDay(args.startDate, args.endDate))
+
+        elif (args.query == 'plays-per-week'):
+            table = getTable(["Week Of", "Play Count"], playHistory.getPlaysPerWeek(args.startDate, args.endDate))
+
+        else:
+            notPlayedSince = playHistory.getNotPlayedSince(datetime.combine(args.sinceDate, datetime.min.time()))
+            table = getTable(["File", "Date Last Played"], [
+                (filepath, mypycommons.time.formatDatetimeForDisplay(lastPlayed) if (lastPlayed is not None) else 'never')
+                for (filepath, lastPlayed) in notPlayedSince
+            ])
+
+    print(table.get_string())
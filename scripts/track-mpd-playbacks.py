@@ -0,0 +1,83 @@
+'''
+Tracks the MPD player through the MPD protocol and records each song played, with the exact time
+it was played, to the playback journal. The playstat tags are then updated from the journal with:
+
+    update-playstat-tags-from-mpd-log.py --load --journal
+
+Runs until interrupted (Ctrl+C), reconnecting to MPD if the connection is lost.
+'''
+import argparse
+import time
+from datetime import datetime
+
+from com.nwrobel import mypycommons
+from com.nwrobel.mypycommons.logger import CommonLogger, LogLevel
+import com.nwrobel.mypycommons.file
+import com.nwrobel.mypycommons.time
+
+# Do setup processing so that this script can import all the needed modules from the "mlu" package.
+# This is necessary because these scripts are not located in the root directory of the project, but
+# instead in the 'scripts' folder.
+import envsetup
+envsetup.PreparePythonProjectEnvironment()
+
+from mlu.mpd.client import MpdClient, MpdPlaybackTracker, MpdProtocolError
+from mlu.mpd.journal import PlaybackJournal
+from mlu.settings import MLUSettings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--config-file",
+        help="config file name in mlu/config",
+        default="mlu.config.json",
+        type=str,
+        dest='configFile'
+    )
+    parser.add_argument("--reconnect-delay",
+        help="seconds to wait before reconnecting to MPD when the connection fails",
+        default=10,
+        type=int,
+        dest='reconnectDelay'
+    )
+    args = parser.parse_args()
+
+    settings = MLUSettings(configFilename=args.configFile)
+    mpdConfig = settings.userConfig.mpdConfig
+
+    loggerWrapper = mypycommons.logger.CommonLogger(loggerName=settings.loggerName, logDir=settings.userConfig.logDir, logFilename="track-mpd-playbacks.py.log")
+    logger = loggerWrapper.getLogger()
+
+    playbackJournal = PlaybackJournal(mpdConfig.playbackJournalFilepath)
+
+    def recordPlayback(playback):
+        logger.info("Recording playback to journal: File='{}', DateTime='{}', Duration='{}'".format(
+            playback.audioFilepath,
+            mypycommons.time.formatDatetimeForDisplay(playback.dateTime),
+            playback.duration
+        ))
+        playbackJournal.append(playback)
+
+    tracker = MpdPlaybackTracker(settings.userConfig.audioLibraryRootDir, recordPlayback)
+    logger.info("Tracking MPD playbacks to journal: {}".format(mpdConfig.playbackJournalFilepath))
+
+    try:
+        while True:
+            try:
+                client = MpdClient(mpdConfig.host, mpdConfig.port, mpdConfig.password)
+                logger.info("Connected to MPD at {} (protocol {})".format(mpdConfig.host, client.protocolVersion))
+
+                try:
+                    tracker.track(client)
+                finally:
+                    client.close()
+
+            except (OSError, MpdProtocolError):
+                logger.exception("Connection to MPD failed, reconnecting in {} seconds".format(args.reconnectDelay))
+                time.sleep(args.reconnectDelay)
+
+    except KeyboardInterrupt:
+        # Record the song being played up to now
+        tracker.finish(datetime.now())
+
+    logger.info('Script complete')
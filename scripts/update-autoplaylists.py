@@ -22,6 +22,11 @@ if __name__ == "__main__":
         type=str,
         dest='configFile'
     )
+    parser.add_argument("--full-scan", 
+        action='store_true',
+        dest='fullScan',
+        help="Read the tags of every library audio file again, instead of only those that are new or changed since the previous tags snapshot"
+    )
     args = parser.parse_args()
 
     settings = MLUSettings(configFilename=args.configFile)
@@ -30,7 +35,7 @@ if __name__ == "__main__":
     logger = loggerWrapper.getLogger()
 
     provider = mlu.managers.load_tags.LoadLibraryTagsManager(settings, loggerWrapper)
-    provider.saveLibraryTagsSnapshot()
+    provider.saveLibraryTagsSnapshot(fullScan=args.fullScan)
 
     provider = mlu.managers.write_autoplaylists.WriteAutoplaylistsManager(settings, loggerWrapper)
     provider.writeRatingAutoplaylists()
@@ -39,8 +39,49 @@ if __name__ == "__main__":
         dest='saveFromDataDirectory',
         help="Update audio file playstats tags from previously generated output data. Name of the directory (contained in your mpd output dir from config) that was generated previously. ex) \"[2023-11-18 13.21.14] playback-data-output\""
     )
+    group.add_argument("-i", "--ingest", 
+        action='store_true',
+        dest='ingest',
+        help="Load only the MPD log lines written since the last checkpoint and update the playstats tags from them, in one step: the log file is not archived or cleared"
+    )
+    group.add_argument("--migrate-date-all-plays", 
+        action='store_true',
+        dest='migrateDateAllPlays',
+        help="Import the plays of the DATE_ALL_PLAYS tags of the library audio files (written by older versions) into the play history database. Can be run again: plays already in the database are not added twice. The tags are left on the files unless --remove-date-all-plays is given"
+    )
+    parser.add_argument("--incremental", 
+        action='store_true',
+        dest='incremental',
+        help="With --load: only load the MPD log lines written since the last checkpoint. The checkpoint is moved forward (instead of the log file being archived and cleared) when the tags are updated with --save"
+    )
+    parser.add_argument("--history", 
+        action='store_true',
+        dest='history',
+        help="With --load: load the playbacks from the whole MPD log history (the archived logs in the log archive dir, the rotated logs and the log file), merged into one log, to rebuild the playback history data and summaries. Saving this data only adds its playbacks to the play history database: the tags are not updated"
+    )
+    parser.add_argument("--journal", 
+        action='store_true',
+        dest='journal',
+        help="With --load: load the playbacks recorded live by track-mpd-playbacks.py from the playback journal, instead of the MPD log file. The MPD log file is not archived or cleared when the tags are updated with --save"
+    )
+    group.add_argument("--move-play-history", 
+        nargs=2,
+        metavar=('OLD_FILEPATH', 'NEW_FILEPATH'),
+        dest='movePlayHistory',
+        help="Move the plays in the play history database of an audio file that was moved or renamed to its new filepath (full filepaths, inside the audio library root dir). The play history knows the audio files by filepath only"
+    )
+    parser.add_argument("--remove-date-all-plays", 
+        action='store_true',
+        dest='removeDateAllPlays',
+        help="With --migrate-date-all-plays: remove the DATE_ALL_PLAYS tags from the audio files once all their plays are imported into the play history database"
+    )
     args = parser.parse_args()
 
+    if ([args.incremental, args.history, args.journal].count(True) > 1):
+        parser.error("only one of --incremental, --history and --journal can be used")
+    if (args.removeDateAllPlays and not args.migrateDateAllPlays):
+        parser.error("--remove-date-all-plays can only be used with --migrate-date-all-plays")
+
     settings = MLUSettings(configFilename=args.configFile)
 
     loggerWrapper = mypycommons.logger.CommonLogger(loggerName=settings.loggerName, logDir=settings.userConfig.logDir, logFilename="update-playstat-tags-from-mpd-log.py.log")
@@ -49,9 +90,15 @@ if __name__ == "__main__":
     provider = PlaystatTagUpdaterForMpd(settings, loggerWrapper)
 
     if (args.load):
-        provider.processMpdLogFile()
+        provider.processMpdLogFile(incremental=args.incremental, history=args.history, fromJournal=args.journal)
     elif (args.saveFromDataDirectory):
         provider.updatePlaystatTags(args.saveFromDataDirectory)
+    elif (args.ingest):
+        provider.ingestMpdLogFile()
+    elif (args.migrateDateAllPlays):
+        provider.importDateAllPlaysToPlayHistory(removeTags=args.removeDateAllPlays)
+    elif (args.movePlayHistory):
+        provider.movePlayHistory(args.movePlayHistory[0], args.movePlayHistory[1])
 
     settings.cleanupTempDir()
     logger.info('Script complete')
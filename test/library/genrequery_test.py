@@ -0,0 +1,54 @@
+'''
+Tests for mlu.library.genrequery.
+
+'''
+
+import unittest
+import sys
+import os
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.library.genrequery import parseGenreQuery, GenreQuerySyntaxError
+from mlu.library.table import LibraryTable, getRowIdsFromBitset
+from mlu.tags.values import AudioFileTags
+
+def getTestTags(genre):
+    return AudioFileTags(
+        title='Title',
+        artist='Artist',
+        album='Album',
+        albumArtist='Album Artist',
+        genre=genre,
+        dateLastPlayed='',
+        playCount=0,
+        rating=0
+    )
+
+class TestGenreQuery(unittest.TestCase):
+    def setUp(self):
+        self.table = LibraryTable()
+        self.table.addRow('/music/0.flac', getTestTags('Industrial'))
+        self.table.addRow('/music/1.flac', getTestTags('Industrial Metal'))
+        self.table.addRow('/music/2.flac', getTestTags('Industrial;Techno'))
+        self.table.addRow('/music/3.flac', getTestTags('Ambient'))
+        self.table.addRow('/music/4.flac', getTestTags(''))
+        self.table.buildIndexes()
+
+    def _getQueryRowIds(self, query):
+        return getRowIdsFromBitset(parseGenreQuery(query).evaluate(self.table))
+
+    def test_evaluate(self):
+        self.assertEqual(self._getQueryRowIds("'Industrial'"), [0, 2])
+        self.assertEqual(self._getQueryRowIds("'Industrial Metal' or 'Ambient'"), [1, 3])
+        self.assertEqual(self._getQueryRowIds("('Industrial' or 'Industrial Metal') and 'Techno'"), [2])
+        self.assertEqual(self._getQueryRowIds("'Industrial' or 'Ambient' and 'Techno'"), [0, 2])
+        self.assertEqual(self._getQueryRowIds("not ('Industrial' or 'Ambient')"), [1, 4])
+        self.assertEqual(self._getQueryRowIds("'Jazz' or \"Ambient\""), [3])
+
+    def test_syntaxErrors(self):
+        for query in ["", "'Industrial' or", "('Industrial'", "'Industrial' xor 'Ambient'", "Industrial", "'Industrial' 'Ambient'", "'Industrial"]:
+            self.assertRaises(GenreQuerySyntaxError, parseGenreQuery, query)
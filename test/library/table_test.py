@@ -0,0 +1,61 @@
+'''
+Tests for mlu.library.table.
+
+'''
+
+import unittest
+import sys
+import os
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+import mlu.library.table
+from mlu.library.table import LibraryTable
+from mlu.tags.values import AudioFileTags
+
+def getTestTags(albumArtist, album, genre, rating):
+    return AudioFileTags(
+        title='Title',
+        artist='Artist',
+        album=album,
+        albumArtist=albumArtist,
+        genre=genre,
+        dateLastPlayed='',
+        playCount=1,
+        rating=rating
+    )
+
+class TestLibraryTable(unittest.TestCase):
+    def setUp(self):
+        self.table = LibraryTable()
+        self.table.addRow('/music/1.flac', getTestTags('B', 'X', 'Rock;Metal', 0))
+        self.table.addRow('/music/2.flac', getTestTags('A', 'Y', 'Metal', 0))
+        self.table.addRow('/music/3.flac', getTestTags('A', 'X', 'Metal', 8.5))
+        self.table.addRow('/music/4.flac', getTestTags('C', 'X', '', 9.0))
+        self.table.addRow('/music/5.flac', getTestTags('A', 'X', 'Industrial Metal', 9.0))
+        self.table.buildIndexes()
+
+    def test_getRowsByRating(self):
+        rowIds = self.table.getRowsByRating(8, 10)
+        self.assertEqual(self.table.getFilepaths(rowIds), ['/music/5.flac', '/music/4.flac', '/music/3.flac'])
+
+    def test_getUnratedRowsByGenre(self):
+        rowIds = self.table.getUnratedRowsByGenre('Metal')
+        self.assertEqual(self.table.getFilepaths(rowIds), ['/music/2.flac', '/music/1.flac'])
+
+        self.assertEqual(self.table.getUnratedRowsByGenre('Industrial'), [])
+        self.assertEqual(self.table.getUnratedRowsByGenre('Jazz'), [])
+
+    def test_bitsets(self):
+        self.assertEqual(mlu.library.table.getRowIdsFromBitset(self.table.getGenreBitset('Metal')), [0, 1, 2])
+        self.assertEqual(mlu.library.table.getRowIdsFromBitset(self.table.unratedBitset), [0, 1])
+        self.assertEqual(self.table.getGenreBitset('Jazz'), 0)
+
+        rowIds = [0, 7, 8, 63, 64, 999]
+        bitset = mlu.library.table.getBitsetFromRowIds(rowIds, 1000)
+        self.assertEqual(bitset, sum(1 << rowId for rowId in rowIds))
+        self.assertEqual(mlu.library.table.getRowIdsFromBitset(bitset), rowIds)
+        self.assertEqual(mlu.library.table.getRowIdsFromBitset(0), [])
@@ -0,0 +1,100 @@
+'''
+Tests for mlu.library.tagindex.
+
+'''
+
+import unittest
+import sys
+import os
+import sqlite3
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.library.tagindex import LibraryTagIndex, LibraryTagIndexEntry
+from mlu.tags.values import AudioFileTags
+
+def getTestTags(albumArtist, genre, rating):
+    return AudioFileTags(
+        title='Title',
+        artist='Artist',
+        album='Album',
+        albumArtist=albumArtist,
+        genre=genre,
+        dateLastPlayed='',
+        playCount=1,
+        rating=rating
+    )
+
+class TestLibraryTagIndex(unittest.TestCase):
+    def setUp(self):
+        mypycommons.file.createDirectory(MLUSettings.getTempDir())
+        self.databaseFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'tagindex_test.sqlite')
+        self.tagIndex = LibraryTagIndex(self.databaseFilepath)
+
+        self.tagIndex.upsertEntries([
+            LibraryTagIndexEntry('/music/1.flac', getTestTags('B', 'Rock;Metal', 0), { 'size': 10, 'mtimeNs': 20, 'inode': 30 }),
+            LibraryTagIndexEntry('/music/2.flac', getTestTags('A', 'Metal', 0), None),
+            LibraryTagIndexEntry('/music/3.flac', getTestTags('A', 'Metal', 8.5), None),
+            LibraryTagIndexEntry('/music/4.flac', getTestTags('C', '', 9.0), None)
+        ])
+
+    def tearDown(self):
+        self.tagIndex.close()
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_getEntry(self):
+        entry = self.tagIndex.getEntry('/music/1.flac')
+        self.assertEqual(entry.tags.genre, ['Rock', 'Metal'])
+        self.assertEqual(entry.stat, { 'size': 10, 'mtimeNs': 20, 'inode': 30 })
+
+        self.assertIsNone(self.tagIndex.getEntry('/music/5.flac'))
+
+    def test_upsertEntries(self):
+        self.tagIndex.upsertEntries([LibraryTagIndexEntry('/music/1.flac', getTestTags('B', 'Rock', 7.0), None)])
+
+        self.assertEqual(self.tagIndex.getEntriesCount(), 4)
+        self.assertEqual(self.tagIndex.getEntry('/music/1.flac').tags.rating, 7.0)
+        self.assertEqual(self.tagIndex.getEntry('/music/2.flac').tags.rating, 0)
+
+    def test_deleteEntries(self):
+        self.tagIndex.deleteEntries(['/music/1.flac', '/music/2.flac'])
+
+        self.assertEqual(self.tagIndex.getEntriesCount(), 2)
+        self.assertIsNone(self.tagIndex.getEntry('/music/1.flac'))
+
+    def test_exportJsonFile(self):
+        jsonFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'tagindex_test.json')
+        self.tagIndex.exportJsonFile(jsonFilepath)
+        exportedJson = mypycommons.file.readJsonFile(jsonFilepath)
+
+        self.assertEqual([item['filepath'] for item in exportedJson], ['/music/1.flac', '/music/2.flac', '/music/3.flac', '/music/4.flac'])
+        self.assertEqual(AudioFileTags.fromJsonDict(exportedJson[0]['tags']).genre, ['Rock', 'Metal'])
+
+    def test_createSchemaDropsRemovedObjects(self):
+        '''
+        Tests that the genre table and rating index of index files created by an earlier version
+        are dropped when the index is opened, and that the entries are kept.
+        '''
+        self.tagIndex.close()
+        connection = sqlite3.connect(self.databaseFilepath)
+        connection.executescript('''
+            CREATE TABLE audio_file_genres (genre TEXT NOT NULL, filepath TEXT NOT NULL, PRIMARY KEY (genre, filepath));
+            CREATE INDEX audio_files_rating_idx ON audio_files (rating);
+        ''')
+        connection.close()
+
+        self.tagIndex = LibraryTagIndex(self.databaseFilepath)
+        schemaNames = [row[0] for row in self.tagIndex._connection.execute("SELECT name FROM sqlite_master")]
+
+        self.assertNotIn('audio_file_genres', schemaNames)
+        self.assertNotIn('audio_files_rating_idx', schemaNames)
+        self.assertEqual(self.tagIndex.getEntriesCount(), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+'''
+Tests for mlu.managers.load_tags.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+import tempfile
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+import mlu.managers.load_tags
+from mlu.managers.load_tags import LoadLibraryTagsManager
+from mlu.library.tagindex import LibraryTagIndex
+import test.helpers.common
+
+class TestLoadLibraryTagsManager(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.libraryDir = mypycommons.file.joinPaths(self.tempDir, 'library')
+        mypycommons.file.createDirectory(self.libraryDir)
+
+        # Library of copies of the test audio files, with an unreadable file in the middle
+        self.audioFilepaths = []
+        for index in range(12):
+            testAudioFilename = 'test-1.flac' if (index % 2 == 0) else 'test-1.mp3'
+            testAudioFilepath = mypycommons.file.joinPaths(test.helpers.common.getTestDataDir(), 'test-audio-files', testAudioFilename)
+            audioFilepath = mypycommons.file.joinPaths(self.libraryDir, '{:02d}-{}'.format(index, testAudioFilename))
+
+            if (index == 5):
+                with open(audioFilepath, mode='wb') as audioFile:
+                    audioFile.write(b'not an audio file')
+            else:
+                with open(testAudioFilepath, mode='rb') as testAudioFile, open(audioFilepath, mode='wb') as audioFile:
+                    audioFile.write(testAudioFile.read())
+
+            self.audioFilepaths.append(audioFilepath)
+
+        self.settings = mock.Mock()
+        self.settings.userConfig.audioLibraryRootDir = self.libraryDir
+        self.settings.userConfig.tagIndexFilepath = mypycommons.file.joinPaths(self.tempDir, 'tagindex.sqlite')
+        self.settings.userConfig.tagBackupFilepath = mypycommons.file.joinPaths(self.tempDir, 'tags-snapshot.json')
+        self.settings.userConfig.libraryTagsConfig.scanWorkers = 1
+        self.settings.userConfig.libraryTagsConfig.fastRead = False
+
+        self.manager = LoadLibraryTagsManager(self.settings, mock.Mock())
+
+    def tearDown(self):
+        mypycommons.file.deletePath(self.tempDir)
+
+    def test_scanAudioFilesTags(self):
+        '''
+        Tests that the parallel scan yields the same results, in the same order, as the serial scan,
+        and that the file that can't be read is reported without stopping the scan.
+        '''
+        serialResults = list(self.manager._scanAudioFilesTags(self.audioFilepaths, 1, False))
+        parallelResults = list(self.manager._scanAudioFilesTags(self.audioFilepaths, 2, False))
+
+        self.assertEqual([result.filepath for result in serialResults], self.audioFilepaths)
+        self.assertEqual([result.filepath for result in parallelResults], self.audioFilepaths)
+        self.assertEqual(
+            [(result.tags.__dict__ if (result.tags) else None) for result in parallelResults],
+            [(result.tags.__dict__ if (result.tags) else None) for result in serialResults]
+        )
+
+        self.assertIsNone(parallelResults[5].tags)
+        self.assertTrue(parallelResults[5].errorMessage)
+        self.assertEqual([index for (index, result) in enumerate(parallelResults) if (result.errorMessage)], [5])
+
+    def test_saveLibraryTagsSnapshot(self):
+        '''
+        Tests that only the added and changed audio files are read again by the next snapshot, and
+        that the deleted files are removed from it.
+        '''
+        # Leave out the unreadable file
+        os.remove(self.audioFilepaths[5])
+        del self.audioFilepaths[5]
+
+        self.assertEqual(self._saveSnapshotAndGetReadFilepaths(), self.audioFilepaths)
+        self.assertEqual(self._saveSnapshotAndGetReadFilepaths(), [])
+
+        addedFilepath = mypycommons.file.joinPaths(self.libraryDir, '99-test-1.flac')
+        with open(self.audioFilepaths[0], mode='rb') as audioFile, open(addedFilepath, mode='wb') as addedFile:
+            addedFile.write(audioFile.read())
+
+        # Same size, new modified time
+        changedFilepath = self.audioFilepaths[1]
+        fileStat = os.stat(changedFilepath)
+        os.utime(changedFilepath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 1000000000))
+
+        deletedFilepath = self.audioFilepaths[2]
+        os.remove(deletedFilepath)
+
+        self.assertEqual(self._saveSnapshotAndGetReadFilepaths(), [changedFilepath, addedFilepath])
+
+        snapshotFilepaths = [item['filepath'] for item in mypycommons.file.readJsonFile(self.settings.userConfig.tagBackupFilepath)]
+        self.assertIn(addedFilepath, snapshotFilepaths)
+        self.assertNotIn(deletedFilepath, snapshotFilepaths)
+        self.assertEqual(len(snapshotFilepaths), len(self.audioFilepaths))
+
+    def test_importSnapshotFile(self):
+        '''
+        Tests that an existing snapshot file is imported into the empty tag index: the files with a
+        matching stat signature are not read again, those without a stat signature (snapshot made
+        before the signatures were added) are.
+        '''
+        os.remove(self.audioFilepaths[5])
+        del self.audioFilepaths[5]
+
+        self._saveSnapshotAndGetReadFilepaths()
+        snapshotJson = mypycommons.file.readJsonFile(self.settings.userConfig.tagBackupFilepath)
+        os.remove(self.settings.userConfig.tagIndexFilepath)
+
+        # Old snapshot format: no stat signature for the first file
+        del snapshotJson[0]['stat']
+        mypycommons.file.writeJsonFile(self.settings.userConfig.tagBackupFilepath, snapshotJson)
+
+        self.assertEqual(self._saveSnapshotAndGetReadFilepaths(), [self.audioFilepaths[0]])
+
+        with LibraryTagIndex(self.settings.userConfig.tagIndexFilepath) as tagIndex:
+            self.assertEqual(tagIndex.getEntriesCount(), len(self.audioFilepaths))
+            self.assertEqual(tagIndex.getEntry(self.audioFilepaths[1]).tags.__dict__, snapshotJson[1]['tags'])
+
+    def _saveSnapshotAndGetReadFilepaths(self):
+        '''
+        Saves the library tags snapshot, and returns the filepaths of the audio files whose tags
+        were read for it.
+        '''
+        with mock.patch('mlu.managers.load_tags.readAudioFileTagsForScan', wraps=mlu.managers.load_tags.readAudioFileTagsForScan) as readMock:
+            self.manager.saveLibraryTagsSnapshot()
+
+        return [call.args[0] for call in readMock.call_args_list]
+
+if __name__ == '__main__':
+    unittest.main()
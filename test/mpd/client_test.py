@@ -0,0 +1,180 @@
+'''
+Tests for mlu.mpd.client, using a small fake MPD server.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.mpd.client import MpdClient, MpdPlaybackTracker, MpdProtocolError
+
+class FakeMpdServer:
+    '''
+    Fake MPD server for a single connection: answers status/currentsong command lists with the
+    given player states, moving to the next state on each 'idle player', and closes the connection
+    once all states were sent.
+    '''
+    def __init__(self, playerStates):
+        self.playerStates = playerStates
+        self.receivedCommands = []
+        self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._serverSocket.bind(('127.0.0.1', 0))
+        self._serverSocket.listen(1)
+        self.port = self._serverSocket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._serverSocket.close()
+        self._thread.join(5)
+
+    def _serve(self):
+        (connection, address) = self._serverSocket.accept()
+        with connection, connection.makefile(mode='rwb') as connectionFile:
+            stateIndex = 0
+            self._send(connectionFile, 'OK MPD 0.23.5\n')
+
+            for line in connectionFile:
+                command = line.decode('utf-8').rstrip('\n')
+                self.receivedCommands.append(command)
+                (status, currentSong) = self.playerStates[stateIndex]
+
+                if (command == 'command_list_end'):
+                    response = self._getPairsText(status) + 'list_OK\n' + self._getPairsText(currentSong) + 'list_OK\nOK\n'
+                elif (command.startswith('command_list') or command in ('status', 'currentsong')):
+                    continue
+                elif (command in ('idle player', 'idle "player"')):
+                    stateIndex += 1
+                    if (stateIndex >= len(self.playerStates)):
+                        return
+                    response = 'changed: player\nOK\n'
+                else:
+                    response = 'ACK [5@0] {{}} unknown command "{}"\n'.format(command.split(' ')[0])
+
+                self._send(connectionFile, response)
+
+    def _getPairsText(self, pairs):
+        return ''.join('{}: {}\n'.format(key, value) for (key, value) in pairs.items())
+
+    def _send(self, connectionFile, text):
+        connectionFile.write(text.encode('utf-8'))
+        connectionFile.flush()
+
+class TestMpdClient(unittest.TestCase):
+    def test_track(self):
+        '''
+        Tests that the tracker follows the player through the protocol, recording a playback for
+        each library song played once it ends (streams are not recorded).
+        '''
+        playerStates = [
+            ({'state': 'play', 'songid': '1', 'elapsed': '0.000'}, {'file': 'a/1.flac', 'Id': '1'}),
+            ({'state': 'pause', 'songid': '1', 'elapsed': '2.000'}, {'file': 'a/1.flac', 'Id': '1'}),
+            ({'state': 'play', 'songid': '2', 'elapsed': '0.000'}, {'file': 'a/2 "b".flac', 'Id': '2'}),
+            ({'state': 'play', 'songid': '3', 'elapsed': '0.000'}, {'file': 'http://radio/stream', 'Id': '3'}),
+            ({'state': 'stop'}, {})
+        ]
+        server = FakeMpdServer(playerStates)
+        playbacks = []
+
+        client = MpdClient('127.0.0.1', server.port)
+        self.assertEqual(client.protocolVersion, '0.23.5')
+        self.assertRaises(MpdProtocolError, client.sendCommand, 'notacommand', 'arg "quoted"')
+        self.assertEqual(server.receivedCommands[-1], 'notacommand "arg \\"quoted\\""')
+
+        tracker = MpdPlaybackTracker('/music', playbacks.append)
+        self.assertRaises(ConnectionError, tracker.track, client)
+        client.close()
+        server.close()
+
+        self.assertEqual([playback.audioFilepath for playback in playbacks], ['/music/a/1.flac', '/music/a/2 "b".flac'])
+
+    def test_trackerDurations(self):
+        '''
+        Tests that the playback duration only counts the time the song was playing.
+        '''
+        playbacks = []
+        tracker = MpdPlaybackTracker('/music', playbacks.append)
+        startTime = datetime(2024, 1, 1, 10, 0, 0)
+        song = {'file': 'a/1.flac', 'Id': '1'}
+
+        tracker.update({'state': 'play', 'songid': '1', 'elapsed': '5.000'}, song, startTime)
+        tracker.update({'state': 'pause', 'songid': '1', 'elapsed': '65.000'}, song, startTime + timedelta(seconds=60))
+        tracker.update({'state': 'play', 'songid': '1', 'elapsed': '65.000'}, song, startTime + timedelta(seconds=600))
+        tracker.update({'state': 'stop'}, {}, startTime + timedelta(seconds=630))
+
+        self.assertEqual(len(playbacks), 1)
+        self.assertEqual(playbacks[0].dateTime, startTime - timedelta(seconds=5))
+        self.assertEqual(playbacks[0].duration, timedelta(seconds=95))
+
+    def test_trackerRepeatSingle(self):
+        '''
+        Tests that the same song started over (repeat single, seek back to the start) is recorded as
+        a new playback.
+        '''
+        playbacks = []
+        tracker = MpdPlaybackTracker('/music', playbacks.append)
+        startTime = datetime(2024, 1, 1, 10, 0, 0)
+        song = {'file': 'a/1.flac', 'Id': '1'}
+
+        tracker.update({'state': 'play', 'songid': '1', 'elapsed': '0.000'}, song, startTime)
+        tracker.update({'state': 'play', 'songid': '1', 'elapsed': '100.000'}, song, startTime + timedelta(seconds=100))
+        tracker.update({'state': 'play', 'songid': '1', 'elapsed': '0.500'}, song, startTime + timedelta(seconds=200.5))
+        tracker.update({'state': 'stop'}, {}, startTime + timedelta(seconds=300))
+
+        self.assertEqual([playback.dateTime for playback in playbacks], [startTime, startTime + timedelta(seconds=200)])
+        self.assertEqual([playback.duration for playback in playbacks], [timedelta(seconds=200), timedelta(seconds=100)])
+
+    def test_connectFailureClosesSocket(self):
+        '''
+        Tests that the socket is closed when setting up the connection fails (here, MPD refuses the
+        password command).
+        '''
+        server = FakeMpdServer([({}, {})])
+        clientSockets = []
+        socketCreateConnection = socket.create_connection
+
+        def createConnection(*args, **kwargs):
+            clientSockets.append(socketCreateConnection(*args, **kwargs))
+            return clientSockets[-1]
+
+        with mock.patch('socket.create_connection', side_effect=createConnection):
+            self.assertRaises(MpdProtocolError, MpdClient, '127.0.0.1', server.port, 'password')
+        server.close()
+
+        self.assertEqual(len(clientSockets), 1)
+        self.assertEqual(clientSockets[0].fileno(), -1)
+
+    def test_trackerReconnect(self):
+        '''
+        Tests that the playback of the current song is ended when the connection is lost, and that
+        the song still playing after reconnecting is recorded as a new playback.
+        '''
+        playbacks = []
+        tracker = MpdPlaybackTracker('/music', playbacks.append)
+
+        for (playerStates, expectedPlaybacksCount) in [
+            ([({'state': 'play', 'songid': '1', 'elapsed': '10.000'}, {'file': 'a/1.flac', 'Id': '1'})], 1),
+            ([({'state': 'play', 'songid': '1', 'elapsed': '70.000'}, {'file': 'a/1.flac', 'Id': '1'}), ({'state': 'stop'}, {})], 2)
+        ]:
+            server = FakeMpdServer(playerStates)
+            client = MpdClient('127.0.0.1', server.port)
+            self.assertRaises(ConnectionError, tracker.track, client)
+            client.close()
+            server.close()
+
+            self.assertEqual(len(playbacks), expectedPlaybacksCount)
+
+        self.assertEqual([playback.audioFilepath for playback in playbacks], ['/music/a/1.flac', '/music/a/1.flac'])
+        self.assertLess(playbacks[0].duration, timedelta(seconds=15))
+        self.assertGreaterEqual(playbacks[1].duration, timedelta(seconds=70))
+        self.assertLess(playbacks[1].duration, timedelta(seconds=75))
@@ -0,0 +1,39 @@
+'''
+Tests for mlu.mpd.events.
+
+'''
+
+import unittest
+import sys
+import os
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.mpd.events import MpdLogEventType, MpdLogLineClassifier
+
+class TestMpdLogLineClassifier(unittest.TestCase):
+    def test_classify(self):
+        '''
+        Tests the event types and paths given for the default event types, and for an added one.
+        '''
+        classifier = MpdLogLineClassifier()
+        classifier.addEventType('paused', 'player: paused', r'player: paused "(?P<path>[^"]*)"$')
+
+        lines = [
+            ('host mpd[123]: player: played "a/b c/1.flac"', (MpdLogEventType.PLAYED, 'a/b c/1.flac')),
+            ('host mpd[123]: client: [4] opened from 127.0.0.1:4242', (MpdLogEventType.CLIENT_OPENED, None)),
+            ('host mpd[123]: client: [4] closed', (MpdLogEventType.CLIENT_CLOSED, None)),
+            ('host mpd[123]: player: paused "a/2.flac"', ('paused', 'a/2.flac')),
+            ('host mpd[123]: client: [4] process command "status"', (MpdLogEventType.OTHER, None)),
+            ('host mpd[123]: player: played "a/1.flac" (partial', (MpdLogEventType.OTHER, None)),
+            ('host mpd[123]: exception: decoder failed', (MpdLogEventType.OTHER, None))
+        ]
+
+        for (lineText, expectedResult) in lines:
+            self.assertEqual(classifier.classify(lineText), expectedResult)
+
+        self.assertTrue(classifier.rawLineMayHaveEvent('2024-01-01T00:00:00.000000+00:00 host mpd[123]: player: paused "a/2.flac"'))
+        self.assertFalse(classifier.rawLineMayHaveEvent('2024-01-01T00:00:00.000000+00:00 host mpd[123]: exception: decoder failed'))
@@ -0,0 +1,67 @@
+'''
+Tests for mlu.mpd.journal.
+
+'''
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.mpd.journal import PlaybackJournal
+from mlu.tags.playstats.common import Playback
+
+class TestPlaybackJournal(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.journal = PlaybackJournal(mypycommons.file.joinPaths(self.tempDir, 'playbacks.jsonl'))
+
+    def tearDown(self):
+        mypycommons.file.deletePath(self.tempDir)
+
+    def test_startLoading(self):
+        '''
+        Tests that loading moves the playbacks out of the journal, and that a load that was not
+        finished returns its playbacks again along with the new ones.
+        '''
+        self.journal.append(Playback('/music/1.flac', datetime(2024, 1, 1, 10, 0, 0), timedelta(seconds=200)))
+
+        self.assertEqual([playback.audioFilepath for playback in self.journal.startLoading()], ['/music/1.flac'])
+        self.assertFalse(mypycommons.file.pathExists(self.journal.journalFilepath))
+
+        self.journal.append(Playback('/music/2.flac', datetime(2024, 1, 1, 10, 5, 0), None))
+        playbacks = self.journal.startLoading()
+        self.assertEqual([playback.audioFilepath for playback in playbacks], ['/music/1.flac', '/music/2.flac'])
+        self.assertEqual(playbacks[0].duration, timedelta(seconds=200))
+        self.assertIsNone(playbacks[1].duration)
+
+        self.journal.finishLoading(mypycommons.file.joinPaths(self.tempDir, 'loaded.jsonl'))
+        self.assertEqual(self.journal.startLoading(), [])
+
+    def test_appendWaitsForLock(self):
+        '''
+        Tests that a playback appended while the journal is locked (being moved for loading) is
+        only written once the lock is released, to the new journal.
+        '''
+        appendThread = threading.Thread(target=self.journal.append, args=(Playback('/music/1.flac', datetime(2024, 1, 1, 10, 0, 0), None),))
+
+        with self.journal._lockJournal():
+            appendThread.start()
+            appendThread.join(0.2)
+            self.assertTrue(appendThread.is_alive())
+            self.assertFalse(mypycommons.file.pathExists(self.journal.journalFilepath))
+
+        appendThread.join(5)
+        self.assertEqual([playback.audioFilepath for playback in self.journal.startLoading()], ['/music/1.flac'])
+
+if __name__ == '__main__':
+    unittest.main()
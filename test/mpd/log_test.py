@@ -0,0 +1,116 @@
+'''
+Tests for mlu.mpd.log.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+import gzip
+from datetime import datetime, timezone
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.mpd.log import MpdLogTimestampDecoder, MpdLogProvider, MpdLogOrderError
+
+class TestMpdLogTimestampDecoder(unittest.TestCase):
+    def test_decode(self):
+        '''
+        Tests that the decoder gives the same values as strptime, for lines on the same and
+        different minutes and days.
+        '''
+        decoder = MpdLogTimestampDecoder()
+        lines = [
+            '2023-12-31T23:59:58.000001+00:00 host mpd[123]: player: played "a/1.flac"',
+            '2023-12-31T23:59:59.999999+00:00 host mpd[123]: client: [1] closed',
+            '2024-01-01T00:00:00.500000+00:00 host mpd[123]: player: played "a/2.flac"',
+            '2024-01-01T00:00:00.500000',
+            '2024-02-29T13:07:42.123456+00:00 host mpd[123]: player: played "a/3.flac"'
+        ]
+
+        for line in lines:
+            expectedDatetime = datetime.strptime(line[0:26], MpdLogTimestampDecoder.TIMESTAMP_FORMAT)
+            expectedEpochMicros = int(expectedDatetime.replace(tzinfo=timezone.utc).timestamp()) * 1000000 + expectedDatetime.microsecond
+
+            self.assertEqual(decoder.decodeDatetime(line), expectedDatetime)
+            self.assertEqual(decoder.decodeEpochMicros(line), expectedEpochMicros)
+
+    def test_decodeInvalid(self):
+        '''
+        Tests that invalid timestamps raise ValueError, as with strptime.
+        '''
+        decoder = MpdLogTimestampDecoder()
+        decoder.decodeDatetime('2024-01-01T00:00:00.500000+00:00 host mpd[123]: client: [1] closed')
+
+        for line in ['2024-01-01T00:00:6a.500000 x', '2024-02-30T00:00:00.500000 x', '2024-01-01T24:00:00.500000 x', 'Jan  1 00:00:00 host mpd[123]: x', '']:
+            self.assertRaises(ValueError, decoder.decodeDatetime, line)
+            self.assertRaises(ValueError, decoder.decodeEpochMicros, line)
+
+class TestMpdLogProvider(unittest.TestCase):
+    def setUp(self):
+        mypycommons.file.createDirectory(MLUSettings.getTempDir())
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_iterateLogFilesLines(self):
+        '''
+        Tests that plain and compressed log files are merged in timestamp order, with lines found in
+        more than one file yielded once.
+        '''
+        logLines = ['2024-01-01T10:00:{:02d}.000000+00:00 host mpd[123]: line {}\n'.format(second, second) for second in range(10)]
+
+        archivedLogFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'mpd.log.1.gz')
+        with gzip.open(archivedLogFilepath, mode='wt') as logFile:
+            logFile.writelines([logLines[0], logLines[2], logLines[1], logLines[5]])
+
+        logFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'mpd.log')
+        with open(logFilepath, mode='w') as logFile:
+            logFile.writelines([logLines[3], logLines[4], logLines[5], logLines[6]])
+
+        mluSettings = mock.Mock()
+        mluSettings.userConfig.mpdConfig.logFilepath = logFilepath
+        mluSettings.userConfig.mpdConfig.logReorderWindow = 10000
+        provider = MpdLogProvider(mluSettings, mock.Mock())
+
+        lines = provider.iterateLogFilesLines([archivedLogFilepath, logFilepath])
+        self.assertEqual([line.originalText + '\n' for line in lines], logLines[0:7])
+
+    def test_iterateLinesReorderWindow(self):
+        '''
+        Tests that lines out of order by less than the reorder window are put back in order, and
+        that a line later than the window raises MpdLogOrderError instead of being yielded out of
+        order.
+        '''
+        logLines = ['2024-01-01T10:00:{:02d}.000000+00:00 host mpd[123]: line {}'.format(second, second) for second in range(9)]
+        lateLogLine = '2024-01-01T09:59:59.000000+00:00 host mpd[123]: late line'
+
+        logFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'mpd.log')
+        with open(logFilepath, mode='w') as logFile:
+            for index in [1, 0, 3, 2, 4, 5, 6, 7, 8]:
+                logFile.write(logLines[index] + '\n')
+
+        mluSettings = mock.Mock()
+        mluSettings.userConfig.mpdConfig.logFilepath = logFilepath
+        mluSettings.userConfig.mpdConfig.logReorderWindow = 3
+        provider = MpdLogProvider(mluSettings, mock.Mock())
+
+        self.assertEqual([line.originalText for line in provider.iterateLines()], logLines)
+
+        with open(logFilepath, mode='a') as logFile:
+            logFile.write(lateLogLine + '\n')
+
+        lines = []
+        with self.assertRaises(MpdLogOrderError):
+            for line in provider.iterateLines():
+                lines.append(line.originalText)
+
+        # Only the lines before the late line were yielded, in order
+        self.assertEqual(lines, logLines[0:6])
@@ -0,0 +1,98 @@
+'''
+Tests for mlu.mpd.plays.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.mpd.plays import MpdPlaybackProvider
+
+def _getLogLine(minuteSecond: str, text: str) -> str:
+    return '2024-01-01T10:{}.000000+00:00 host mpd[123]: {}\n'.format(minuteSecond, text)
+
+class TestMpdPlaybackProvider(unittest.TestCase):
+    def setUp(self):
+        mypycommons.file.createDirectory(MLUSettings.getTempDir())
+        self.logFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'mpd.log')
+
+        with open(self.logFilepath, mode='w') as logFile:
+            logFile.write('')
+
+        self.mluSettings = mock.Mock()
+        self.mluSettings.userConfig.audioLibraryRootDir = '/music'
+        self.mluSettings.userConfig.mpdConfig.logFilepath = self.logFilepath
+        self.mluSettings.userConfig.mpdConfig.parseWorkers = 1
+        self.mluSettings.userConfig.mpdConfig.logReorderWindow = 10000
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def _appendToLog(self, text: str):
+        with open(self.logFilepath, mode='a') as logFile:
+            logFile.write(text)
+
+    def _getPlaybacksSinceCheckpoint(self, checkpoint):
+        provider = MpdPlaybackProvider(self.mluSettings, mock.Mock())
+        (playbacks, newCheckpoint) = provider.getPlaybacksSinceCheckpoint(checkpoint)
+        return ([(playback.audioFilepath, playback.duration.total_seconds()) for playback in playbacks], newCheckpoint)
+
+    def test_getPlaybacksSinceCheckpoint(self):
+        '''
+        Tests that incremental reads give each playback once, with the last playback and partly
+        written lines left for the next read, and that a truncated log is read again in full.
+        '''
+        self._appendToLog(_getLogLine('00:00', 'player: played "a/1.flac"') + _getLogLine('01:00', 'player: played "a/2.flac"'))
+        (playbacks, checkpoint) = self._getPlaybacksSinceCheckpoint(None)
+        self.assertEqual(playbacks, [('/music/a/1.flac', 60)])
+        self.assertIsNotNone(checkpoint.pendingPlaybackLine)
+
+        # Last line partly written
+        partialLine = _getLogLine('03:00', 'client: [1] closed')
+        self._appendToLog(partialLine[:20])
+        (playbacks, checkpoint) = self._getPlaybacksSinceCheckpoint(checkpoint)
+        self.assertEqual(playbacks, [])
+
+        self._appendToLog(partialLine[20:] + _getLogLine('04:00', 'player: played "a/3.flac"') + _getLogLine('04:30', 'player: played "a/4.flac"'))
+        (playbacks, checkpoint) = self._getPlaybacksSinceCheckpoint(checkpoint)
+        self.assertEqual(playbacks, [('/music/a/2.flac', 120), ('/music/a/3.flac', 30)])
+
+        # Log rewritten with other content: the whole file is read
+        with open(self.logFilepath, mode='w') as logFile:
+            logFile.write(_getLogLine('10:00', 'player: played "b/1.flac"') + _getLogLine('10:10', 'client: [1] closed'))
+
+        (playbacks, checkpoint) = self._getPlaybacksSinceCheckpoint(checkpoint)
+        self.assertEqual(playbacks, [('/music/a/4.flac', 330), ('/music/b/1.flac', 10)])
+        self.assertIsNone(checkpoint.pendingPlaybackLine)
+
+    def test_getPlaybacksParallel(self):
+        '''
+        Tests that parsing the log in parallel byte ranges gives the same playbacks as the
+        sequential read.
+        '''
+        for minute in range(30):
+            self._appendToLog(_getLogLine('{:02d}:00'.format(minute), 'player: played "a/{}.flac"'.format(minute)))
+            if (minute % 3 == 0):
+                self._appendToLog(_getLogLine('{:02d}:20'.format(minute), 'client: [1] closed'))
+                self._appendToLog(_getLogLine('{:02d}:30'.format(minute), 'exception: some junk line'))
+
+        expectedPlaybacks = MpdPlaybackProvider(self.mluSettings, mock.Mock()).getPlaybacks()
+
+        self.mluSettings.userConfig.mpdConfig.parseWorkers = 2
+        with mock.patch.object(MpdPlaybackProvider, '_PARALLEL_RANGE_MIN_SIZE', 500):
+            playbacks = MpdPlaybackProvider(self.mluSettings, mock.Mock()).getPlaybacks()
+
+        self.assertEqual(
+            [(playback.audioFilepath, playback.dateTime, playback.duration) for playback in playbacks],
+            [(playback.audioFilepath, playback.dateTime, playback.duration) for playback in expectedPlaybacks]
+        )
@@ -0,0 +1,78 @@
+'''
+Tests for mlu.report.
+
+'''
+
+import unittest
+import sys
+import os
+import csv
+import json
+from prettytable import PrettyTable
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,".."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+import mlu.report
+from mlu.report import ReportColumn, ReportFormat
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        mypycommons.file.createDirectory(MLUSettings.getTempDir())
+        self.reportFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'report')
+
+        self.columns = [ReportColumn("Title", 'l', 12), ReportColumn("Artist", 'l'), ReportColumn("Play Count", 'r')]
+        self.rows = [
+            ["Short", "Björk", 3],
+            ["A title longer than the max width", None, 12345],
+            ["Last", "Múm, Sigur Rós", 0]
+        ]
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_writeTextReport(self):
+        '''
+        Tests that the text report is the PrettyTable table of the columns, and that the rows are
+        read from a generator.
+        '''
+        table = PrettyTable()
+        table.field_names = [column.name for column in self.columns]
+        table.align["Title"] = "l"
+        table.align["Artist"] = "l"
+        table.align["Play Count"] = "r"
+        table.max_width = {"Title": 12}
+        for row in self.rows:
+            table.add_row(row)
+
+        rowsCount = mlu.report.writeReport(self.reportFilepath, self.columns, (row for row in self.rows), ReportFormat.TEXT)
+
+        self.assertEqual(rowsCount, 3)
+        with open(self.reportFilepath, mode='r', encoding='utf-8') as reportFile:
+            self.assertEqual(reportFile.read(), table.get_string())
+
+    def test_writeCsvAndJsonlReports(self):
+        mlu.report.writeReport(self.reportFilepath, self.columns, (row for row in self.rows), ReportFormat.CSV)
+        with open(self.reportFilepath, mode='r', encoding='utf-8', newline='') as reportFile:
+            csvRows = list(csv.reader(reportFile))
+
+        self.assertEqual(csvRows[0], ["Title", "Artist", "Play Count"])
+        self.assertEqual(csvRows[2], ["A title longer than the max width", "", "12345"])
+
+        mlu.report.writeReport(self.reportFilepath, self.columns, (row for row in self.rows), ReportFormat.JSONL)
+        with open(self.reportFilepath, mode='r', encoding='utf-8') as reportFile:
+            jsonRows = [json.loads(line) for line in reportFile]
+
+        self.assertEqual(jsonRows[1], {"Title": "A title longer than the max width", "Artist": None, "Play Count": 12345})
+        self.assertEqual(len(jsonRows), 3)
+
+        with self.assertRaises(ValueError):
+            mlu.report.writeReport(self.reportFilepath, self.columns, [], 'xml')
+
+if __name__ == '__main__':
+    unittest.main()
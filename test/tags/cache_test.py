@@ -0,0 +1,104 @@
+'''
+Tests for mlu.tags.cache.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+import mlu.tags.io
+from mlu.tags.cache import AudioFilePropertiesCache, AudioFileValidationCache
+import mlu.utilities
+from mlu.utilities import AudioFileError
+import test.helpers.common
+
+class TestAudioFilePropertiesCache(unittest.TestCase):
+    def setUp(self):
+        tempDir = MLUSettings.getTempDir()
+        mypycommons.file.createDirectory(tempDir)
+
+        testAudioFilepath = mypycommons.file.joinPaths(test.helpers.common.getTestDataDir(), 'test-audio-files/test-1.flac')
+        mypycommons.file.copyToDirectory(path=testAudioFilepath, destDir=tempDir)
+
+        self.audioFilepath = mypycommons.file.joinPaths(tempDir, 'test-1.flac')
+        self.cacheFilepath = mypycommons.file.joinPaths(tempDir, 'audio-properties-cache.json')
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_getProperties(self):
+        '''
+        Tests that properties are read once per version of the file, and are kept across cache
+        instances when the cache is saved.
+        '''
+        expectedDuration = mlu.tags.io.AudioFileMetadataHandler(self.audioFilepath).getProperties().duration
+
+        with mock.patch('mlu.tags.io.AudioFileMetadataHandler', wraps=mlu.tags.io.AudioFileMetadataHandler) as handlerMock:
+            cache = AudioFilePropertiesCache(self.cacheFilepath)
+            self.assertEqual(cache.getProperties(self.audioFilepath).duration, expectedDuration)
+            self.assertEqual(cache.getProperties(self.audioFilepath).duration, expectedDuration)
+            self.assertEqual(handlerMock.call_count, 1)
+            cache.save()
+
+            cache = AudioFilePropertiesCache(self.cacheFilepath)
+            self.assertEqual(cache.getProperties(self.audioFilepath).duration, expectedDuration)
+            self.assertEqual(handlerMock.call_count, 1)
+
+            # A changed file must be read again
+            fileStat = os.stat(self.audioFilepath)
+            os.utime(self.audioFilepath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 1000000000))
+            self.assertEqual(cache.getProperties(self.audioFilepath).duration, expectedDuration)
+            self.assertEqual(handlerMock.call_count, 2)
+
+class TestAudioFileValidationCache(unittest.TestCase):
+    def setUp(self):
+        tempDir = MLUSettings.getTempDir()
+        mypycommons.file.createDirectory(tempDir)
+
+        testAudioFilepath = mypycommons.file.joinPaths(test.helpers.common.getTestDataDir(), 'test-audio-files/test-1.flac')
+        mypycommons.file.copyToDirectory(path=testAudioFilepath, destDir=tempDir)
+
+        self.audioFilepath = mypycommons.file.joinPaths(tempDir, 'test-1.flac')
+        self.cacheFilepath = mypycommons.file.joinPaths(tempDir, 'audio-validation-cache.json')
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_testAudioFilesForErrors(self):
+        '''
+        Tests that missing and unsupported files are found without parsing them, and that a valid
+        file is only parsed again once it has changed.
+        '''
+        missingFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'missing.flac')
+        unsupportedFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'audio-validation-cache.wav')
+        open(unsupportedFilepath, 'w').close()
+
+        with mock.patch('mlu.utilities.AudioFileMetadataHandler', wraps=mlu.utilities.AudioFileMetadataHandler) as handlerMock:
+            cache = AudioFileValidationCache(self.cacheFilepath)
+            audioFileErrors = mlu.utilities.testAudioFilesForErrors([self.audioFilepath, missingFilepath, unsupportedFilepath], cache, workers=2)
+            self.assertEqual([(x.audioFilepath, x.exceptionMessage) for x in audioFileErrors], [
+                (missingFilepath, AudioFileError.NOT_FOUND),
+                (unsupportedFilepath, AudioFileError.NOT_SUPPORTED)
+            ])
+            self.assertEqual(handlerMock.call_count, 1)
+            cache.save()
+
+            cache = AudioFileValidationCache(self.cacheFilepath)
+            self.assertEqual(mlu.utilities.testAudioFilesForErrors([self.audioFilepath], cache), [])
+            self.assertEqual(handlerMock.call_count, 1)
+
+            # A changed file must be parsed again
+            fileStat = os.stat(self.audioFilepath)
+            os.utime(self.audioFilepath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 1000000000))
+            self.assertEqual(mlu.utilities.testAudioFilesForErrors([self.audioFilepath], cache), [])
+            self.assertEqual(handlerMock.call_count, 2)
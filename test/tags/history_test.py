@@ -0,0 +1,119 @@
+'''
+Tests for mlu.tags.playstats.history.
+
+'''
+
+import unittest
+import sys
+import os
+from datetime import date, datetime, timedelta
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.tags.playstats.common import Playback
+from mlu.tags.playstats.history import PlayHistoryDatabase
+from mlu.library.tagindex import LibraryTagIndex, LibraryTagIndexEntry
+from mlu.tags.values import AudioFileTags
+
+class TestPlayHistoryDatabase(unittest.TestCase):
+    def setUp(self):
+        mypycommons.file.createDirectory(MLUSettings.getTempDir())
+        self.databaseFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'history_test.sqlite')
+        self.playHistory = PlayHistoryDatabase(self.databaseFilepath)
+
+    def tearDown(self):
+        self.playHistory.close()
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_addPlaybacks(self):
+        '''
+        Tests that playbacks are read back per audio file in time order, and that adding the same
+        playbacks again does not add plays.
+        '''
+        playbacks = [
+            Playback('/music/1.flac', datetime(2023, 5, 2, 8, 30, 15), timedelta(seconds=200)),
+            Playback('/music/2.mp3', datetime(2023, 5, 1, 22, 0, 0), None),
+            Playback('/music/1.flac', datetime(2023, 5, 1, 9, 0, 0), timedelta(seconds=61))
+        ]
+
+        self.assertEqual(self.playHistory.addPlaybacks(playbacks), 3)
+        self.assertEqual(self.playHistory.addPlaybacks(playbacks[:2]), 0)
+        self.assertEqual(self.playHistory.getPlaysCount(), 3)
+        self.assertEqual(self.playHistory.getPlayCount('/music/1.flac'), 2)
+
+        self.playHistory.close()
+        self.playHistory = PlayHistoryDatabase(self.databaseFilepath)
+
+        loadedPlaybacks = self.playHistory.getPlaybacks('/music/1.flac')
+        self.assertEqual([playback.dateTime for playback in loadedPlaybacks], [datetime(2023, 5, 1, 9, 0, 0), datetime(2023, 5, 2, 8, 30, 15)])
+        self.assertEqual([playback.duration for playback in loadedPlaybacks], [timedelta(seconds=61), timedelta(seconds=200)])
+        self.assertIsNone(self.playHistory.getPlaybacks('/music/2.mp3')[0].duration)
+        self.assertEqual(self.playHistory.getPlaybacks('/music/3.mp3'), [])
+
+    def test_moveAudioFile(self):
+        '''
+        Tests that the plays of a moved audio file are moved to its new filepath, merged with the
+        plays already there, and that the daily play counts follow them.
+        '''
+        self.playHistory.addPlaybacks([
+            Playback('/music/old/1.flac', datetime(2023, 5, 1, 9, 0, 0), None),
+            Playback('/music/old/1.flac', datetime(2023, 5, 2, 9, 0, 0), None),
+            Playback('/music/old/2.flac', datetime(2023, 5, 1, 10, 0, 0), None),
+            Playback('/music/new/2.flac', datetime(2023, 5, 1, 10, 0, 0), None),
+            Playback('/music/new/2.flac', datetime(2023, 5, 3, 10, 0, 0), None)
+        ])
+
+        self.assertEqual(self.playHistory.moveAudioFile('/music/old/1.flac', '/music/new/1.flac'), 2)
+        self.assertEqual(self.playHistory.moveAudioFile('/music/old/2.flac', '/music/new/2.flac'), 0)
+        self.assertEqual(self.playHistory.moveAudioFile('/music/old/3.flac', '/music/new/3.flac'), 0)
+
+        self.assertEqual(self.playHistory.getPlaybacks('/music/old/1.flac'), [])
+        self.assertEqual(self.playHistory.getPlayCount('/music/new/1.flac'), 2)
+        self.assertEqual(self.playHistory.getPlayCount('/music/new/2.flac'), 2)
+        self.assertEqual(self.playHistory.getPlaysCount(), 4)
+        self.assertEqual(
+            [(track.filepath, track.playCount) for track in self.playHistory.getTopTracks(date(2023, 5, 1), date(2023, 5, 3), 10)],
+            [('/music/new/1.flac', 2), ('/music/new/2.flac', 2)]
+        )
+        self.assertEqual(self.playHistory.getPlaysPerDay(date(2023, 5, 1), date(2023, 5, 3)), [(date(2023, 5, 1), 2), (date(2023, 5, 2), 1), (date(2023, 5, 3), 1)])
+
+    def test_queries(self):
+        '''
+        Tests the history queries, with the tags from an attached library tag index.
+        '''
+        tagIndexFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'history_test_tagindex.sqlite')
+        with LibraryTagIndex(tagIndexFilepath) as tagIndex:
+            tagIndex.upsertEntries([
+                LibraryTagIndexEntry('/music/1.flac', AudioFileTags('One', 'A', 'X', '', None, '', 0, 0), None),
+                LibraryTagIndexEntry('/music/2.flac', AudioFileTags('Two', 'B', 'X', 'A', None, '', 0, 0), None),
+                LibraryTagIndexEntry('/music/3.flac', AudioFileTags('Three', 'C', 'Y', '', None, '', 0, 0), None)
+            ])
+
+        # Thursday 2023-06-01 to Monday 2023-06-05
+        self.playHistory.addPlaybacks([
+            Playback('/music/1.flac', datetime(2023, 6, 1, 23, 59, 59), None),
+            Playback('/music/1.flac', datetime(2023, 6, 5, 0, 0, 0), None),
+            Playback('/music/2.flac', datetime(2023, 6, 2, 12, 0, 0), None),
+            Playback('/music/2.flac', datetime(2023, 6, 4, 12, 0, 0), None),
+            Playback('/music/2.flac', datetime(2023, 6, 5, 12, 0, 0), None)
+        ])
+        self.playHistory.attachLibraryTagIndex(tagIndexFilepath)
+
+        topTracks = self.playHistory.getTopTracks(date(2023, 6, 1), date(2023, 6, 4), 10)
+        self.assertEqual([(x.title, x.playCount) for x in topTracks], [('Two', 2), ('One', 1)])
+        self.assertEqual(self.playHistory.getTopArtists(date(2023, 6, 1), date(2023, 6, 5), 1), [('B', 3)])
+        self.assertEqual(self.playHistory.getTopAlbums(date(2023, 6, 1), date(2023, 6, 5), 10), [('A', 'X', 5)])
+
+        self.assertEqual(self.playHistory.getPlaysPerDay(date(2023, 6, 2), date(2023, 6, 5)), [(date(2023, 6, 2), 1), (date(2023, 6, 4), 1), (date(2023, 6, 5), 2)])
+        self.assertEqual(self.playHistory.getPlaysPerWeek(date(2023, 6, 1), date(2023, 6, 30)), [(date(2023, 5, 29), 3), (date(2023, 6, 5), 2)])
+
+        self.assertEqual(self.playHistory.getNotPlayedSince(datetime(2023, 6, 5, 6, 0, 0)), [('/music/3.flac', None), ('/music/1.flac', datetime(2023, 6, 5, 0, 0, 0))])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,10 @@ Tests for mlu.tags.io, which also tests the mlu.tags.audiofmt modules.
 
 #from email.mime import audio
 import unittest
+from unittest import mock
 import sys
 import os
+import mutagen
 from com.nwrobel import mypycommons
 import com.nwrobel.mypycommons.file
 
@@ -169,6 +171,74 @@ class TestTagsIOModule(unittest.TestCase):
             self._checkAudioFileTagIOHandlerRead(handler, testAudioFile.tagValues)
             self._checkAudioFileTagIOHandlerWrite(handler)
 
+    def test_AudioFileMetadataHandler_Session(self):
+        '''
+        Tests that within a session, the audio file is parsed only once for reading tags and
+        properties, checking for changes and writing the new tags.
+        '''
+        for testAudioFile in (self.testData.testAudioFilesFLAC + self.testData.testAudioFilesMp3):
+            with mock.patch('mutagen.File', wraps=mutagen.File) as mutagenFileMock:
+                with mlu.tags.io.AudioFileMetadataHandler(testAudioFile.filepath) as handler:
+                    tags = handler.getTags()
+                    handler.getProperties()
+
+                    tags.playCount = 55
+                    tags.rating = 4.5
+                    handler.setTags(tags)
+                    handler.setTags(tags)
+
+                    self.assertTrue(handler.getTags().equals(tags))
+
+                self.assertEqual(mutagenFileMock.call_count, 1)
+
+            # Check that the tags were saved to the file, using a new handler without a session
+            handler = mlu.tags.io.AudioFileMetadataHandler(testAudioFile.filepath)
+            self._checkAudioFileTagIOHandlerRead(handler, expectedTagValues={ 'playCount': 55, 'rating': 4.5 })
+
+    def test_AudioFileMetadataHandler_TagWritePadding(self):
+        '''
+        Tests that tags are written in place when they fit in the existing padding, and that the
+        padding reserve is added when the file has to be rewritten.
+        '''
+        for testAudioFile in (self.testData.testAudioFilesFLAC + self.testData.testAudioFilesMp3):
+            # Remove all padding from the file, so the next tag change can't be written in place
+            mutagenInterface = mutagen.File(testAudioFile.filepath)
+            if (testAudioFile.filepath.endswith('.mp3')):
+                mutagenInterface.save(v2_version=3, padding=lambda paddingInfo: 0)
+            else:
+                mutagenInterface.save(padding=lambda paddingInfo: 0)
+
+            handler = mlu.tags.io.AudioFileMetadataHandler(testAudioFile.filepath, tagPaddingReserve=4096)
+            tags = handler.getTags()
+
+            tags.playCount = 1000
+            tags.dateLastPlayed = '2022-01-01 10:00:00'
+            self.assertEqual(handler.setTags(tags), mlu.tags.values.TagWriteMode.FULL_REWRITE)
+
+            fileSize = os.path.getsize(testAudioFile.filepath)
+            tags.playCount = 1000000
+            self.assertEqual(handler.setTags(tags), mlu.tags.values.TagWriteMode.IN_PLACE)
+            self.assertEqual(handler.setTags(tags), mlu.tags.values.TagWriteMode.SKIPPED)
+
+            self.assertEqual(os.path.getsize(testAudioFile.filepath), fileSize)
+            self._checkAudioFileTagIOHandlerRead(handler, expectedTagValues={ 'playCount': 1000000 })
+
+    def test_AudioFileMetadataHandler_FastRead(self):
+        '''
+        Tests that the header-only reader returns the same tags and properties as mutagen.
+        '''
+        for testAudioFile in self.testData.testAudioFilesFLAC:
+            handler = mlu.tags.io.AudioFileMetadataHandler(testAudioFile.filepath)
+            fastReadHandler = mlu.tags.io.AudioFileMetadataHandler(testAudioFile.filepath, useFastRead=True)
+
+            with mock.patch('mutagen.File', wraps=mutagen.File) as mutagenFileMock:
+                fastReadTags = fastReadHandler.getTags()
+                fastReadProperties = fastReadHandler.getProperties()
+                self.assertEqual(mutagenFileMock.call_count, 0)
+
+            self.assertTrue(handler.getTags().equals(fastReadTags))
+            self.assertEqual(handler.getProperties().duration, fastReadProperties.duration)
+
     def _checkAudioFileTagIOHandlerRead(self, audioFileMetadataHandler, expectedTagValues):
         '''
         Tests tag reading for any given test AudioFileTagIOHandler instance. Used as a 
@@ -0,0 +1,48 @@
+'''
+Tests for mlu.tags.playstats.common.
+
+'''
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+import mlu.tags.playstats.common
+from mlu.tags.playstats.common import Playback
+
+class TestPlaystatsCommon(unittest.TestCase):
+    def test_groupPlaybacksByAudioFile(self):
+        '''
+        Tests that interleaved playbacks of several audio files are grouped as the previous
+        implementation did: one group per unique audio file, each with the playbacks of that file
+        in list order (not sorted by time).
+        '''
+        startTime = datetime(2024, 1, 1, 10, 0, 0)
+        audioFilepaths = ['/music/c.flac', '/music/a.flac', '/music/b.mp3', '/music/a.flac', '/music/c.flac', '/music/a.flac', '/music/d.opus']
+        playbacks = [
+            Playback(audioFilepath, startTime + timedelta(minutes=(index * 7) % 5), timedelta(seconds=index))
+            for (index, audioFilepath) in enumerate(audioFilepaths)
+        ]
+
+        playbacksByAudioFile = mlu.tags.playstats.common.groupPlaybacksByAudioFile(playbacks)
+
+        # Previous implementation: the sorted unique audio files, and a scan of all the playbacks
+        # for each of them
+        uniqueAudioFiles = mlu.tags.playstats.common.getUniqueAudioFilesFromPlaybacks(playbacks)
+        self.assertEqual(sorted(playbacksByAudioFile), uniqueAudioFiles)
+
+        for audioFilepath in uniqueAudioFiles:
+            expectedPlaybacks = [playback for playback in playbacks if (playback.audioFilepath == audioFilepath)]
+            self.assertEqual(playbacksByAudioFile[audioFilepath], expectedPlaybacks)
+
+        self.assertEqual([playback.duration.seconds for playback in playbacksByAudioFile['/music/a.flac']], [1, 3, 5])
+        self.assertEqual(mlu.tags.playstats.common.groupPlaybacksByAudioFile([]), {})
+
+if __name__ == '__main__':
+    unittest.main()
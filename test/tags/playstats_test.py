@@ -0,0 +1,212 @@
+'''
+Tests for mlu.tags.playstats.playstats.
+
+'''
+
+import unittest
+from unittest import mock
+import sys
+import os
+import sqlite3
+import csv
+from datetime import datetime, timedelta
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+import com.nwrobel.mypycommons.time
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+import mlu.tags.io
+import mlu.library.audiolib
+from mlu.library.tagindex import LibraryTagIndex, LibraryTagIndexEntry
+from mlu.tags.playstats.common import Playback, AudioFilePlaybackList
+from mlu.tags.playstats.playstats import PlaystatTagUpdaterForMpd, PlaystatTags
+from mlu.tags.playstats.tagjournal import PlaystatTagWriteJournal
+from mlu.tags.playstats.history import PlayHistoryDatabase
+from mlu.tags.values import AudioFileTags
+import test.helpers.common
+
+class TestPlaystatTagUpdaterForMpd(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = MLUSettings.getTempDir()
+        mypycommons.file.createDirectory(self.tempDir)
+
+        # Library of copies of the test audio file, and a file that is not an audio file
+        testAudioFilepath = mypycommons.file.joinPaths(test.helpers.common.getTestDataDir(), 'test-audio-files/test-1.flac')
+        self.audioFilepaths = []
+        for audioFilename in ['a.flac', 'b.flac', 'c.flac']:
+            audioFilepath = mypycommons.file.joinPaths(self.tempDir, audioFilename)
+            with open(testAudioFilepath, mode='rb') as testAudioFile, open(audioFilepath, mode='wb') as audioFile:
+                audioFile.write(testAudioFile.read())
+            self.audioFilepaths.append(audioFilepath)
+
+        self.badAudioFilepath = mypycommons.file.joinPaths(self.tempDir, 'bad.flac')
+        with open(self.badAudioFilepath, mode='wb') as audioFile:
+            audioFile.write(b'not an audio file')
+
+        self.settings = mock.Mock()
+        self.settings.cacheDir = self.tempDir
+        self.settings.audioPropertiesCacheFilepath = None
+        self.settings.audioValidationCacheFilepath = None
+        self.settings.userConfig.tagIndexFilepath = mypycommons.file.joinPaths(self.tempDir, 'tagindex.sqlite')
+        self.settings.userConfig.reportFormat = 'csv'
+        self.settings.userConfig.libraryTagsConfig.fastRead = False
+        self.settings.userConfig.tagWriteConfig.paddingReserve = 64 * 1024
+        self.settings.userConfig.tagWriteConfig.writeWorkers = 2
+        self.settings.userConfig.audioLibraryRootDir = self.tempDir
+
+        self.updater = PlaystatTagUpdaterForMpd(self.settings, mock.Mock())
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_saveSummaryOutputFiles(self):
+        '''
+        Tests that the summaries read the tags of each audio file at most once (not at all for the
+        files with an up to date tag index entry), and still list a file whose tags can't be read.
+        '''
+        testTags = mlu.tags.io.AudioFileMetadataHandler(self.audioFilepaths[1]).getTags()
+        indexedTags = AudioFileTags('Indexed', 'Indexed Artist', 'Indexed Album', '', None, '', 0, 0)
+
+        with LibraryTagIndex(self.settings.userConfig.tagIndexFilepath) as tagIndex:
+            tagIndex.upsertEntries([
+                LibraryTagIndexEntry(self.audioFilepaths[0], indexedTags, mlu.library.audiolib.getAudioFileStatSignature(self.audioFilepaths[0])),
+                LibraryTagIndexEntry(self.audioFilepaths[2], indexedTags, { 'size': 1, 'mtimeNs': 1, 'inode': 1 })
+            ])
+
+        playbackLists = [
+            AudioFilePlaybackList([Playback(audioFilepath, datetime(2024, 1, 1, 10, index, playIndex), None) for playIndex in range(index + 1)])
+            for (index, audioFilepath) in enumerate(self.audioFilepaths + [self.badAudioFilepath])
+        ]
+
+        with mock.patch('mlu.tags.io.AudioFileMetadataHandler', wraps=mlu.tags.io.AudioFileMetadataHandler) as handlerMock:
+            self.updater._saveHistorySummaryOutputFile(playbackLists, self.tempDir)
+            self.updater._saveTotalsSummaryOutputFile(playbackLists, self.tempDir)
+
+        # The outdated index entry is not used: the file is read
+        self.assertEqual(sorted(call.args[0] for call in handlerMock.call_args_list), sorted([self.audioFilepaths[1], self.audioFilepaths[2], self.badAudioFilepath]))
+
+        with open(mypycommons.file.joinPaths(self.tempDir, 'summary-playback-totals.csv'), mode='r', encoding='utf-8', newline='') as reportFile:
+            rows = list(csv.reader(reportFile))[1:]
+
+        self.assertEqual([row[0:4] for row in rows], [
+            ['', '', '', '4'],
+            [testTags.title, testTags.artist, testTags.album, '3'],
+            [testTags.title, testTags.artist, testTags.album, '2'],
+            ['Indexed', 'Indexed Artist', 'Indexed Album', '1']
+        ])
+
+        with open(mypycommons.file.joinPaths(self.tempDir, 'summary-playback-history.csv'), mode='r', encoding='utf-8', newline='') as reportFile:
+            self.assertEqual(len(list(csv.reader(reportFile))), 11)
+
+    def test_saveTagsClosesSession(self):
+        '''
+        Tests that the session of the audio file is closed when saving the playstat tags fails.
+        '''
+        playstatTags = PlaystatTags(self.audioFilepaths[0], 0)
+
+        with mock.patch.object(mlu.tags.io.AudioFileMetadataHandler, 'setTags', side_effect=OSError()):
+            with mock.patch.object(mlu.tags.io.AudioFileMetadataHandler, 'closeSession') as closeSessionMock:
+                with self.assertRaises(OSError):
+                    playstatTags.saveTags()
+
+        closeSessionMock.assert_called_once()
+
+    def test_updatePlaystatTagsResume(self):
+        '''
+        Tests that an update interrupted partway through a batch (a file written, the next one not,
+        and the batch not recorded as written) counts the playbacks of every file only once when
+        it is resumed.
+        '''
+        initialPlayCount = PlaystatTags(self.audioFilepaths[0], 0).playCount
+        playbackLists = [
+            AudioFilePlaybackList([Playback(audioFilepath, datetime(2024, 1, 1, 10, index, playIndex), None) for playIndex in range(index + 2)])
+            for (index, audioFilepath) in enumerate(self.audioFilepaths)
+        ]
+        journalFilepath = mypycommons.file.joinPaths(self.tempDir, 'playstat-tags-written.jsonl')
+        playHistory = PlayHistoryDatabase(mypycommons.file.joinPaths(self.tempDir, 'play-history.sqlite'))
+        saveTags = PlaystatTags.saveTags
+
+        def saveTagsInterrupted(playstatTags):
+            if (playstatTags.audioFilepath == self.audioFilepaths[1]):
+                raise KeyboardInterrupt()
+            return saveTags(playstatTags)
+
+        with mock.patch.object(PlaystatTagUpdaterForMpd, '_TAG_WRITE_BATCH_SIZE', 2):
+            with mock.patch.object(PlaystatTags, 'saveTags', saveTagsInterrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.updater._updatePlaystatTagsForAudioFilePlaybackLists(playbackLists, PlaystatTagWriteJournal(journalFilepath), playHistory, 2)
+
+            self.assertEqual(PlaystatTags(self.audioFilepaths[0], 0).playCount, initialPlayCount + 2)
+            self.assertEqual(PlaystatTags(self.audioFilepaths[1], 0).playCount, initialPlayCount)
+
+            # Resume, as updatePlaystatTags does: the files recorded as written are skipped
+            tagWriteJournal = PlaystatTagWriteJournal(journalFilepath)
+            self.assertEqual(tagWriteJournal.getWrittenAudioFilepaths(), set())
+            self.updater._updatePlaystatTagsForAudioFilePlaybackLists(playbackLists, tagWriteJournal, playHistory, 2)
+
+        self.assertEqual([PlaystatTags(audioFilepath, 0).playCount for audioFilepath in self.audioFilepaths], [initialPlayCount + 2, initialPlayCount + 3, initialPlayCount + 4])
+        self.assertEqual(PlaystatTags(self.audioFilepaths[2], 0).dateLastPlayed, datetime(2024, 1, 1, 10, 2, 3))
+        self.assertEqual(PlaystatTagWriteJournal(journalFilepath).getWrittenAudioFilepaths(), set(self.audioFilepaths))
+        self.assertEqual(playHistory.getPlaysCount(), 9)
+        playHistory.close()
+
+    def test_importDateAllPlaysToPlayHistory(self):
+        '''
+        Tests that the plays of the DATE_ALL_PLAYS tags are added to the play history database (the
+        plays already in it are kept as they are), that the tags are only removed when asked for
+        and once the plays are imported, and that the import can be run again.
+        '''
+        testAudioFilepath = mypycommons.file.joinPaths(test.helpers.common.getTestDataDir(), 'test-audio-files/test-1.mp3')
+        mp3AudioFilepath = mypycommons.file.joinPaths(self.tempDir, 'd.mp3')
+        with open(testAudioFilepath, mode='rb') as testAudioFile, open(mp3AudioFilepath, mode='wb') as audioFile:
+            audioFile.write(testAudioFile.read())
+
+        audioFilepaths = self.audioFilepaths + [mp3AudioFilepath]
+        flacDateAllPlays = mlu.tags.io.AudioFileMetadataHandler(self.audioFilepaths[0]).getDateAllPlays()
+        mp3DateAllPlays = mlu.tags.io.AudioFileMetadataHandler(mp3AudioFilepath).getDateAllPlays()
+        self.assertEqual(len(flacDateAllPlays.split(';')), 4)
+        self.assertEqual(len(mp3DateAllPlays.split(';')), 4)
+        initialTags = mlu.tags.io.AudioFileMetadataHandler(mp3AudioFilepath).getTags()
+
+        self.settings.userConfig.playHistoryFilepath = mypycommons.file.joinPaths(self.tempDir, 'play-history.sqlite')
+        with PlayHistoryDatabase(self.settings.userConfig.playHistoryFilepath) as playHistory:
+            firstPlayDateTime = mypycommons.time.getDateTimeFromFormattedTime(flacDateAllPlays.split(';')[0])
+            playHistory.addPlaybacks([Playback(self.audioFilepaths[0], firstPlayDateTime, timedelta(seconds=200))])
+
+        # The tags are not removed when the import fails
+        with mock.patch.object(PlayHistoryDatabase, 'addPlaybacks', side_effect=sqlite3.OperationalError()):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.updater.importDateAllPlaysToPlayHistory(removeTags=True)
+        self.assertEqual(mlu.tags.io.AudioFileMetadataHandler(mp3AudioFilepath).getDateAllPlays(), mp3DateAllPlays)
+        self.updater._logger.error.reset_mock()
+
+        self.updater.importDateAllPlaysToPlayHistory(removeTags=False)
+
+        with PlayHistoryDatabase(self.settings.userConfig.playHistoryFilepath) as playHistory:
+            self.assertEqual(playHistory.getPlaysCount(), 16)
+            self.assertEqual([mypycommons.time.formatDatetimeForDisplay(playback.dateTime) for playback in playHistory.getPlaybacks(mp3AudioFilepath)], mp3DateAllPlays.split(';'))
+            self.assertEqual(playHistory.getPlaybacks(self.audioFilepaths[0])[0].duration, timedelta(seconds=200))
+
+        for audioFilepath in audioFilepaths:
+            self.assertEqual(len(mlu.tags.io.AudioFileMetadataHandler(audioFilepath).getDateAllPlays().split(';')), 4)
+
+        # The file that is not an audio file is logged
+        self.assertEqual(self.updater._logger.error.call_count, 1)
+
+        # Run again, removing the tags: no plays are added twice
+        self.updater.importDateAllPlaysToPlayHistory(removeTags=True)
+
+        with PlayHistoryDatabase(self.settings.userConfig.playHistoryFilepath) as playHistory:
+            self.assertEqual(playHistory.getPlaysCount(), 16)
+
+        for audioFilepath in audioFilepaths:
+            self.assertEqual(mlu.tags.io.AudioFileMetadataHandler(audioFilepath).getDateAllPlays(), '')
+        self.assertEqual(mlu.tags.io.AudioFileMetadataHandler(mp3AudioFilepath).getTags().__dict__, initialTags.__dict__)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+'''
+Tests for mlu.tags.playstats.store.
+
+'''
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.tags.playstats.common import Playback
+import mlu.tags.playstats.store
+from mlu.tags.playstats.store import PlaybackStore, PlaybackStoreFormatError
+
+class TestPlaybackStore(unittest.TestCase):
+    def setUp(self):
+        tempDir = MLUSettings.getTempDir()
+        mypycommons.file.createDirectory(tempDir)
+
+        self.storeFilepath = mypycommons.file.joinPaths(tempDir, 'playbacks.data.store')
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_saveAndLoad(self):
+        '''
+        Tests that the playbacks saved to a store file are loaded back unchanged, in order, with
+        each audio filepath stored once.
+        '''
+        playbacks = [
+            Playback('/music/a.flac', datetime(2021, 3, 1, 10, 0, 0), timedelta(minutes=3, seconds=12)),
+            Playback('/music/Björk/b.mp3', datetime(2021, 3, 1, 10, 3, 12, 500), None),
+            Playback('/music/a.flac', datetime(1969, 12, 31, 23, 59, 59), timedelta(seconds=1))
+        ]
+
+        PlaybackStore.fromPlaybacks(playbacks).save(self.storeFilepath)
+        store = PlaybackStore.load(self.storeFilepath)
+
+        self.assertEqual(store.audioFilepaths, ['/music/a.flac', '/music/Björk/b.mp3'])
+        self.assertEqual(store.getPlaybackCount(), 3)
+
+        for (loadedPlayback, playback) in zip(store.getPlaybacks(), playbacks):
+            self.assertEqual(loadedPlayback.audioFilepath, playback.audioFilepath)
+            self.assertEqual(loadedPlayback.dateTime, playback.dateTime)
+            self.assertEqual(loadedPlayback.duration, playback.duration)
+
+        PlaybackStore().save(self.storeFilepath)
+        self.assertEqual(PlaybackStore.load(self.storeFilepath).getPlaybacks(), [])
+
+    def test_loadInvalidFile(self):
+        '''
+        Tests that loading a file that is not a complete store file fails.
+        '''
+        mypycommons.file.writeToFile(self.storeFilepath, '[{"audioFilepath": "/music/a.flac"}]')
+        with self.assertRaises(PlaybackStoreFormatError):
+            PlaybackStore.load(self.storeFilepath)
+
+        PlaybackStore.fromPlaybacks([Playback('/music/a.flac', datetime(2021, 3, 1), None)]).save(self.storeFilepath)
+        with open(self.storeFilepath, mode='r+b') as storeFile:
+            storeFile.truncate(os.path.getsize(self.storeFilepath) - 1)
+
+        with self.assertRaises(PlaybackStoreFormatError):
+            PlaybackStore.load(self.storeFilepath)
+
+    def test_isSavedFrom(self):
+        '''
+        Tests that the store is only used for its source file while the file is unchanged, even when
+        it was edited without changing its size or modified time.
+        '''
+        sourceFilepath = mypycommons.file.joinPaths(MLUSettings.getTempDir(), 'playbacks.data.json')
+        mypycommons.file.writeToFile(sourceFilepath, '[{"audioFilepath": "/music/a.flac"}]')
+
+        store = PlaybackStore.fromPlaybacks([Playback('/music/a.flac', datetime(2021, 3, 1), None)])
+        store.sourceFileSignature = mlu.tags.playstats.store.getSourceFileSignature(sourceFilepath)
+        store.save(self.storeFilepath)
+
+        store = PlaybackStore.load(self.storeFilepath)
+        self.assertTrue(store.isSavedFrom(sourceFilepath))
+
+        # Same size and modified time, different content
+        sourceStat = os.stat(sourceFilepath)
+        mypycommons.file.writeToFile(sourceFilepath, '[{"audioFilepath": "/music/b.flac"}]')
+        os.utime(sourceFilepath, ns=(sourceStat.st_atime_ns, sourceStat.st_mtime_ns))
+        self.assertFalse(store.isSavedFrom(sourceFilepath))
+
+        PlaybackStore().save(self.storeFilepath)
+        self.assertFalse(PlaybackStore.load(self.storeFilepath).isSavedFrom(sourceFilepath))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+'''
+Tests for mlu.tags.playstats.tagjournal.
+
+'''
+
+import unittest
+import sys
+import os
+from com.nwrobel import mypycommons
+import com.nwrobel.mypycommons.file
+
+# Add project root to PYTHONPATH so MLU modules can be imported
+scriptPath = os.path.dirname(os.path.realpath(__file__))
+projectRoot = os.path.abspath(os.path.join(scriptPath ,"../.."))
+sys.path.insert(0, projectRoot)
+
+from mlu.settings import MLUSettings
+from mlu.tags.playstats.tagjournal import PlaystatTagWriteJournal
+
+class TestPlaystatTagWriteJournal(unittest.TestCase):
+    def setUp(self):
+        tempDir = MLUSettings.getTempDir()
+        mypycommons.file.createDirectory(tempDir)
+
+        self.journalFilepath = mypycommons.file.joinPaths(tempDir, 'playstat-tags-written.jsonl')
+
+    def tearDown(self):
+        mypycommons.file.deletePath(MLUSettings.getTempDir())
+
+    def test_resume(self):
+        '''
+        Tests that the written files are kept across journal instances, that a partly written
+        batch is dropped, and that the completed state is kept.
+        '''
+        journal = PlaystatTagWriteJournal(self.journalFilepath)
+        journal.addBatch(['/music/a.flac', '/music/b.mp3'])
+        journal.addBatch([])
+
+        # Simulate an update killed while writing the next batch
+        with open(self.journalFilepath, mode='a', encoding='utf-8') as journalFile:
+            journalFile.write('{"audioFilepaths": ["/music/c.fl')
+
+        journal = PlaystatTagWriteJournal(self.journalFilepath)
+        self.assertEqual(journal.getWrittenAudioFilepaths(), {'/music/a.flac', '/music/b.mp3'})
+        self.assertFalse(journal.isComplete())
+
+        journal.addBatch(['/music/c.flac'])
+        journal.markComplete()
+
+        journal = PlaystatTagWriteJournal(self.journalFilepath)
+        self.assertEqual(journal.getWrittenAudioFilepaths(), {'/music/a.flac', '/music/b.mp3', '/music/c.flac'})
+        self.assertTrue(journal.isComplete())
+
+    def test_pending(self):
+        '''
+        Tests that the pending tag values are kept across journal instances until the files are
+        recorded as written.
+        '''
+        journal = PlaystatTagWriteJournal(self.journalFilepath)
+        journal.addPending({
+            '/music/a.flac': {'playCount': '3', 'dateLastPlayed': '2024-01-01 10:00:00'},
+            '/music/b.mp3': {'playCount': '1', 'dateLastPlayed': '2024-01-02 10:00:00'}
+        })
+        journal.addBatch(['/music/a.flac'])
+
+        journal = PlaystatTagWriteJournal(self.journalFilepath)
+        self.assertEqual(journal.getPendingTagValues(), {'/music/b.mp3': {'playCount': '1', 'dateLastPlayed': '2024-01-02 10:00:00'}})
+
+if __name__ == '__main__':
+    unittest.main()